@@ -4,7 +4,13 @@ import datetime as dt
 import logging
 
 from app.agent.llm_prompts import build_system_prompt, build_user_prompt
-from app.agent.llm_provider import LLMProviderError, get_llm_provider, parse_llm_json
+from app.agent.llm_provider import (
+    BaseLLMProvider,
+    LLMProviderError,
+    get_llm_provider,
+    parse_llm_json,
+)
+from app.agent.llm_usage import LLMUsage
 from app.agent.text_generator import generate_text
 from app.db.models import Client, Event
 from app.services.guardrails import validate_message_text
@@ -34,16 +40,22 @@ async def generate_subject_body(
     client: Client,
     template_choice: TemplateChoice,
     today: dt.date | None = None,
+    usage: LLMUsage | None = None,
+    provider: BaseLLMProvider | None = None,
 ) -> tuple[str, str, str]:
     """Return (tone, subject, body).
 
     Strategy:
     1) If LLM is enabled, ask it for strict JSON, validate + guardrails.
     2) On any error → fallback to deterministic template generation.
+
+    If `usage` is given, token spend of the LLM call is added to it (also when the answer
+    is rejected and we fall back to templates: the tokens were spent anyway).
+    `provider` lets the caller reuse one provider (one session/token) for many greetings.
     """
     _ = today  # reserved for future use (e.g., "today" in prompt)
 
-    provider = get_llm_provider()
+    provider = provider or get_llm_provider()
     if provider is not None:
         try:
             facts = _allowed_facts(client)
@@ -63,6 +75,8 @@ async def generate_subject_body(
                 tone_hint=tone_hint,
             )
             raw = await provider.generate(system=system, user=user)
+            if usage is not None:
+                usage.add(getattr(provider, "last_usage", None))
             log.debug(
                 "LLM raw response for event=%s client=%s (first 1000 chars, total length=%d): %s",
                 event.id,
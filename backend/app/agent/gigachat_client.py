@@ -1,14 +1,21 @@
 from __future__ import annotations
 
+import asyncio
 import base64
+import binascii
 import datetime as dt
+import json
+import os
 import re
+import time
 import uuid
 from dataclasses import dataclass
+from pathlib import Path
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
+from app.agent.llm_usage import LLMUsage, usage_from_response
 from app.core.config import settings
 
 
@@ -33,6 +40,51 @@ def _ssl_verify_param() -> bool | str:
     return True
 
 
+_IMAGE_MAGIC = (
+    (b"\xff\xd8\xff", "jpg"),
+    (b"\x89PNG\r\n\x1a\n", "png"),
+    (b"RIFF", "webp"),  # RIFF....WEBP
+)
+_B64_ALPHABET = frozenset(
+    b"ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789+/=\r\n\t "
+)
+_B64_WHITESPACE = b"\r\n\t "
+
+
+def image_kind(head: bytes) -> str | None:
+    """File extension for known image magic bytes (jpg|png|webp), else None."""
+    for magic, ext in _IMAGE_MAGIC:
+        if head.startswith(magic):
+            if ext == "webp" and head[8:12] != b"WEBP":
+                continue
+            return ext
+    return None
+
+
+class Base64StreamDecoder:
+    """Incremental base64 decoder: feed arbitrary chunks, get decoded bytes back.
+
+    Keeps at most 3 undecoded characters between chunks, so memory is bounded by the chunk size.
+    """
+
+    def __init__(self) -> None:
+        self._tail = b""
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._tail + chunk.translate(None, _B64_WHITESPACE)
+        cut = len(data) - len(data) % 4
+        self._tail = data[cut:]
+        try:
+            return base64.b64decode(data[:cut], validate=True) if cut else b""
+        except binascii.Error as e:
+            raise GigaChatError(f"invalid base64 file content: {e}") from e
+
+    def finish(self) -> bytes:
+        if self._tail:
+            raise GigaChatError("truncated base64 file content")
+        return b""
+
+
 @dataclass
 class AccessToken:
     value: str
@@ -67,6 +119,8 @@ class GigaChatClient:
         if not settings.gigachat_credentials:
             raise GigaChatError("GIGACHAT_CREDENTIALS is not set")
         self._token: AccessToken | None = None
+        # Usage of the most recent successful chat_completions call (tokens + latency).
+        self.last_usage: LLMUsage | None = None
 
     async def _get_token(self) -> AccessToken:
         if self._token and self._token.is_valid():
@@ -109,6 +163,7 @@ class GigaChatClient:
         x_request_id: str | None = None,
         x_session_id: str | None = None,
     ) -> dict:
+        self.last_usage = None
         token = await self._get_token()
         url = settings.gigachat_base_url.rstrip("/") + "/chat/completions"
         headers = {
@@ -132,12 +187,17 @@ class GigaChatClient:
         if function_call:
             payload["function_call"] = function_call
 
+        started = time.perf_counter()
         async with httpx.AsyncClient(
             timeout=float(settings.gigachat_timeout_sec), verify=_ssl_verify_param()
         ) as c:
             r = await c.post(url, headers=headers, json=payload)
             r.raise_for_status()
-            return r.json()
+            data = r.json()
+        self.last_usage = usage_from_response(
+            data, latency_ms=(time.perf_counter() - started) * 1000
+        )
+        return data
 
     # Для скачивания изображений используем более длинный таймаут, но без повторных попыток,
     # чтобы не затягивать прогон слишком сильно.
@@ -178,3 +238,119 @@ class GigaChatClient:
             except Exception:
                 pass
             return raw
+
+    async def download_file_to(
+        self,
+        *,
+        file_id: str,
+        dest_dir: Path,
+        prefix: str = "",
+        x_client_id: str | None = None,
+        max_bytes: int | None = None,
+    ) -> Path:
+        """Stream the file straight to `dest_dir/<prefix><file_id>.<jpg|png|webp>`.
+
+        Raw image bytes are written chunk by chunk; base64 text bodies are decoded
+        incrementally. The result must be a non-empty image (checked by magic bytes) of at most
+        `max_bytes`. Peak memory per download is one chunk, regardless of the image size.
+        (A JSON-wrapped body can't be streamed; it is read whole, but still size-capped.)
+        """
+        limit = int(max_bytes or settings.gigachat_image_max_bytes)
+        token = await self._get_token()
+        url = settings.gigachat_base_url.rstrip("/") + f"/files/{file_id}/content"
+        headers = {"Authorization": f"Bearer {token.value}"}
+        if x_client_id:
+            headers["X-Client-ID"] = x_client_id
+
+        dest_dir.mkdir(parents=True, exist_ok=True)
+        tmp = dest_dir / f".{prefix}{file_id}.{uuid.uuid4().hex}.tmp"
+        try:
+            async with httpx.AsyncClient(
+                timeout=float(settings.gigachat_image_timeout_sec), verify=_ssl_verify_param()
+            ) as c:
+                async with c.stream("GET", url, headers=headers) as r:
+                    if r.status_code == 405:
+                        await r.aclose()
+                        async with c.stream("POST", url, headers=headers) as r2:
+                            kind = await _stream_image_to(r2, tmp, limit=limit)
+                    else:
+                        kind = await _stream_image_to(r, tmp, limit=limit)
+            dest = dest_dir / f"{prefix}{file_id}.{kind}"
+            os.replace(tmp, dest)
+            return dest
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+_SNIFF_BYTES = 64
+
+
+def _sniff_decoder(head: bytes | bytearray) -> Base64StreamDecoder | None:
+    """A base64 decoder if the body starts like base64 text rather than a raw image."""
+    probe = bytes(head[: _SNIFF_BYTES * 2]).lstrip()[:_SNIFF_BYTES]
+    if image_kind(probe) is None and probe and set(probe) <= _B64_ALPHABET:
+        return Base64StreamDecoder()
+    return None
+
+
+async def _stream_image_to(r: httpx.Response, path: Path, *, limit: int) -> str:
+    """Write the (raw or base64) image body of `r` to `path`; return its kind (extension)."""
+    r.raise_for_status()
+    ct = (r.headers.get("content-type") or "").lower()
+    declared = r.headers.get("content-length")
+    if declared and declared.isdigit() and int(declared) > limit * 4 // 3 + 1024:
+        raise GigaChatError(f"file too large: {declared} bytes (limit {limit})")
+
+    written = 0
+    head = b""
+    decoder: Base64StreamDecoder | None = None
+    mode_known = False
+
+    with path.open("wb") as f:
+
+        async def _write(data: bytes) -> None:
+            nonlocal written, head
+            if not data:
+                return
+            written += len(data)
+            if written > limit:
+                raise GigaChatError(f"file too large: more than {limit} bytes")
+            if len(head) < 12:
+                head += data[: 12 - len(head)]
+            await asyncio.to_thread(f.write, data)
+
+        if "application/json" in ct:
+            raw = bytearray()
+            async for chunk in r.aiter_bytes():
+                raw += chunk
+                if len(raw) > limit * 4 // 3 + 1024:
+                    raise GigaChatError(f"file too large: more than {limit} bytes")
+            obj = json.loads(raw)
+            content = obj.get("content") if isinstance(obj, dict) else None
+            if not isinstance(content, str):
+                raise GigaChatError("unexpected json file content")
+            decoder = Base64StreamDecoder()
+            await _write(decoder.feed(content.encode("ascii", errors="replace")))
+        else:
+            # Raw image, or base64 text (some gateways/SDKs)? Decide on the first 64 bytes,
+            # buffered across however many chunks the transport splits them into.
+            pending = bytearray()
+            async for chunk in r.aiter_bytes():
+                if not mode_known:
+                    pending += chunk
+                    if len(pending.lstrip()) < _SNIFF_BYTES:
+                        continue
+                    mode_known = True
+                    decoder = _sniff_decoder(pending)
+                    chunk = bytes(pending)
+                await _write(decoder.feed(chunk) if decoder else chunk)
+            if not mode_known and pending:
+                decoder = _sniff_decoder(pending)
+                await _write(decoder.feed(bytes(pending)) if decoder else bytes(pending))
+        if decoder is not None:
+            await _write(decoder.finish())
+
+    kind = image_kind(head)
+    if written == 0 or kind is None:
+        raise GigaChatError(f"downloaded file is not an image ({written} bytes, head={head!r})")
+    return kind
@@ -1,23 +1,31 @@
 from __future__ import annotations
 
 import logging
+from pathlib import Path
 
 from app.agent.gigachat_client import GigaChatClient, GigaChatError, extract_img_file_id
+from app.agent.llm_usage import LLMUsage
 
 log = logging.getLogger(__name__)
 
 
 class GigaChatTextProvider:
-    def __init__(self) -> None:
+    def __init__(self, *, session_id: str | None = None) -> None:
         self._client = GigaChatClient()
+        # Shared X-Session-ID lets GigaChat reuse the cached (identical) system prompt prefix.
+        self._session_id = session_id
+        self.last_usage: LLMUsage | None = None
 
     async def generate(self, *, system: str, user: str) -> str:
+        self.last_usage = None
         data = await self._client.chat_completions(
             messages=[
                 {"role": "system", "content": system},
                 {"role": "user", "content": user},
-            ]
+            ],
+            x_session_id=self._session_id,
         )
+        self.last_usage = self._client.last_usage
         try:
             return data["choices"][0]["message"]["content"]
         except Exception as e:
@@ -25,17 +33,16 @@ class GigaChatTextProvider:
 
 
 class GigaChatImageProvider:
-    def __init__(self) -> None:
+    def __init__(self, *, session_id: str | None = None) -> None:
         self._client = GigaChatClient()
-
-    async def generate_jpg(
-        self,
-        *,
-        system_style: str,
-        prompt: str,
-        x_client_id: str | None = None,
-    ) -> tuple[str, bytes]:
-        """Return (file_id, jpg_bytes)."""
+        self._session_id = session_id
+        self.last_usage: LLMUsage | None = None
+
+    async def _request_file_id(
+        self, *, system_style: str, prompt: str, x_client_id: str | None
+    ) -> str:
+        """Ask GigaChat to draw; return the generated file_id (sets last_usage)."""
+        self.last_usage = None
         log.debug(
             "GigaChat image generation request: system_style=%s prompt=%s",
             system_style[:100] if len(system_style) > 100 else system_style,
@@ -48,7 +55,9 @@ class GigaChatImageProvider:
             ],
             function_call="auto",
             x_client_id=x_client_id,
+            x_session_id=self._session_id,
         )
+        self.last_usage = self._client.last_usage
         try:
             content = data["choices"][0]["message"]["content"]
             finish_reason = data["choices"][0].get("finish_reason", "unknown")
@@ -73,12 +82,43 @@ class GigaChatImageProvider:
                 f"image file_id not found in content: {content!r}. "
                 f"finish_reason={data.get('choices', [{}])[0].get('finish_reason', 'unknown')}"
             )
+        return file_id
 
+    async def generate_jpg(
+        self,
+        *,
+        system_style: str,
+        prompt: str,
+        x_client_id: str | None = None,
+    ) -> tuple[str, bytes]:
+        """Return (file_id, jpg_bytes)."""
+        file_id = await self._request_file_id(
+            system_style=system_style, prompt=prompt, x_client_id=x_client_id
+        )
         log.debug("GigaChat extracted file_id=%s, downloading...", file_id)
         jpg = await self._client.download_file_content(file_id=file_id, x_client_id=x_client_id)
         log.debug("GigaChat downloaded file_id=%s, size=%d bytes", file_id, len(jpg))
         return file_id, jpg
 
+    async def generate_to_file(
+        self,
+        *,
+        system_style: str,
+        prompt: str,
+        dest_dir: Path,
+        prefix: str = "",
+        x_client_id: str | None = None,
+    ) -> tuple[str, Path]:
+        """Like generate_jpg, but streams the image straight to dest_dir/<prefix><file_id>.<ext>."""
+        file_id = await self._request_file_id(
+            system_style=system_style, prompt=prompt, x_client_id=x_client_id
+        )
+        path = await self._client.download_file_to(
+            file_id=file_id, dest_dir=dest_dir, prefix=prefix, x_client_id=x_client_id
+        )
+        log.debug("GigaChat downloaded file_id=%s to %s", file_id, path.name)
+        return file_id, path
+
 
 def _visual_theme(*, event_type: str, event_title: str) -> str:
     t = (event_title or "").lower()
@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+
+from app.agent.gigachat_providers import GigaChatImageProvider, build_illustration_prompt
+from app.agent.llm_usage import LLMUsage
+from app.services.artifact_layout import artifact_dir
+
+log = logging.getLogger(__name__)
+
+
+def theme_key(*, event_type: str, event_title: str) -> str:
+    """Stable key of the illustration prompt (style + theme), independent of the recipient."""
+    style, prompt = build_illustration_prompt(
+        event_type=event_type, event_title=event_title, recipient_line="", company=None
+    )
+    return hashlib.sha256(f"{style}\n{prompt}".encode()).hexdigest()[:12]
+
+
+class IllustrationLibrary:
+    """Pool of up to `per_theme` GigaChat illustrations per visual theme, shared by clients.
+
+    Illustrations are text-free and depend only on the theme, so one image can serve many
+    greetings. Files live next to the other cards as `gigachat_<theme>_<file_id>.<ext>`, which makes
+    the library persistent across runs and processes. Images are handed out round-robin;
+    missing ones are generated in the background (one request at a time, at most `budget`
+    generations per library instance, i.e. per run).
+    """
+
+    def __init__(
+        self,
+        provider: GigaChatImageProvider,
+        *,
+        cards_dir: Path,
+        per_theme: int,
+        budget: int,
+        usage: LLMUsage | None = None,
+    ) -> None:
+        self._provider = provider
+        self._cards_dir = cards_dir
+        self._per_theme = max(1, int(per_theme))
+        self._budget = max(0, int(budget))
+        self._usage = usage if usage is not None else LLMUsage()
+        self._images: dict[str, list[Path]] = {}
+        self._next: dict[str, int] = {}
+        self._pending: dict[str, asyncio.Task[Path | None]] = {}
+        # One generation at a time: GigaChat rate-limits images, and provider.last_usage is
+        # per call, so overlapping requests would mix up the accounting.
+        self._lock = asyncio.Lock()
+        self._attempts = 0
+        self.generated = 0
+
+    def _pool(self, key: str) -> list[Path]:
+        if key not in self._images:
+            prefix = f"gigachat_{key}_"
+            # The theme's shard (see artifact_layout), plus the flat dir for older files.
+            dirs = {artifact_dir(self._cards_dir, prefix), self._cards_dir}
+            self._images[key] = sorted(p for d in dirs for p in d.glob(f"{prefix}*.*"))
+        return self._images[key]
+
+    def has_images(self, key: str) -> bool:
+        return bool(self._pool(key))
+
+    def prefetch(self, *, event_type: str, event_title: str) -> None:
+        """Start generating the theme's first image now (e.g. for a planned budget slot)."""
+        key = theme_key(event_type=event_type, event_title=event_title)
+        self._top_up(key, event_type=event_type, event_title=event_title)
+
+    def pick(self, *, event_type: str, event_title: str) -> Path | None:
+        """Next image for the theme (round-robin), topping the pool up in the background."""
+        key = theme_key(event_type=event_type, event_title=event_title)
+        pool = self._pool(key)
+        self._top_up(key, event_type=event_type, event_title=event_title)
+        if not pool:
+            return None
+        i = self._next.get(key, 0)
+        self._next[key] = i + 1
+        return pool[i % len(pool)]
+
+    async def wait(self, *, event_type: str, event_title: str) -> Path | None:
+        """Like pick, but waits for an in-flight generation if the theme has no image yet."""
+        path = self.pick(event_type=event_type, event_title=event_title)
+        if path is not None:
+            return path
+        task = self._pending.get(theme_key(event_type=event_type, event_title=event_title))
+        if task is None:
+            return None
+        await asyncio.shield(task)
+        return self.pick(event_type=event_type, event_title=event_title)
+
+    def _top_up(self, key: str, *, event_type: str, event_title: str) -> None:
+        if key in self._pending or len(self._pool(key)) >= self._per_theme:
+            return
+        if self._attempts >= self._budget:
+            return
+        self._attempts += 1
+        task = asyncio.create_task(
+            self._generate(key, event_type=event_type, event_title=event_title)
+        )
+        self._pending[key] = task
+        task.add_done_callback(lambda _t: self._pending.pop(key, None))
+
+    async def _generate(self, key: str, *, event_type: str, event_title: str) -> Path | None:
+        style, prompt = build_illustration_prompt(
+            event_type=event_type, event_title=event_title, recipient_line="", company=None
+        )
+        async with self._lock:
+            try:
+                try:
+                    # Streamed straight into the card file: no image-sized buffers.
+                    _file_id, path = await self._provider.generate_to_file(
+                        system_style=style,
+                        prompt=prompt,
+                        dest_dir=artifact_dir(self._cards_dir, f"gigachat_{key}_"),
+                        prefix=f"gigachat_{key}_",
+                    )
+                finally:
+                    self._usage.add(self._provider.last_usage)
+            except Exception as e:
+                log.warning(
+                    "GigaChat illustration failed for theme=%s (%s): %s", key, event_title, e
+                )
+                return None
+        self.generated += 1
+        self._pool(key).append(path)
+        log.info(
+            "GigaChat illustration added: theme=%s file=%s (pool %s/%s, generated %s/%s)",
+            key,
+            path.name,
+            len(self._pool(key)),
+            self._per_theme,
+            self.generated,
+            self._budget,
+        )
+        return path
+
+    async def aclose(self) -> None:
+        """Let in-flight generations finish (their tokens are already spent)."""
+        while self._pending:
+            await asyncio.gather(*list(self._pending.values()), return_exceptions=True)
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import datetime as dt
+from collections.abc import Callable, Iterable
+from dataclasses import dataclass
+
+from app.agent.illustration_library import theme_key
+from app.db.models import Client, Event
+
+_SEGMENT_RANK = {"vip": 0}
+_EVENT_TYPE_RANK = {"birthday": 0, "manual": 1, "holiday": 2}
+
+
+def image_priority(*, segment: str | None, event_type: str, event_date: dt.date) -> tuple:
+    """Sort key (lower = more important): VIP first, then birthdays, then the sooner event."""
+    return (
+        _SEGMENT_RANK.get((segment or "").lower(), 1),
+        _EVENT_TYPE_RANK.get((event_type or "").lower(), 3),
+        event_date,
+    )
+
+
+@dataclass(frozen=True)
+class ImagePlan:
+    granted: frozenset[int]  # event ids that get a GigaChat illustration attempt
+    # (event_type, event_title) of themes whose first image is generated, in priority order
+    new_themes: tuple[tuple[str, str], ...]
+
+
+def plan_images(
+    candidates: Iterable[tuple[Event, Client]],
+    *,
+    slots: int,
+    has_images: Callable[[str], bool],
+) -> ImagePlan:
+    """Plan the run's GigaChat image budget before generating anything.
+
+    Events are ranked by image_priority. A theme that already has images costs nothing; a new
+    theme costs one generation slot, reserved for its best-ranked event. Events whose theme
+    got no slot go straight to the Pillow card instead of waiting for GigaChat.
+    """
+    ranked = sorted(
+        candidates,
+        key=lambda ec: image_priority(
+            segment=ec[1].segment, event_type=ec[0].event_type, event_date=ec[0].event_date
+        ),
+    )
+    slots = max(0, int(slots))
+    granted: set[int] = set()
+    funded: set[str] = set()
+    new_themes: list[tuple[str, str]] = []
+    for ev, _client in ranked:
+        key = theme_key(event_type=ev.event_type, event_title=ev.title)
+        if key not in funded:
+            if has_images(key):
+                funded.add(key)
+            elif len(new_themes) < slots:
+                funded.add(key)
+                new_themes.append((ev.event_type, ev.title))
+            else:
+                continue
+        granted.add(ev.id)
+    return ImagePlan(granted=frozenset(granted), new_themes=tuple(new_themes))
@@ -1,23 +1,70 @@
 from __future__ import annotations
 
 import datetime as dt
+import json
+
+# The system prompt is the STABLE PREFIX of every greeting request: it holds all static
+# instructions and must not depend on the client/event. Identical prefixes let providers reuse
+# cached context (GigaChat via X-Session-ID, OpenAI-compatible servers via prefix caching).
+# Everything per-call goes into the compact JSON user message (see build_user_prompt).
+_SYSTEM_PROMPT = (
+    "Ты эксперт по созданию персональных поздравлений от Сбербанка для клиентов.\n"
+    "Твоя задача — создать уникальное, тёплое и содержательное поздравление, которое демонстрирует "
+    "индивидуальный подход к каждому клиенту.\n\n"
+    "ВХОД: каждое сообщение пользователя — JSON вида\n"
+    '{"event":{"type":"birthday|holiday|manual","title":"...","date":"YYYY-MM-DD"},'
+    '"segment":"...","tone":"official|warm","facts":{...}}\n'
+    "- facts — единственный источник сведений о клиенте (FACTS).\n"
+    "- tone — рекомендуемый тон: official (деловой, уважительный, для VIP — сохраняя теплоту) "
+    "или warm (тёплый, дружелюбный, но профессиональный).\n\n"
+    "КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:\n"
+    "- Используй ТОЛЬКО факты из FACTS (не выдумывай детали о компании, достижениях, проектах, истории сотрудничества).\n"
+    "- Имя/отчество: используй только то, что есть в FACTS. Если отчество пустое/отсутствует — НЕ придумывай его.\n"
+    "- Не добавляй и не запрашивай чувствительные данные (паспорт, номера карт, PIN/CVV и т.п.).\n"
+    "- Без фамильярности, без политических/спорных тем.\n"
+    "- Не упоминай тему/вид последнего взаимодействия с клиентом; используй только общую благодарность за сотрудничество.\n"
+    "- Каждое поздравление должно быть УНИКАЛЬНЫМ — избегай шаблонных фраз и одинаковых начал.\n"
+    "- Проверь грамматику, пунктуацию и согласование в русском языке.\n\n"
+    "ПЕРСОНАЛИЗАЦИЯ для дня рождения (event.type = birthday):\n"
+    "- Обращайся по имени и отчеству ТОЛЬКО если middle_name непустое; иначе по имени "
+    "(или имя+фамилия для official), отчество НЕ выдумывай.\n"
+    "- Если в FACTS указана компания (company_name): упомяни успехи в работе, но БЕЗ конкретных "
+    "проектов/цифр; если не указана — компанию НЕ упоминай.\n"
+    "- Если указана должность (position): свяжи пожелания с профессиональным развитием, но БЕЗ "
+    "выдуманных деталей.\n"
+    "- Пожелания, подходящие именно этому человеку (здоровье, успех в делах, гармония).\n\n"
+    "ПЕРСОНАЛИЗАЦИЯ для праздника (event.type = holiday или manual):\n"
+    "- Адаптируй поздравление под конкретный праздник (event.title), учитывая его суть и значение.\n"
+    "- Используй имя клиента естественно, не перегружая.\n"
+    "- Если указана компания (company_name): свяжи пожелания с бизнес-контекстом, но БЕЗ "
+    "конкретных проектов.\n"
+    "- Если указана должность (position): учитывай профессиональную роль, но БЕЗ выдуманных "
+    "достижений.\n"
+    "- Найди уникальный угол: что праздник значит для бизнеса/личности.\n\n"
+    "ТРЕБОВАНИЯ к тексту (ОБЯЗАТЕЛЬНО соблюдай):\n"
+    "- subject: 6..80 символов, привлекательный заголовок с упоминанием повода.\n"
+    "- body: НЕ МЕНЕЕ 450 символов (целевой диапазон 600-900, максимум 1200), 3-5 абзацев, без списков. "
+    "Короткие тексты НЕДОПУСТИМЫ.\n"
+    "- Структура body: уникальное вступление (НЕ шаблонное «Поздравляем с...»); "
+    "2-3 абзаца персонализированных пожеланий, связанных с FACTS; "
+    "заключение с благодарностью «Спасибо, что остаётесь с нами».\n"
+    "- Текст должен звучать как написанный человеком, не как шаблон.\n"
+    "- НЕ упоминай: 'ИИ', 'модель', 'промпт', внутренние процессы, конкретные банковские продукты.\n\n"
+    "ВЫХОД: РОВНО один JSON без markdown и без лишнего текста:\n"
+    '{"tone":"official|warm","subject":"string","body":"string"}\n'
+)
 
 
 def build_system_prompt() -> str:
-    return (
-        "Ты эксперт по созданию персональных поздравлений от Сбербанка для клиентов.\n"
-        "Твоя задача — создать уникальное, тёплое и содержательное поздравление, которое демонстрирует "
-        "индивидуальный подход к каждому клиенту.\n\n"
-        "КРИТИЧЕСКИ ВАЖНЫЕ ПРАВИЛА:\n"
-        "- Используй ТОЛЬКО факты из блока FACTS (не выдумывай детали о компании, достижениях, проектах, истории сотрудничества).\n"
-        "- Имя/отчество: используй только то, что есть в FACTS. Если отчество пустое/отсутствует — НЕ придумывай его.\n"
-        "- Не добавляй и не запрашивай чувствительные данные (паспорт, номера карт, PIN/CVV и т.п.).\n"
-        "- Тон: деловой/тёплый в зависимости от сегмента клиента и типа праздника, без фамильярности, без политических/спорных тем.\n"
-        "- Не упоминай тему/вид последнего взаимодействия с клиентом; используй только общую благодарность за сотрудничество.\n"
-        "- Каждое поздравление должно быть УНИКАЛЬНЫМ — избегай шаблонных фраз и одинаковых начал.\n"
-        "- Проверь грамматику, пунктуацию и согласование в русском языке.\n"
-        "- Выводи РОВНО JSON без markdown и без лишнего текста.\n"
-    )
+    return _SYSTEM_PROMPT
+
+
+def recommended_tone(*, segment: str, tone_hint: str | None = None) -> str:
+    """Tone hint from holiday tags wins; otherwise VIP → official, everyone else → warm."""
+    hint = (tone_hint or "").lower()
+    if hint in {"official", "warm"}:
+        return hint
+    return "official" if (segment or "").lower() == "vip" else "warm"
 
 
 def build_user_prompt(
@@ -29,7 +76,7 @@ def build_user_prompt(
     facts: dict,
     tone_hint: str | None = None,
 ) -> str:
-    """Build user prompt for greeting generation.
+    """Build the per-call suffix: a compact JSON document with event context and facts.
 
     Args:
         event_type: birthday|holiday|manual
@@ -39,72 +86,10 @@ def build_user_prompt(
         facts: словарь с фактами о клиенте
         tone_hint: подсказка тона из holiday_tags (official|warm), если есть
     """
-    # Определяем рекомендацию по тону
-    tone_guidance = ""
-    if tone_hint:
-        if tone_hint.lower() == "official":
-            tone_guidance = "Рекомендуемый тон: official (деловой, уважительный)."
-        elif tone_hint.lower() == "warm":
-            tone_guidance = "Рекомендуемый тон: warm (тёплый, дружелюбный)."
-    elif segment.lower() == "vip":
-        tone_guidance = (
-            "Клиент VIP-сегмента: используй более деловой тон (official), но сохраняй теплоту."
-        )
-    else:
-        tone_guidance = "Используй тёплый тон (warm), но оставайся профессиональным."
-
-    # Персонализация в зависимости от типа события
-    personalization_guidance = ""
-    if event_type.lower() == "birthday":
-        personalization_guidance = (
-            "ПЕРСОНАЛИЗАЦИЯ для дня рождения:\n"
-            "- Используй имя и отчество ТОЛЬКО если отчество дано в FACTS (middle_name).\n"
-            "- Если middle_name пустое/отсутствует: обращайся по имени (или имя+фамилия для official), но НЕ выдумывай отчество.\n"
-            "- Если известна компания: упомяни успехи в работе, но БЕЗ конкретных проектов/цифр.\n"
-            "- Если известна должность: свяжи пожелания с профессиональным развитием, но БЕЗ выдуманных деталей.\n"
-            "- Добавь пожелания, которые подходят именно этому человеку (здоровье, успех в делах, гармония).\n"
-        )
-    else:
-        # holiday или manual
-        personalization_guidance = (
-            "ПЕРСОНАЛИЗАЦИЯ для праздника:\n"
-            "- Адаптируй поздравление под конкретный праздник, учитывая его суть и значение.\n"
-            "- Используй имя клиента естественно, не перегружая.\n"
-            "- Если известна компания: свяжи пожелания с бизнес-контекстом, но БЕЗ конкретных проектов.\n"
-            "- Если известна должность: учитывай профессиональную роль, но БЕЗ выдуманных достижений.\n"
-            "- Для каждого праздника найди уникальный угол: что он значит для бизнеса/личности.\n"
-        )
-
-    # Строим промпт
-    prompt_parts = [
-        "Сгенерируй персональное поздравление от Сбербанка.\n\n",
-        "FACTS о клиенте (используй ТОЛЬКО эти данные, не выдумывай ничего):\n",
-        f"{facts}\n\n",
-        "КОНТЕКСТ события:\n",
-        f"- Тип события: {event_type}\n",
-        f"- Название: {event_title}\n",
-        f"- Дата: {event_date.isoformat()}\n",
-        f"- Сегмент клиента: {segment}\n",
-        f"- {tone_guidance}\n\n",
-        personalization_guidance,
-        "\nТРЕБОВАНИЯ к тексту (ОБЯЗАТЕЛЬНО соблюдай):\n",
-        "- subject: 6..80 символов, привлекательный заголовок с упоминанием праздника\n",
-        "- body: МИНИМУМ 450 символов (целевой диапазон 600-900 символов, максимум 1200), 3-5 абзацев, без списков\n",
-        "  КРИТИЧЕСКИ ВАЖНО: body должен быть НЕ МЕНЕЕ 450 символов. Короткие тексты (менее 450 символов) НЕДОПУСТИМЫ.\n",
-        "- Структура body:\n",
-        "  • Открытие: уникальное вступление (НЕ шаблонное «Поздравляем с...»)\n",
-        "  • Основная часть: персонализированные пожелания, связанные с FACTS (2-3 абзаца)\n",
-        "  • Заключение: благодарность «Спасибо, что остаётесь с нами» (без упоминания тем последних контактов)\n",
-        "- РАЗНООБРАЗИЕ: каждый текст должен быть уникальным — используй разные формулировки, начинай по-разному\n",
-        "- ЕСТЕСТВЕННОСТЬ: текст должен звучать как написанный человеком, не как шаблон\n",
-        "- РЕЛЕВАНТНОСТЬ: адаптируй поздравление под конкретный праздник (Новый год, 8 Марта, день рождения и т.д.)\n",
-        "- НЕ упоминай: 'ИИ', 'модель', 'промпт', внутренние процессы, конкретные банковские продукты\n\n",
-        "OUTPUT JSON schema:\n",
-        "{\n",
-        '  "tone": "official|warm",\n',
-        '  "subject": "string",\n',
-        '  "body": "string"\n',
-        "}\n",
-    ]
-
-    return "".join(prompt_parts)
+    payload = {
+        "event": {"type": event_type, "title": event_title, "date": event_date.isoformat()},
+        "segment": segment,
+        "tone": recommended_tone(segment=segment, tone_hint=tone_hint),
+        "facts": facts,
+    }
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":"))
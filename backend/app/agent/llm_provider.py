@@ -1,13 +1,14 @@
 from __future__ import annotations
 
 import json
-import re
+import time
 from dataclasses import dataclass
 
 import httpx
 from tenacity import retry, stop_after_attempt, wait_exponential
 
 from app.agent.gigachat_providers import GigaChatTextProvider
+from app.agent.llm_usage import LLMUsage, usage_from_response
 from app.core.config import settings
 
 
@@ -23,6 +24,9 @@ class LLMProviderError(RuntimeError):
 
 
 class BaseLLMProvider:
+    # Usage of the most recent successful generate() call; None if the provider can't tell.
+    last_usage: LLMUsage | None = None
+
     async def generate(self, *, system: str, user: str) -> str:
         raise NotImplementedError
 
@@ -38,6 +42,7 @@ class OpenAICompatibleProvider(BaseLLMProvider):
 
     @retry(stop=stop_after_attempt(3), wait=wait_exponential(multiplier=0.5, min=0.5, max=3))
     async def generate(self, *, system: str, user: str) -> str:
+        self.last_usage = None
         url = f"{self._base_url}/chat/completions"
         headers = {"Authorization": f"Bearer {settings.openai_api_key}"}
         payload = {
@@ -49,10 +54,14 @@ class OpenAICompatibleProvider(BaseLLMProvider):
             ],
         }
 
+        started = time.perf_counter()
         async with httpx.AsyncClient(timeout=self._timeout) as client:
             r = await client.post(url, headers=headers, json=payload)
             r.raise_for_status()
             data = r.json()
+        self.last_usage = usage_from_response(
+            data, latency_ms=(time.perf_counter() - started) * 1000
+        )
 
         try:
             return data["choices"][0]["message"]["content"]
@@ -60,7 +69,12 @@ class OpenAICompatibleProvider(BaseLLMProvider):
             raise LLMProviderError(f"unexpected response shape: {data}") from e
 
 
-def get_llm_provider() -> BaseLLMProvider | None:
+def get_llm_provider(*, session_id: str | None = None) -> BaseLLMProvider | None:
+    """Return the configured text provider (None in template mode / without credentials).
+
+    `session_id` groups calls (e.g. one agent run) so GigaChat can reuse the cached prompt
+    prefix. OpenAI-compatible servers cache identical prefixes on their own.
+    """
     mode = (settings.llm_mode or "template").lower()
     if mode == "openai":
         if not settings.openai_api_key:
@@ -73,128 +87,63 @@ def get_llm_provider() -> BaseLLMProvider | None:
         # Wrap into BaseLLMProvider interface
         class _Adapter(BaseLLMProvider):
             def __init__(self) -> None:
-                self._p = GigaChatTextProvider()
+                self._p = GigaChatTextProvider(session_id=session_id)
 
             async def generate(self, *, system: str, user: str) -> str:
-                return await self._p.generate(system=system, user=user)
+                content = await self._p.generate(system=system, user=user)
+                self.last_usage = self._p.last_usage
+                return content
 
         return _Adapter()
     return None
 
 
-def parse_llm_json(content: str) -> LLMResult:
-    """Parse strict JSON output from LLM into a structured result.
+# Strict=False lets the C scanner accept raw control characters (newlines/CR/tabs) inside
+# string literals, which is exactly the "almost JSON" some providers return.
+_JSON_DECODER = json.JSONDecoder(strict=False)
+_REQUIRED_KEYS = frozenset({"tone", "subject", "body"})
 
-    Handles cases where LLM wraps JSON in markdown code blocks (```json ... ```)
-    or returns pretty-printed JSON with newlines.
 
-    Raises LLMProviderError on invalid format.
+def _scan_first_json_object(content: str) -> dict | None:
+    """Return the first complete JSON object in ``content`` that has the required keys.
+
+    Single pass over the text: we jump from one ``{`` to the next and let the C JSON scanner
+    decode the object in place (``raw_decode``), so markdown fences, prose before/after the
+    object and raw newlines inside string values are all handled without building copies of
+    the content. A decoded object without the required keys is skipped past its end; a
+    candidate that fails to decode is skipped up to where the scanner gave up, so every
+    character is scanned about once however many braces there are (the price: an object
+    nested inside a broken one is not recovered).
     """
-    content_original = content
-    content = content.strip()
-
-    def _repair_unescaped_newlines_in_json_strings(s: str) -> str:
-        """Make 'almost JSON' valid JSON by escaping raw newlines inside string literals.
-
-        Some providers return JSON-looking text where the value of "body" contains literal
-        newlines inside quotes. This is INVALID JSON (newlines must be escaped as \\n).
-        We repair it with a small state machine, without changing newlines outside strings.
-        """
-        out: list[str] = []
-        in_str = False
-        esc = False
-        for ch in s:
-            if in_str:
-                if esc:
-                    out.append(ch)
-                    esc = False
-                    continue
-                if ch == "\\":
-                    out.append(ch)
-                    esc = True
-                    continue
-                if ch == '"':
-                    out.append(ch)
-                    in_str = False
-                    continue
-                if ch == "\n":
-                    out.append("\\n")
-                    continue
-                if ch == "\r":
-                    out.append("\\r")
-                    continue
-                out.append(ch)
-                continue
-
-            # outside string literal
-            if ch == '"':
-                out.append(ch)
-                in_str = True
-            else:
-                out.append(ch)
-        return "".join(out)
-
-    def _try_parse(candidate: str) -> dict | None:
-        # 1) strict parse
+    pos = content.find("{")
+    while pos >= 0:
         try:
-            obj = json.loads(candidate)
-            if isinstance(obj, dict) and {"tone", "subject", "body"} <= set(obj.keys()):
-                return obj
-        except json.JSONDecodeError:
-            pass
+            obj, end = _JSON_DECODER.raw_decode(content, pos)
+        except json.JSONDecodeError as e:
+            if e.msg.startswith("Unterminated string"):
+                # No closing quote up to the end: nothing after it can have quoted keys.
+                return None
+            pos = content.find("{", max(e.pos, pos + 1))
+            continue
+        if isinstance(obj, dict) and _REQUIRED_KEYS <= obj.keys():
+            return obj
+        pos = content.find("{", end)
+    return None
 
-        # 2) repair common "almost-json" issue (raw newlines inside strings)
-        try:
-            repaired = _repair_unescaped_newlines_in_json_strings(candidate)
-            obj = json.loads(repaired)
-            if isinstance(obj, dict) and {"tone", "subject", "body"} <= set(obj.keys()):
-                return obj
-        except json.JSONDecodeError:
-            return None
-        return None
 
-    # Try to find JSON in markdown code block: ```json ... ``` or ``` ... ```
-    json_match = re.search(r"```(?:json)?\s*\n?(.*?)```", content, re.DOTALL | re.IGNORECASE)
-    if json_match:
-        content = json_match.group(1).strip()
+def parse_llm_json(content: str) -> LLMResult:
+    """Parse strict JSON output from LLM into a structured result.
 
-    # Try parsing as-is first (most common case - pretty-printed JSON is valid)
-    obj = _try_parse(content)
+    Handles cases where LLM wraps JSON in markdown code blocks (```json ... ```),
+    adds text around the object or returns "almost JSON" with raw newlines inside strings.
+
+    Raises LLMProviderError on invalid format.
+    """
+    obj = _scan_first_json_object(content)
     if obj is not None:
         return _validate_and_return(obj)
 
-    # If direct parse failed, try to find JSON object in the content
-    # Use a more sophisticated approach: find the first { and try to parse until matching }
-    if not content.startswith("{"):
-        # Try to find JSON object boundary more carefully
-        start_idx = content.find("{")
-        if start_idx >= 0:
-            # Try to find matching closing brace
-            brace_count = 0
-            end_idx = start_idx
-            for i in range(start_idx, len(content)):
-                if content[i] == "{":
-                    brace_count += 1
-                elif content[i] == "}":
-                    brace_count -= 1
-                    if brace_count == 0:
-                        end_idx = i + 1
-                        break
-            if end_idx > start_idx:
-                content = content[start_idx:end_idx]
-                obj = _try_parse(content)
-                if obj is not None:
-                    return _validate_and_return(obj)
-
-    # Last resort: try regex extraction (less reliable)
-    json_match = re.search(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", content, re.DOTALL)
-    if json_match:
-        obj = _try_parse(json_match.group(0))
-        if obj is not None:
-            return _validate_and_return(obj)
-
-    # If all parsing attempts failed, raise error with full content preview
-    preview = content_original[:500] if len(content_original) > 500 else content_original
+    preview = content[:500] if len(content) > 500 else content
     raise LLMProviderError(
         f"LLM did not return valid JSON. Content preview (first 500 chars): {preview!r}"
     )
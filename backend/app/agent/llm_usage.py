@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+
+
+@dataclass
+class LLMUsage:
+    """Token spend + latency of one or more chat completion calls."""
+
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    latency_ms: int = 0
+    calls: int = 0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, other: LLMUsage | None) -> None:
+        if other is None:
+            return
+        self.prompt_tokens += other.prompt_tokens
+        self.completion_tokens += other.completion_tokens
+        self.latency_ms += other.latency_ms
+        self.calls += other.calls
+
+
+def usage_from_response(data: dict, *, latency_ms: float) -> LLMUsage:
+    """Read the OpenAI-style `usage` block (GigaChat uses the same shape).
+
+    Missing/garbled usage is recorded as zero tokens: accounting must never fail a generation.
+    """
+    usage = data.get("usage") if isinstance(data, dict) else None
+    usage = usage if isinstance(usage, dict) else {}
+
+    def _int(key: str) -> int:
+        try:
+            return max(0, int(usage.get(key) or 0))
+        except (TypeError, ValueError):
+            return 0
+
+    return LLMUsage(
+        prompt_tokens=_int("prompt_tokens"),
+        completion_tokens=_int("completion_tokens"),
+        latency_ms=int(round(latency_ms)),
+        calls=1,
+    )
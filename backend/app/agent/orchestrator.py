@@ -1,19 +1,36 @@
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
 import logging
+import uuid
+from collections.abc import Awaitable
 from pathlib import Path
+from typing import Any
 
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.agent.generator import generate_subject_body
-from app.agent.gigachat_providers import GigaChatImageProvider, build_illustration_prompt
+from app.agent.gigachat_providers import GigaChatImageProvider
+from app.agent.illustration_library import IllustrationLibrary
+from app.agent.image_budget import image_priority, plan_images
+from app.agent.llm_provider import get_llm_provider
+from app.agent.llm_usage import LLMUsage
 from app.core.config import settings
 from app.db.models import AgentRun, Client, Event, Greeting
-from app.services.card_renderer import render_card
+from app.services.card_pool import get_card_pool
+from app.services.card_renderer import (
+    cached_card,
+    card_path,
+    draw_card,
+    render_card,
+    save_card,
+)
 from app.services.due_sender import send_due_greetings
 from app.services.event_detector import ensure_upcoming_events
+from app.services.lazy_cards import card_spec
 from app.services.template_selector import choose_template
 
 log = logging.getLogger(__name__)
@@ -26,6 +43,7 @@ class AgentSummary:
         self.sent_deliveries = 0
         self.skipped_existing = 0
         self.errors = 0
+        self.usage = LLMUsage()
 
     def as_dict(self) -> dict:
         return {
@@ -34,6 +52,22 @@ class AgentSummary:
             "sent_deliveries": self.sent_deliveries,
             "skipped_existing": self.skipped_existing,
             "errors": self.errors,
+            "prompt_tokens": self.usage.prompt_tokens,
+            "completion_tokens": self.usage.completion_tokens,
+        }
+
+    def run_values(self) -> dict:
+        """Counters persisted on AgentRun."""
+        return {
+            "scanned_events": self.scanned_events,
+            "generated_greetings": self.generated_greetings,
+            "sent_deliveries": self.sent_deliveries,
+            "skipped_existing": self.skipped_existing,
+            "errors": self.errors,
+            "llm_calls": self.usage.calls,
+            "prompt_tokens": self.usage.prompt_tokens,
+            "completion_tokens": self.usage.completion_tokens,
+            "llm_latency_ms": self.usage.latency_ms,
         }
 
 
@@ -54,6 +88,73 @@ def _client_context(c: Client) -> dict:
     }
 
 
+CARDS_DIR = Path(__file__).resolve().parents[2] / "data" / "cards"
+
+
+async def _gather_or_cancel(*aws: Awaitable[Any]) -> list[Any]:
+    """Like asyncio.gather, but the first failure cancels (and awaits) the siblings."""
+    tasks = [asyncio.ensure_future(a) for a in aws]
+    try:
+        return list(await asyncio.gather(*tasks))
+    except BaseException:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+
+
+async def _generate_card(
+    *,
+    ev: Event,
+    recipient_line: str,
+    cards_dir: Path,
+    library: IllustrationLibrary | None,
+    lazy: bool = False,
+) -> tuple[Path, bool]:
+    """Return (card_path, is_gigachat).
+
+    With an illustration library, a ready themed image is used right away. If the theme has
+    none yet, we wait for its generation while the deterministic Pillow fallback is drawn in
+    the card pool, so a failed image costs no extra latency. With `lazy`, Pillow cards are not
+    rendered at all: the returned (content-addressed) path is rendered on first access.
+    """
+    card: dict[str, Any] = {
+        "title": ev.title,
+        "recipient_line": recipient_line,
+        "date": ev.event_date,
+        "brand_line": "Сбер",
+    }
+    pool = get_card_pool()
+    if library is None:
+        if lazy:
+            return card_path(out_dir=cards_dir, **card), False
+        return await pool.run(render_card, out_dir=cards_dir, **card), False
+
+    picked = library.pick(event_type=ev.event_type, event_title=ev.title)
+    if picked is not None:
+        return picked, True
+
+    if lazy:
+        picked = await library.wait(event_type=ev.event_type, event_title=ev.title)
+        return (picked, True) if picked else (card_path(out_dir=cards_dir, **card), False)
+
+    # A cached Pillow card needs no drawing at all.
+    cached = await pool.run(cached_card, out_dir=cards_dir, **card)
+    fallback = asyncio.ensure_future(
+        asyncio.sleep(0, cached) if cached else pool.run(draw_card, **card)
+    )
+    try:
+        picked = await library.wait(event_type=ev.event_type, event_title=ev.title)
+        if picked is not None:
+            return picked, True
+        prepared = await fallback
+        if isinstance(prepared, Path):
+            return prepared, False
+        return await pool.run(save_card, prepared, out_dir=cards_dir, **card), False
+    finally:
+        fallback.cancel()
+
+
 async def run_once(
     session: AsyncSession,
     *,
@@ -65,7 +166,7 @@ async def run_once(
     lookahead_days = int(lookahead_days or settings.lookahead_days)
 
     summary = AgentSummary()
-    gigachat_images_used = 0
+    lazy_cards = (settings.card_render_mode or "eager").lower() == "lazy"
 
     # Create AgentRun record early to have audit trail even on failures.
     run = AgentRun(
@@ -82,20 +183,32 @@ async def run_once(
     run_id = run.id
 
     async def _update_run_progress(*, status: str | None = None) -> None:
-        values: dict = {
-            "scanned_events": summary.scanned_events,
-            "generated_greetings": summary.generated_greetings,
-            "sent_deliveries": summary.sent_deliveries,
-            "skipped_existing": summary.skipped_existing,
-            "errors": summary.errors,
-        }
+        values: dict = summary.run_values()
         if status is not None:
             values["status"] = status
         await session.execute(update(AgentRun).where(AgentRun.id == run_id).values(**values))
         await session.commit()
 
+    # One LLM session per run: calls share X-Session-ID (GigaChat reuses the cached system
+    # prompt prefix) and the providers are reused, so we fetch one OAuth token per run.
+    llm_session_id = str(uuid.uuid4())
+    library: IllustrationLibrary | None = None
+    if (
+        settings.image_mode
+        and settings.image_mode.lower() == "gigachat"
+        and settings.gigachat_credentials
+    ):
+        library = IllustrationLibrary(
+            GigaChatImageProvider(session_id=llm_session_id),
+            cards_dir=CARDS_DIR,
+            per_theme=settings.gigachat_illustrations_per_theme,
+            budget=settings.max_gigachat_images_per_run,
+            usage=summary.usage,
+        )
+
     # 1) Ensure events exist (idempotent)
     try:
+        llm_provider = get_llm_provider(session_id=llm_session_id)
         await ensure_upcoming_events(session, today=today, lookahead_days=lookahead_days)
 
         # 2) Fetch events in window
@@ -110,6 +223,57 @@ async def run_once(
             .all()
         )
 
+        client_ids = {ev.client_id for ev in events if ev.client_id is not None}
+        clients: dict[int, Client] = {}
+        if client_ids:
+            rows = await session.execute(select(Client).where(Client.id.in_(client_ids)))
+            clients = {c.id: c for c in rows.scalars().all()}
+
+        # Plan the image budget for the whole run up front: the most important events (VIP,
+        # birthdays, soonest) get GigaChat slots and are processed first; the rest skip
+        # straight to the Pillow card.
+        image_plan = None
+        if library is not None:
+            done = set(
+                (
+                    await session.execute(
+                        select(Greeting.event_id).where(
+                            Greeting.event_id.in_([ev.id for ev in events])
+                        )
+                    )
+                )
+                .scalars()
+                .all()
+            )
+            image_plan = plan_images(
+                [
+                    (ev, clients[ev.client_id])
+                    for ev in events
+                    if ev.id not in done and ev.client_id in clients
+                ],
+                slots=settings.max_gigachat_images_per_run,
+                has_images=library.has_images,
+            )
+            for event_type, event_title in image_plan.new_themes:
+                library.prefetch(event_type=event_type, event_title=event_title)
+            log.info(
+                "Image plan: %s events with GigaChat illustrations, %s new themes",
+                len(image_plan.granted),
+                len(image_plan.new_themes),
+            )
+        events = sorted(
+            events,
+            key=lambda ev: image_priority(
+                segment=getattr(
+                    clients.get(ev.client_id) if ev.client_id is not None else None,
+                    "segment",
+                    None,
+                ),
+                event_type=ev.event_type,
+                event_date=ev.event_date,
+            ),
+        )
+
         for ev in events:
             summary.scanned_events += 1
             try:
@@ -123,11 +287,10 @@ async def run_once(
                         await _update_run_progress()
                     continue
 
-                client = None
-                if ev.client_id is not None:
-                    client = (
-                        await session.execute(select(Client).where(Client.id == ev.client_id))
-                    ).scalar_one_or_none()
+                # Prefetched above; a rollback after a failed event expires it, so reload then.
+                client = clients.get(ev.client_id) if ev.client_id is not None else None
+                if client is not None and sa_inspect(client).expired:
+                    await session.refresh(client)
                 if not client:
                     # For MVP we require a client to personalize and send.
                     summary.errors += 1
@@ -138,12 +301,6 @@ async def run_once(
                 choice = choose_template(
                     segment=client.segment, event_type=ev.event_type, title=ev.title
                 )
-                tone, subject, body = await generate_subject_body(
-                    event=ev, client=client, template_choice=choice, today=today
-                )
-
-                # Render card
-                cards_dir = Path(__file__).resolve().parents[2] / "data" / "cards"
                 recipient_line = " ".join(
                     [
                         (client.first_name or "").strip(),
@@ -151,62 +308,51 @@ async def run_once(
                         (client.last_name or "").strip(),
                     ]
                 ).strip()
-                card_path = None
-                if (
-                    settings.image_mode
-                    and settings.image_mode.lower() == "gigachat"
-                    and settings.gigachat_credentials
-                ):
-                    if gigachat_images_used >= int(settings.max_gigachat_images_per_run):
-                        card_path = None
-                    else:
-                        try:
-                            style, prompt = build_illustration_prompt(
-                                event_type=ev.event_type,
-                                event_title=ev.title,
-                                recipient_line=recipient_line,
-                                company=client.company_name,
-                            )
-                            provider = GigaChatImageProvider()
-                            file_id, jpg = await provider.generate_jpg(
-                                system_style=style,
-                                prompt=prompt,
-                                x_client_id=str(client.id),
-                            )
-                            cards_dir.mkdir(parents=True, exist_ok=True)
-                            filename = f"gigachat_{file_id}.jpg"
-                            card_path = cards_dir / filename
-                            card_path.write_bytes(jpg)
-                            gigachat_images_used += 1
-                            log.info(
-                                "GigaChat image generated for event=%s client=%s file_id=%s "
-                                "(used %s/%s)",
-                                ev.id,
-                                client.id,
-                                file_id,
-                                gigachat_images_used,
-                                settings.max_gigachat_images_per_run,
-                            )
-                        except Exception as e:
-                            log.warning(
-                                "GigaChat image generation failed for event=%s client=%s: %s",
-                                getattr(ev, "id", None),
-                                getattr(client, "id", None),
-                                e,
-                            )
-                            # Fallback to deterministic Pillow card
-                            card_path = None
-
-                if card_path is None:
-                    card_path = render_card(
-                        out_dir=cards_dir,
+                # Text and card don't depend on each other: run them concurrently, so an event
+                # takes as long as the slower of the two. A fatal failure cancels the other.
+                greeting_usage = LLMUsage()
+                try:
+                    (tone, subject, body), (image_file, is_gigachat) = await _gather_or_cancel(
+                        generate_subject_body(
+                            event=ev,
+                            client=client,
+                            template_choice=choice,
+                            today=today,
+                            usage=greeting_usage,
+                            provider=llm_provider,
+                        ),
+                        _generate_card(
+                            ev=ev,
+                            recipient_line=recipient_line,
+                            cards_dir=CARDS_DIR,
+                            library=(
+                                library
+                                if image_plan is not None and ev.id in image_plan.granted
+                                else None
+                            ),
+                            lazy=lazy_cards,
+                        ),
+                    )
+                finally:
+                    summary.usage.add(greeting_usage)
+                if is_gigachat:
+                    log.info(
+                        "GigaChat illustration for event=%s client=%s: %s",
+                        ev.id,
+                        client.id,
+                        image_file.name,
+                    )
+
+                rel_image_path = f"cards/{image_file.relative_to(CARDS_DIR).as_posix()}"
+                spec = None
+                if lazy_cards and not is_gigachat:
+                    spec = card_spec(
                         title=ev.title,
                         recipient_line=recipient_line,
                         date=ev.event_date,
                         brand_line="Сбер",
                     )
-
-                rel_image_path = f"cards/{card_path.name}"
+                used_llm = greeting_usage.calls > 0
 
                 greeting = Greeting(
                     event_id=ev.id,
@@ -215,7 +361,11 @@ async def run_once(
                     subject=subject,
                     body=body,
                     image_path=rel_image_path,
+                    card_spec=spec,
                     status="needs_approval" if client.segment.lower() == "vip" else "generated",
+                    prompt_tokens=greeting_usage.prompt_tokens if used_llm else None,
+                    completion_tokens=greeting_usage.completion_tokens if used_llm else None,
+                    llm_latency_ms=greeting_usage.latency_ms if used_llm else None,
                 )
                 session.add(greeting)
                 await session.commit()
@@ -242,6 +392,8 @@ async def run_once(
         summary.errors += 1
         await session.rollback()
     finally:
+        if library is not None:
+            await library.aclose()
         # Finalize AgentRun
         finished_at = dt.datetime.now(dt.timezone.utc)
         if summary.errors == 0:
@@ -253,15 +405,7 @@ async def run_once(
         await session.execute(
             update(AgentRun)
             .where(AgentRun.id == run_id)
-            .values(
-                status=final_status,
-                finished_at=finished_at,
-                scanned_events=summary.scanned_events,
-                generated_greetings=summary.generated_greetings,
-                sent_deliveries=summary.sent_deliveries,
-                skipped_existing=summary.skipped_existing,
-                errors=summary.errors,
-            )
+            .values(status=final_status, finished_at=finished_at, **summary.run_values())
         )
         await session.commit()
 
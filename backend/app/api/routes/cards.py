@@ -0,0 +1,47 @@
+from __future__ import annotations
+
+import mimetypes
+
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Greeting
+from app.db.session import get_session
+from app.services.card_pool import get_card_pool
+from app.services.card_variants import VARIANT_WIDTHS, ensure_variant
+from app.services.lazy_cards import materialize_card, strong_etag
+
+router = APIRouter(prefix="/cards")
+
+# URLs carry a version token (see lazy_cards.card_url), so the bytes behind a URL never change.
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{greeting_id}")
+async def get_card(
+    greeting_id: int,
+    request: Request,
+    variant: str = "original",
+    session: AsyncSession = Depends(get_session),
+) -> Response:
+    if variant != "original" and variant not in VARIANT_WIDTHS:
+        raise HTTPException(status_code=404, detail="unknown variant")
+    greeting = await session.get(Greeting, greeting_id)
+    if greeting is None or not greeting.image_path:
+        raise HTTPException(status_code=404, detail="card not found")
+
+    # Rendering (lazy cards) and variant encoding happen on first access, off the event loop.
+    pool = get_card_pool()
+    path = await pool.run(materialize_card, greeting.image_path, greeting.card_spec)
+    if path is not None and variant != "original":
+        path = await pool.run(ensure_variant, greeting.image_path, variant)
+    if path is None:
+        raise HTTPException(status_code=404, detail="card not found")
+
+    etag = await pool.run(strong_etag, path)
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag in {t.strip() for t in request.headers.get("if-none-match", "").split(",")}:
+        return Response(status_code=304, headers=headers)
+    media_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    return FileResponse(path, media_type=media_type, headers=headers)
@@ -4,7 +4,7 @@ from fastapi import APIRouter, Depends
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import Delivery
+from app.db.models import Delivery, DeliveryJob
 from app.db.session import get_session
 
 router = APIRouter(prefix="/deliveries")
@@ -25,6 +25,59 @@ async def list_deliveries(session: AsyncSession = Depends(get_session)) -> list[
             "provider_message": d.provider_message,
             "sent_at": d.sent_at,
             "idempotency_key": d.idempotency_key,
+            "attempts": d.attempts,
+            "next_attempt_at": d.next_attempt_at,
+            "last_error": d.last_error,
         }
         for d in deliveries
     ]
+
+
+@router.get("/retries")
+async def list_retries(
+    limit: int = 100, session: AsyncSession = Depends(get_session)
+) -> list[dict]:
+    """Failed sends waiting for their next attempt, soonest first (ix_deliveries_retry_due)."""
+    q = (
+        select(Delivery)
+        .where(Delivery.status == "retrying")
+        .order_by(Delivery.next_attempt_at)
+        .limit(max(1, min(limit, 1000)))
+    )
+    return [
+        {
+            "id": d.id,
+            "greeting_id": d.greeting_id,
+            "channel": d.channel,
+            "recipient": d.recipient,
+            "attempts": d.attempts,
+            "next_attempt_at": d.next_attempt_at,
+            "last_error": d.last_error,
+        }
+        for d in (await session.execute(q)).scalars()
+    ]
+
+
+@router.get("/queue")
+async def list_delivery_jobs(
+    status: str | None = None, session: AsyncSession = Depends(get_session)
+) -> list[dict]:
+    q = select(DeliveryJob).order_by(DeliveryJob.id.desc())
+    if status:
+        q = q.where(DeliveryJob.status == status)
+    jobs = (await session.execute(q)).scalars().all()
+    return [
+        {
+            "id": j.id,
+            "greeting_id": j.greeting_id,
+            "channel": j.channel,
+            "recipient": j.recipient,
+            "status": j.status,
+            "attempts": j.attempts,
+            "next_attempt_at": j.next_attempt_at,
+            "lease_owner": j.lease_owner,
+            "last_error": j.last_error,
+            "delivery_id": j.delivery_id,
+        }
+        for j in jobs
+    ]
@@ -19,9 +19,19 @@ class Settings(BaseSettings):
     lookahead_days: int = 7
     max_holiday_recipients: int = 12  # prevents token blow-up on demo (per holiday)
     max_gigachat_images_per_run: int = 5  # speed + token safety; rest uses Pillow fallback
+    # Themed illustrations are shared by clients: keep up to N GigaChat images per theme.
+    gigachat_illustrations_per_theme: int = 3
 
     send_mode: str = "file"  # file|smtp|noop
     outbox_dir: str = "./data/outbox"
+    # files: one .txt per delivery; spool: JSON lines appended to rotating segment files
+    outbox_format: str = "files"  # files|spool
+    outbox_spool_segment_bytes: int = 64 * 1024 * 1024
+    outbox_spool_fsync_every: int = 100
+    # data/cards + data/outbox layout: flat, or hash2 = two-level hash shard dirs (ab/cd/).
+    # Switching: python -m app.worker.migrate_layout moves existing files (and DB paths).
+    artifact_layout: str = "flat"  # flat|hash2
+    artifact_migrate_batch_size: int = 500  # files moved (and greetings updated) per commit
 
     # SMTP (optional, real email sending)
     smtp_host: str | None = None
@@ -32,6 +42,44 @@ class Settings(BaseSettings):
     smtp_starttls: bool = True
     smtp_ssl: bool = False
     smtp_timeout_sec: float = 15.0
+    # Pooled SMTP sessions (reused across messages; replaced when idle/exhausted)
+    smtp_pool_size: int = 2
+    smtp_pool_idle_sec: float = 60.0
+    smtp_max_messages_per_connection: int = 100
+    # Pre-encoded attachment bodies shared across emails (LRU, by file path + mtime)
+    mime_cache_max_bytes: int = 64 * 1024 * 1024
+
+    # Channel adapters (app.services.channels): sends in flight and sends/second per channel
+    # (0 = no rate cap). SMS and messenger are local stand-ins writing into OUTBOX_DIR.
+    channel_email_concurrency: int = 4
+    channel_email_rate_per_sec: float = 0.0
+    channel_sms_concurrency: int = 4
+    channel_sms_rate_per_sec: float = 0.0
+    channel_messenger_concurrency: int = 4
+    channel_messenger_rate_per_sec: float = 0.0
+
+    # Delivery outbox (app.services.delivery_queue): sends are queued as DeliveryJob rows.
+    # inline: the deciding process dispatches right away; worker: app.worker.run_dispatcher does.
+    delivery_dispatch: str = "inline"  # inline|worker
+    delivery_workers: int = 2
+    delivery_batch_size: int = 20
+    delivery_poll_sec: float = 2.0
+    delivery_lease_sec: float = 120.0  # a crashed worker's jobs are picked up after this
+    delivery_max_attempts: int = 5  # then the job is dead (greeting status=error)
+    delivery_retry_base_sec: float = 30.0  # backoff: base * 2^(attempt-1), capped
+    delivery_retry_max_sec: float = 3600.0
+    delivery_retry_jitter: float = 0.2  # each backoff is shortened by a random 0..20%
+    # Inline dispatch of the daily due sends: sequential = one batch at a time; concurrent = up
+    # to DUE_SEND_WORKERS batches in flight (each commits once; sends bound per channel above).
+    due_send_mode: str = "sequential"  # sequential|concurrent
+    due_send_workers: int = 4
+
+    # When today's due greetings go out: immediate (all in the daily run), or window = each one
+    # gets a slot in SEND_WINDOW_START..SEND_WINDOW_END of the client's local day (Client.timezone,
+    # else TZ), spaced per channel within CHANNEL_<X>_RATE_PER_SEC (app.services.send_window).
+    send_schedule: str = "immediate"  # immediate|window
+    send_window_start: str = "09:00"
+    send_window_end: str = "18:00"
 
     # Safety: never send to demo/test addresses by default.
     # Allowlist is a comma-separated list of domains, e.g. "mycompany.com,gmail.com".
@@ -41,9 +89,29 @@ class Settings(BaseSettings):
     # LLM (optional). Keep "template" as default for offline demos.
     llm_mode: str = "template"  # template|openai|gigachat
 
+    # Cost estimate for the runs page (currency units per 1K tokens; 0 = show tokens only).
+    llm_price_per_1k_prompt_tokens: float = 0.0
+    llm_price_per_1k_completion_tokens: float = 0.0
+
     # Image generation (optional). Default is deterministic Pillow render.
     image_mode: str = "pillow"  # pillow|gigachat
 
+    # Card rendering + image file writes run off the event loop in this pool.
+    card_pool_kind: str = "thread"  # thread|process
+    card_pool_workers: int = 2
+    card_pool_queue_size: int = 8  # jobs waiting beyond busy workers; callers await a slot
+    # eager: render Pillow cards during the run; lazy: store the spec, render on first access
+    card_render_mode: str = "eager"  # eager|lazy
+    # Artifact GC (app.services.artifact_gc): orphans = files not referenced by the DB.
+    gc_orphan_grace_hours: float = 24.0  # keep young orphans (runs still in flight)
+    gc_outbox_retention_days: int = 30
+    gc_smoke_retention_days: int = 7
+    gc_illustration_retention_days: int = 90  # unreferenced GigaChat library images
+    gc_batch_size: int = 500
+    # Optimized variants (web/messenger/email) for pages and attachments, rendered on first use.
+    card_image_format: str = "webp"  # webp|jpeg (email attachments are always JPEG)
+    card_image_quality: int = 82
+
     # OpenAI-compatible endpoint (OpenAI / vLLM / LM Studio / etc.)
     openai_api_key: str | None = None
     openai_base_url: str = "https://api.openai.com/v1"
@@ -64,6 +132,8 @@ class Settings(BaseSettings):
     gigachat_timeout_sec: float = 30.0
     # Отдельный таймаут для скачивания изображений (обычно дольше, можно поднять для демо)
     gigachat_image_timeout_sec: float = 60.0
+    # Upper bound for a downloaded image (streamed to disk; larger files are rejected)
+    gigachat_image_max_bytes: int = 20_000_000
 
     # TLS / certificates
     gigachat_verify_ssl_certs: bool = True
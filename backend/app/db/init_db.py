@@ -45,6 +45,11 @@ async def _migrate_sqlite(conn) -> None:
             alter_stmts.append("ALTER TABLE greetings ADD COLUMN approved_by VARCHAR(120)")
         if "review_comment" not in existing:
             alter_stmts.append("ALTER TABLE greetings ADD COLUMN review_comment TEXT")
+        for col in ("prompt_tokens", "completion_tokens", "llm_latency_ms"):
+            if col not in existing:
+                alter_stmts.append(f"ALTER TABLE greetings ADD COLUMN {col} INTEGER")
+        if "card_spec" not in existing:
+            alter_stmts.append("ALTER TABLE greetings ADD COLUMN card_spec JSON")
         for stmt in alter_stmts:
             await conn.exec_driver_sql(stmt)
 
@@ -59,8 +64,50 @@ async def _migrate_sqlite(conn) -> None:
             alter_stmts.append("ALTER TABLE clients ADD COLUMN middle_name VARCHAR(100)")
         if "profession" not in existing:
             alter_stmts.append("ALTER TABLE clients ADD COLUMN profession VARCHAR(80)")
+        if "timezone" not in existing:
+            alter_stmts.append("ALTER TABLE clients ADD COLUMN timezone VARCHAR(64)")
         for stmt in alter_stmts:
             await conn.exec_driver_sql(stmt)
+
+        # 3) agent_runs table migrations
+        res = await conn.exec_driver_sql("PRAGMA table_info(agent_runs)")
+        rows = res.fetchall()
+        existing = {r[1] for r in rows}
+        alter_stmts = []
+        for col in ("llm_calls", "prompt_tokens", "completion_tokens", "llm_latency_ms"):
+            if col not in existing:
+                alter_stmts.append(
+                    f"ALTER TABLE agent_runs ADD COLUMN {col} INTEGER NOT NULL DEFAULT 0"
+                )
+        for stmt in alter_stmts:
+            await conn.exec_driver_sql(stmt)
+
+        # 4) deliveries table migrations (retry tracking)
+        res = await conn.exec_driver_sql("PRAGMA table_info(deliveries)")
+        existing = {r[1] for r in res.fetchall()}
+        alter_stmts = []
+        if "attempts" not in existing:
+            alter_stmts.append(
+                "ALTER TABLE deliveries ADD COLUMN attempts INTEGER NOT NULL DEFAULT 1"
+            )
+        if "next_attempt_at" not in existing:
+            alter_stmts.append("ALTER TABLE deliveries ADD COLUMN next_attempt_at DATETIME")
+        if "last_error" not in existing:
+            alter_stmts.append("ALTER TABLE deliveries ADD COLUMN last_error TEXT")
+        for stmt in alter_stmts:
+            await conn.exec_driver_sql(stmt)
+        await conn.exec_driver_sql(
+            "CREATE INDEX IF NOT EXISTS ix_deliveries_retry_due "
+            "ON deliveries (status, next_attempt_at)"
+        )
+
+        # 5) delivery_jobs table migrations
+        res = await conn.exec_driver_sql("PRAGMA table_info(delivery_jobs)")
+        existing = {r[1] for r in res.fetchall()}
+        if existing and "channel" not in existing:
+            await conn.exec_driver_sql(
+                "ALTER TABLE delivery_jobs ADD COLUMN channel VARCHAR(20) NOT NULL DEFAULT 'email'"
+            )
     except Exception:
         # For non-sqlite dialects or first-time DB, ignore.
         return
@@ -2,7 +2,17 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import JSON, Boolean, Date, DateTime, ForeignKey, String, Text, UniqueConstraint
+from sqlalchemy import (
+    JSON,
+    Boolean,
+    Date,
+    DateTime,
+    ForeignKey,
+    Index,
+    String,
+    Text,
+    UniqueConstraint,
+)
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from app.db.base import Base
@@ -32,6 +42,8 @@ class Client(Base):
     preferred_channel: Mapped[str] = mapped_column(
         String(20), default="email"
     )  # email|sms|messenger
+    # IANA time zone (e.g. "Asia/Vladivostok") for the send window; NULL = TZ setting.
+    timezone: Mapped[str | None] = mapped_column(String(64), nullable=True)
 
     birth_date: Mapped[dt.date | None] = mapped_column(Date, nullable=True)
     preferences: Mapped[dict] = mapped_column(JSON, default=dict)
@@ -97,10 +109,14 @@ class Greeting(Base):
     subject: Mapped[str] = mapped_column(String(250))
     body: Mapped[str] = mapped_column(Text)
     image_path: Mapped[str | None] = mapped_column(String(500), nullable=True)
+    # Lazy cards (CARD_RENDER_MODE=lazy): render_card inputs; the file at image_path is
+    # rendered on first access (card endpoint or delivery). NULL for eagerly rendered cards.
+    card_spec: Mapped[dict | None] = mapped_column(JSON, nullable=True)
     # Status lifecycle:
     # - generated: created by agent (non-VIP default)
     # - needs_approval: created by agent for VIP, must be approved in UI
     # - rejected: rejected in UI (no send)
+    # - queued: decided to send; a DeliveryJob is waiting for a dispatch worker
     # - sent: delivered (at least once)
     # - skipped: deliberately not sent (safety blocks like demo/test recipients, allowlist)
     # - error: processing failure
@@ -110,6 +126,11 @@ class Greeting(Base):
     approved_by: Mapped[str | None] = mapped_column(String(120), nullable=True)
     review_comment: Mapped[str | None] = mapped_column(Text, nullable=True)
 
+    # LLM spend for this greeting (text + image prompts). NULL when no LLM call was made.
+    prompt_tokens: Mapped[int | None] = mapped_column(nullable=True)
+    completion_tokens: Mapped[int | None] = mapped_column(nullable=True)
+    llm_latency_ms: Mapped[int | None] = mapped_column(nullable=True)
+
     created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
 
     event: Mapped[Event] = relationship(back_populates="greetings")
@@ -125,13 +146,53 @@ class Delivery(Base):
 
     channel: Mapped[str] = mapped_column(String(20))  # email|sms|messenger|file
     recipient: Mapped[str] = mapped_column(String(320))
-    status: Mapped[str] = mapped_column(String(50), default="queued")  # queued|sent|error
+    # sent|skipped|error; a failed send then becomes retrying (until next_attempt_at) and,
+    # after the last attempt, failed (terminal).
+    status: Mapped[str] = mapped_column(String(50), default="queued")
     provider_message: Mapped[str | None] = mapped_column(Text, nullable=True)
     sent_at: Mapped[dt.datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
     idempotency_key: Mapped[str] = mapped_column(String(120), unique=True)
 
+    # Retry tracking: sends through this row, when the next one is due, the last failure.
+    attempts: Mapped[int] = mapped_column(default=1)
+    next_attempt_at: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+
     greeting: Mapped[Greeting] = relationship(back_populates="deliveries")
 
+    __table_args__ = (Index("ix_deliveries_retry_due", "status", "next_attempt_at"),)
+
+
+class DeliveryJob(Base):
+    """Delivery outbox: a pending send, committed in the same transaction as the decision.
+
+    Dispatch workers lease due jobs (status=leased until lease_expires_at), call the sender and
+    finish them as done, or put them back with a backoff; after the last attempt they are dead.
+    """
+
+    __tablename__ = "delivery_jobs"
+
+    id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
+    greeting_id: Mapped[int] = mapped_column(ForeignKey("greetings.id"), unique=True)
+    channel: Mapped[str] = mapped_column(String(20), default="email")  # email|sms|messenger
+    recipient: Mapped[str] = mapped_column(String(320))
+    status: Mapped[str] = mapped_column(String(20), default="queued")  # queued|leased|done|dead
+    attempts: Mapped[int] = mapped_column(default=0)
+    next_attempt_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    lease_owner: Mapped[str | None] = mapped_column(String(80), nullable=True)
+    lease_expires_at: Mapped[dt.datetime | None] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+    last_error: Mapped[str | None] = mapped_column(Text, nullable=True)
+    delivery_id: Mapped[int | None] = mapped_column(ForeignKey("deliveries.id"), nullable=True)
+
+    created_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+    updated_at: Mapped[dt.datetime] = mapped_column(DateTime(timezone=True), default=utcnow)
+
+    __table_args__ = (Index("ix_delivery_jobs_due", "status", "next_attempt_at"),)
+
 
 class Feedback(Base):
     __tablename__ = "feedback"
@@ -169,4 +230,10 @@ class AgentRun(Base):
     skipped_existing: Mapped[int] = mapped_column(default=0)
     errors: Mapped[int] = mapped_column(default=0)
 
+    # LLM spend rolled up over the run (including calls whose answers were rejected).
+    llm_calls: Mapped[int] = mapped_column(default=0)
+    prompt_tokens: Mapped[int] = mapped_column(default=0)
+    completion_tokens: Mapped[int] = mapped_column(default=0)
+    llm_latency_ms: Mapped[int] = mapped_column(default=0)
+
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
@@ -4,12 +4,14 @@ import logging
 from contextlib import asynccontextmanager
 
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
 
 from app.api.router import api_router
 from app.core.logging import configure_logging
 from app.db.init_db import create_dirs, init_db, seed_holidays_if_empty
 from app.db.session import SessionLocal
+from app.services.card_pool import shutdown_card_pool
+from app.services.outbox_spool import close_spool_writers
+from app.services.smtp_pool import shutdown_smtp_pool
 from app.web.router import router as web_router
 
 
@@ -26,18 +28,15 @@ def create_app() -> FastAPI:
             if added:
                 log.info("Seeded holidays: %s", added)
         yield
+        shutdown_card_pool()
+        shutdown_smtp_pool()
+        close_spool_writers()
 
     app = FastAPI(title="Sber Congratulations AI Agent (MVP)", lifespan=lifespan)
 
     app.include_router(api_router)
     app.include_router(web_router)
 
-    # Serve generated artifacts for demo convenience (cards/outbox)
-    # NOTE: With uvicorn --reload on Windows, the app can be imported before startup hooks run.
-    # StaticFiles by default checks directory existence at mount time, so we disable the check
-    # and create the directory in the startup event.
-    app.mount("/data", StaticFiles(directory="data", check_dir=False), name="data")
-
     return app
 
 
@@ -9,3 +9,5 @@ class AgentRunResult(BaseModel):
     sent_deliveries: int
     skipped_existing: int
     errors: int
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
@@ -17,6 +17,7 @@ class ClientCreate(BaseModel):
     email: str | None = Field(default=None, max_length=320)
     phone: str | None = Field(default=None, max_length=40)
     preferred_channel: str = Field(default="email", max_length=20)
+    timezone: str | None = Field(default=None, max_length=64)
 
     birth_date: dt.date | None = None
     preferences: dict = Field(default_factory=dict)
@@ -35,6 +36,7 @@ class ClientOut(BaseModel):
     email: str | None
     phone: str | None
     preferred_channel: str
+    timezone: str | None = None
     birth_date: dt.date | None
     preferences: dict
     last_interaction_summary: str | None
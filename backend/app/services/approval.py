@@ -5,8 +5,10 @@ import datetime as dt
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import Client, Event, Greeting
-from app.services.sender import send_greeting
+from app.core.config import settings
+from app.db.models import Client, DeliveryJob, Event, Greeting
+from app.services.channels import resolve_channel
+from app.services.delivery_queue import JOB_DONE, dispatch_now, enqueue_delivery
 
 
 async def approve_greeting(
@@ -17,65 +19,78 @@ async def approve_greeting(
     review_comment: str | None = None,
     today: dt.date | None = None,
 ) -> dict:
-    """Approve a greeting and send it (MVP sender).
+    """Approve a greeting and, on the event day, queue its delivery in the same commit.
 
+    With DELIVERY_DISPATCH=inline the queued send is dispatched right away.
     Returns a small summary dict for UI.
     """
     g = (await session.execute(select(Greeting).where(Greeting.id == greeting_id))).scalar_one()
     if g.status not in {"needs_approval", "generated"}:
         return {"status": "ignored", "reason": f"cannot approve from status={g.status}"}
+    done = (
+        await session.execute(
+            select(DeliveryJob.id)
+            .where(DeliveryJob.greeting_id == g.id)
+            .where(DeliveryJob.status == JOB_DONE)
+        )
+    ).scalar_one_or_none()
+    if done is not None:
+        # Already delivered: leave the greeting as it is.
+        return {"status": "ignored", "reason": "already delivered", "job_id": done}
 
     g.status = "approved"
     g.approved_at = dt.datetime.now(dt.timezone.utc)
     g.approved_by = approved_by
     if review_comment:
         g.review_comment = review_comment
-    await session.commit()
-    await session.refresh(g)
 
     today = today or dt.date.today()
 
-    # Find client/recipient
-    c = None
-    recipient = "unknown"
-    if g.client_id is not None:
-        c = (
-            await session.execute(select(Client).where(Client.id == g.client_id))
-        ).scalar_one_or_none()
-        if c:
-            recipient = c.email or c.phone or f"client:{c.id}"
-
     # Do NOT send earlier than the event date. We generate/approve ahead of time, but deliver on due day.
     ev = (await session.execute(select(Event).where(Event.id == g.event_id))).scalar_one_or_none()
     if ev is not None and ev.event_date != today:
+        await session.commit()
         return {
             "status": "approved",
             "reason": "scheduled",
             "scheduled_for": ev.event_date.isoformat(),
         }
 
-    delivery = await send_greeting(
-        session, greeting=g, recipient=recipient, client=c if g.client_id else None
-    )
-    if delivery.status == "sent":
-        g.status = "sent"
-        await session.commit()
-        return {"status": "sent", "delivery_id": delivery.id}
+    # Find client/recipient
+    channel, recipient = "email", "unknown"
+    if g.client_id is not None:
+        c = (
+            await session.execute(select(Client).where(Client.id == g.client_id))
+        ).scalar_one_or_none()
+        if c:
+            channel, recipient = resolve_channel(c)
+            recipient = recipient or f"client:{c.id}"
+
+    job = await enqueue_delivery(session, greeting=g, recipient=recipient, channel=channel)
+    await session.commit()  # approval + queued send in one transaction
+
+    if (settings.delivery_dispatch or "inline").lower() != "inline":
+        return {"status": "queued", "job_id": job.id}
+    results = await dispatch_now(session, [job.id])
+    if not results:
+        return {"status": "queued", "job_id": job.id}
+    res = results[0]
+    if res.outcome == "sent":
+        return {"status": "sent", "delivery_id": res.delivery_id}
 
     # "skipped" is a deliberate safety outcome (demo client, allowlist, test recipient, etc).
     # Do NOT mark the greeting as "error" in this case.
-    if delivery.status == "skipped":
-        g.status = "skipped"
-        await session.commit()
+    if res.outcome == "skipped":
+        return {"status": "skipped", "delivery_id": res.delivery_id, "reason": res.message}
+
+    if res.outcome == "retry":
         return {
-            "status": "skipped",
-            "delivery_id": delivery.id,
-            "reason": delivery.provider_message,
+            "status": "queued",
+            "job_id": job.id,
+            "reason": res.message,
+            "retry_at": res.next_attempt_at.isoformat() if res.next_attempt_at else None,
         }
-
-    g.status = "error"
-    await session.commit()
-    return {"status": "error", "reason": delivery.provider_message}
+    return {"status": "error", "reason": res.message}
 
 
 async def reject_greeting(
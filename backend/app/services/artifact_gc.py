@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import re
+from collections.abc import Iterator
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from sqlalchemy import exists, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Delivery, Greeting
+from app.services.artifact_layout import LAYOUTS, artifact_path, shard_dirs
+from app.services.outbox_spool import SEGMENT_RE
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+# Illustration library files (see IllustrationLibrary): shared per theme, reused by future
+# runs even when no greeting references them yet.
+_ILLUSTRATION_RE = re.compile(r"^gigachat_[0-9a-f]{12}_")
+
+
+@dataclass
+class GCReport:
+    scanned: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0
+    errors: int = 0
+    deleted_by_reason: dict[str, int] = field(default_factory=dict)
+
+    def as_dict(self) -> dict:
+        return {
+            "scanned": self.scanned,
+            "deleted": self.deleted,
+            "reclaimed_bytes": self.reclaimed_bytes,
+            "errors": self.errors,
+            "deleted_by_reason": dict(self.deleted_by_reason),
+        }
+
+
+@dataclass(frozen=True)
+class _Entry:
+    path: Path
+    size: int
+    age: dt.timedelta
+
+
+def _batches(directory: Path, size: int, now: dt.datetime) -> Iterator[list[_Entry]]:
+    """Files of one directory (not recursive), `size` at a time."""
+    if not directory.is_dir():
+        return
+    batch: list[_Entry] = []
+    with os.scandir(directory) as it:
+        for de in it:
+            if not de.is_file(follow_symlinks=False):
+                continue
+            st = de.stat(follow_symlinks=False)
+            mtime = dt.datetime.fromtimestamp(st.st_mtime, dt.timezone.utc)
+            batch.append(_Entry(Path(de.path), st.st_size, now - mtime))
+            if len(batch) >= size:
+                yield batch
+                batch = []
+    if batch:
+        yield batch
+
+
+def _shards(directory: Path) -> list[Path]:
+    return list(shard_dirs(directory))
+
+
+def _source_stem(variant_name: str) -> str:
+    # cards/variants/<stem>.<variant>.q<quality>.<ext>
+    return variant_name.split(".", 1)[0]
+
+
+# Card files: Pillow cards (.png) and GigaChat images (.jpg/.png, converted ones .webp).
+_CARD_SUFFIXES = (".png", ".jpg", ".jpeg", ".webp")
+
+
+def _find_sources(cards: Path, stems: set[str], now: dt.datetime) -> dict[str, _Entry]:
+    """The card file each variant stem was made from, in any layout (missing stems omitted)."""
+    found: dict[str, _Entry] = {}
+    for stem in stems:
+        for layout in LAYOUTS:
+            for suffix in _CARD_SUFFIXES:
+                path = artifact_path(cards, stem + suffix, layout)
+                try:
+                    st = path.stat()
+                except OSError:
+                    continue
+                mtime = dt.datetime.fromtimestamp(st.st_mtime, dt.timezone.utc)
+                found[stem] = _Entry(path, st.st_size, now - mtime)
+    return found
+
+
+async def collect_garbage(
+    session: AsyncSession,
+    *,
+    data_dir: Path = DATA_DIR,
+    now: dt.datetime | None = None,
+    batch_size: int | None = None,
+    dry_run: bool = False,
+) -> GCReport:
+    """Delete unreferenced and expired runtime artifacts under data/.
+
+    References come from the DB: `Greeting.image_path` (cards) and `Delivery.provider_message`
+    ("written:<file>" or "written:<spool segment>#<offset>", outbox). Policy:
+    - cards: unreferenced files older than the orphan grace period (in-flight runs have not
+      committed their greetings yet); library illustrations only after their own retention;
+    - card variants: when their source card is gone (or would be deleted in this pass);
+    - outbox: unreferenced after the grace period, any file after its retention;
+    - smoke (manual smoke-test artifacts): after its retention;
+    - leftover *.tmp files from interrupted writes after the grace period.
+    Directories are scanned in batches, with one reference query per batch.
+    """
+    now = now or dt.datetime.now(dt.timezone.utc)
+    size = max(1, int(batch_size or settings.gc_batch_size))
+    grace = dt.timedelta(hours=float(settings.gc_orphan_grace_hours))
+    outbox_ttl = dt.timedelta(days=float(settings.gc_outbox_retention_days))
+    smoke_ttl = dt.timedelta(days=float(settings.gc_smoke_retention_days))
+    illustration_ttl = dt.timedelta(days=float(settings.gc_illustration_retention_days))
+    report = GCReport()
+
+    async def _delete(entries: list[tuple[_Entry, str]]) -> None:
+        def _unlink() -> list[tuple[_Entry, str, bool]]:
+            out = []
+            for e, reason in entries:
+                try:
+                    if not dry_run:
+                        e.path.unlink(missing_ok=True)
+                    out.append((e, reason, True))
+                except OSError as err:
+                    log.warning("gc: cannot delete %s: %s", e.path, err)
+                    out.append((e, reason, False))
+            return out
+
+        for e, reason, ok in await asyncio.to_thread(_unlink):
+            if not ok:
+                report.errors += 1
+                continue
+            report.deleted += 1
+            report.reclaimed_bytes += e.size
+            report.deleted_by_reason[reason] = report.deleted_by_reason.get(reason, 0) + 1
+
+    async def _scan(directory: Path):
+        # Shard by shard (ARTIFACT_LAYOUT=hash2); a flat directory is just one "shard".
+        for shard in await asyncio.to_thread(_shards, directory):
+            it = _batches(shard, size, now)
+            while True:
+                batch = await asyncio.to_thread(next, it, None)
+                if batch is None:
+                    break
+                report.scanned += len(batch)
+                yield batch
+
+    cards = data_dir / "cards"
+
+    async def _referenced_cards(rels: list[str]) -> set[str]:
+        rows = await session.execute(
+            select(Greeting.image_path).where(Greeting.image_path.in_(rels))
+        )
+        return {r for r in rows.scalars() if r}
+
+    def _card_verdict(e: _Entry, referenced: bool) -> str | None:
+        """Deletion reason of a card file, None while it is live."""
+        if referenced:
+            return None
+        if _ILLUSTRATION_RE.match(e.path.name):
+            return "illustration-expired" if e.age > illustration_ttl else None
+        return "card-orphan" if e.age > grace else None
+
+    # 1) cards
+    async for batch in _scan(cards):
+        rels = [e.path.relative_to(data_dir).as_posix() for e in batch]
+        referenced = await _referenced_cards(rels)
+        doomed: list[tuple[_Entry, str]] = []
+        for e, rel in zip(batch, rels, strict=True):
+            if e.path.name.endswith(".tmp"):
+                if e.age > grace:
+                    doomed.append((e, "tmp"))
+                continue
+            reason = _card_verdict(e, rel in referenced)
+            if reason is not None:
+                doomed.append((e, reason))
+        await _delete(doomed)
+
+    # 2) card variants: live while their source card is (same verdict as in pass 1, so a dry
+    # run agrees with a real one). One stat per source candidate and one query per batch.
+    async for batch in _scan(cards / "variants"):
+        stems = {_source_stem(e.path.name) for e in batch if not e.path.name.endswith(".tmp")}
+        sources = await asyncio.to_thread(_find_sources, cards, stems, now)
+        source_rels = {
+            stem: src.path.relative_to(data_dir).as_posix() for stem, src in sources.items()
+        }
+        referenced = await _referenced_cards(list(source_rels.values()))
+        live = {
+            stem
+            for stem, src in sources.items()
+            if _card_verdict(src, source_rels[stem] in referenced) is None
+        }
+        doomed = []
+        for e in batch:
+            if e.path.name.endswith(".tmp"):
+                if e.age > grace:
+                    doomed.append((e, "tmp"))
+            elif _source_stem(e.path.name) not in live and e.age > grace:
+                doomed.append((e, "variant-orphan"))
+        await _delete(doomed)
+
+    # 3) outbox / smoke
+    for sub, ttl in (("outbox", outbox_ttl), ("smoke", smoke_ttl)):
+        async for batch in _scan(data_dir / sub):
+            messages = [f"written:{e.path.name}" for e in batch]
+            written: set[str] = set()
+            if sub == "outbox":
+                rows = await session.execute(
+                    select(Delivery.provider_message).where(Delivery.provider_message.in_(messages))
+                )
+                written = {m for m in rows.scalars() if m}
+                # Spool segments (OUTBOX_FORMAT=spool) are referenced as
+                # "written:<segment>#<offset>": one query per batch, a column per segment.
+                segments = [e.path.name for e in batch if SEGMENT_RE.match(e.path.name)]
+                if segments:
+                    hits = (
+                        await session.execute(
+                            select(
+                                *(
+                                    exists().where(
+                                        Delivery.provider_message.like(f"written:{name}#%")
+                                    )
+                                    for name in segments
+                                )
+                            )
+                        )
+                    ).one()
+                    written.update(
+                        f"written:{name}" for name, hit in zip(segments, hits, strict=True) if hit
+                    )
+            doomed = []
+            for e, msg in zip(batch, messages, strict=True):
+                if e.age > ttl:
+                    doomed.append((e, f"{sub}-expired"))
+                elif sub == "outbox" and msg not in written and e.age > grace:
+                    doomed.append((e, f"{sub}-orphan"))
+            await _delete(doomed)
+
+    log.info("artifact gc%s: %s", " (dry run)" if dry_run else "", report.as_dict())
+    return report
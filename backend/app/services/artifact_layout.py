@@ -0,0 +1,77 @@
+"""Directory layout of runtime artifacts under data/cards and data/outbox (ARTIFACT_LAYOUT).
+
+- flat: every file directly in its directory (the original layout);
+- hash2: two-level hash shards, e.g. cards/3f/a0/card_2025-12-20_<key>.png.
+
+The shard is derived from the file name alone, so a name is enough to find a file (outbox
+provenance stays "written:<name>"); relative paths stored in the DB (Greeting.image_path) keep
+the "cards/..." form and are served by /api/cards/{id} in any layout. Files that belong
+together share a shard: a card and its variants (same stem) and a theme's illustrations
+(same "gigachat_<theme>_" prefix, which the illustration library globs for).
+"""
+
+from __future__ import annotations
+
+import hashlib
+import re
+from collections.abc import Iterator
+from pathlib import Path
+
+from app.core.config import settings
+
+LAYOUTS = ("flat", "hash2")
+
+_ILLUSTRATION_GROUP_RE = re.compile(r"^gigachat_[0-9a-f]{12}_")
+_SHARD_RE = re.compile(r"^[0-9a-f]{2}$")
+
+
+def current_layout() -> str:
+    layout = (settings.artifact_layout or "flat").lower()
+    return layout if layout in LAYOUTS else "flat"
+
+
+def shard_of(name: str, layout: str | None = None) -> str:
+    """Shard subdirectory ("" for flat, "ab/cd" for hash2) of a file name."""
+    if (layout or current_layout()) == "flat":
+        return ""
+    m = _ILLUSTRATION_GROUP_RE.match(name)
+    group = m.group(0) if m else name.split(".", 1)[0]
+    h = hashlib.sha1(group.encode("utf-8")).hexdigest()
+    return f"{h[:2]}/{h[2:4]}"
+
+
+def artifact_dir(base: Path, name: str, layout: str | None = None) -> Path:
+    shard = shard_of(name, layout)
+    return base / shard if shard else base
+
+
+def artifact_path(base: Path, name: str, layout: str | None = None) -> Path:
+    return artifact_dir(base, name, layout) / name
+
+
+def locate(base: Path, name: str) -> Path | None:
+    """Existing file for `name`, in the current layout or (mid-migration) any other one."""
+    current = current_layout()
+    for layout in (current, *(lay for lay in LAYOUTS if lay != current)):
+        path = artifact_path(base, name, layout)
+        if path.is_file():
+            return path
+    return None
+
+
+def shard_dirs(base: Path) -> Iterator[Path]:
+    """`base` and every existing shard directory below it, one at a time (any layout)."""
+    if not base.is_dir():
+        return
+    yield base
+    for first in sorted(p for p in base.iterdir() if p.is_dir() and _SHARD_RE.match(p.name)):
+        for second in sorted(p for p in first.iterdir() if p.is_dir() and _SHARD_RE.match(p.name)):
+            yield second
+
+
+def iter_files(base: Path) -> Iterator[Path]:
+    """Files of `base`, shard by shard (never loads a whole huge directory listing at once)."""
+    for d in shard_dirs(base):
+        for p in d.iterdir():
+            if p.is_file():
+                yield p
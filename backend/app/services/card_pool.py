@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from collections.abc import Callable
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, TypeVar
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+
+class CardPool:
+    """Executor for card CPU/disk work (Pillow drawing, PNG encoding, image file writes).
+
+    Keeps that work off the event loop. At most `workers + queue_size` jobs are in flight;
+    further callers wait asynchronously (backpressure instead of an unbounded backlog).
+    With kind="process" the callables and their arguments must be picklable
+    (module-level functions of app.services.card_renderer are).
+    """
+
+    def __init__(self, *, kind: str = "thread", workers: int = 2, queue_size: int = 8) -> None:
+        kind = (kind or "thread").lower()
+        if kind not in {"thread", "process"}:
+            raise ValueError(f"Unknown card pool kind: {kind!r} (expected thread|process)")
+        self.kind = kind
+        self.workers = max(1, int(workers))
+        self.capacity = self.workers + max(0, int(queue_size))
+        self._executor: Executor | None = None
+        # asyncio primitives are bound to a loop; the pool may outlive one (tests, CLI runs).
+        self._slots: asyncio.Semaphore | None = None
+        self._slots_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_executor(self) -> Executor:
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="cards"
+                )
+        return self._executor
+
+    def _get_slots(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if self._slots is None or self._slots_loop is not loop:
+            self._slots = asyncio.Semaphore(self.capacity)
+            self._slots_loop = loop
+        return self._slots
+
+    async def run(self, fn: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+        async with self._get_slots():
+            loop = asyncio.get_running_loop()
+            call = functools.partial(fn, *args, **kwargs)
+            return await loop.run_in_executor(self._get_executor(), call)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_pool: CardPool | None = None
+
+
+def get_card_pool() -> CardPool:
+    """Process-wide pool configured from settings (CARD_POOL_*)."""
+    global _pool
+    if _pool is None:
+        _pool = CardPool(
+            kind=settings.card_pool_kind,
+            workers=settings.card_pool_workers,
+            queue_size=settings.card_pool_queue_size,
+        )
+        log.info(
+            "Card pool: %s x%s (queue %s)",
+            _pool.kind,
+            _pool.workers,
+            _pool.capacity - _pool.workers,
+        )
+    return _pool
+
+
+def shutdown_card_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown()
+        _pool = None
@@ -1,10 +1,52 @@
 from __future__ import annotations
 
 import datetime as dt
+import hashlib
+import json
+import os
+import uuid
+from functools import lru_cache
 from pathlib import Path
 
 from PIL import Image, ImageDraw, ImageFont
 
+from app.services.artifact_layout import artifact_path
+
+# Bump whenever draw_card's output changes: the version is part of the cache key, so old
+# cards are simply not reused (and can be cleaned up like any other runtime artifact).
+CARD_TEMPLATE_VERSION = 2
+
+
+def card_key(*, title: str, recipient_line: str, date: dt.date, brand_line: str = "Сбер") -> str:
+    """Stable digest of every render input (unlike hash(), identical across processes)."""
+    payload = json.dumps(
+        [CARD_TEMPLATE_VERSION, title, recipient_line, date.isoformat(), brand_line],
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:24]
+
+
+def card_path(
+    *, out_dir: Path, title: str, recipient_line: str, date: dt.date, brand_line: str = "Сбер"
+) -> Path:
+    key = card_key(title=title, recipient_line=recipient_line, date=date, brand_line=brand_line)
+    return artifact_path(out_dir, f"card_{date.isoformat()}_{key}.png")
+
+
+def cached_card(
+    *, out_dir: Path, title: str, recipient_line: str, date: dt.date, brand_line: str = "Сбер"
+) -> Path | None:
+    """Return the already rendered card for these inputs, if any."""
+    path = card_path(
+        out_dir=out_dir,
+        title=title,
+        recipient_line=recipient_line,
+        date=date,
+        brand_line=brand_line,
+    )
+    return path if path.is_file() else None
+
 
 def render_card(
     *,
@@ -14,83 +56,142 @@ def render_card(
     date: dt.date,
     brand_line: str = "Сбер",
 ) -> Path:
-    """Render a simple greeting card image (Pillow) and return its path."""
-    out_dir.mkdir(parents=True, exist_ok=True)
-    w, h = 1200, 630
-
-    # Фон: мягкий градиент в фирменных зелёных тонах
-    img = Image.new("RGB", (w, h), color=(0, 82, 63))
-    top_color = (0, 82, 63)
-    bottom_color = (0, 181, 102)
-    for y in range(h):
-        ratio = y / h
-        r = int(top_color[0] * (1 - ratio) + bottom_color[0] * ratio)
-        g = int(top_color[1] * (1 - ratio) + bottom_color[1] * ratio)
-        b = int(top_color[2] * (1 - ratio) + bottom_color[2] * ratio)
-        ImageDraw.Draw(img).line([(0, y), (w, y)], fill=(r, g, b))
+    """Render a simple greeting card image (Pillow) and return its path.
 
+    Cards are content-addressed: a card with the same inputs is rendered once and reused.
+    """
+    hit = cached_card(
+        out_dir=out_dir,
+        title=title,
+        recipient_line=recipient_line,
+        date=date,
+        brand_line=brand_line,
+    )
+    if hit is not None:
+        return hit
+    image = draw_card(title=title, recipient_line=recipient_line, date=date, brand_line=brand_line)
+    return save_card(
+        image,
+        out_dir=out_dir,
+        title=title,
+        recipient_line=recipient_line,
+        date=date,
+        brand_line=brand_line,
+    )
+
+
+CARD_SIZE = (1200, 630)
+_CARD_MARGIN = (80, 80)
+_TOP_COLOR = (0, 82, 63)
+_BOTTOM_COLOR = (0, 181, 102)
+
+
+_Font = ImageFont.FreeTypeFont | ImageFont.ImageFont
+
+
+@lru_cache(maxsize=1)
+def _fonts() -> tuple[_Font, _Font, _Font]:
+    """(title, body, small) fonts, resolved once per process."""
     # Fonts: use default (portable). If custom fonts needed later, bundle them.
     try:
-        font_title = ImageFont.truetype("arial.ttf", 60)
-        font_body = ImageFont.truetype("arial.ttf", 42)
-        font_small = ImageFont.truetype("arial.ttf", 28)
+        return (
+            ImageFont.truetype("arial.ttf", 60),
+            ImageFont.truetype("arial.ttf", 42),
+            ImageFont.truetype("arial.ttf", 28),
+        )
     except Exception:
-        font_title = ImageFont.load_default()
-        font_body = ImageFont.load_default()
-        font_small = ImageFont.load_default()
+        default = ImageFont.load_default()
+        return default, default, default
+
+
+@lru_cache(maxsize=1)
+def _base_layer() -> Image.Image:
+    """Background gradient with the translucent card already composited (text-free).
+
+    Built once per process; draw_card only copies it and draws the text. Treat as read-only.
+    """
+    w, h = CARD_SIZE
+    # Фон: мягкий градиент в фирменных зелёных тонах (vertical, top → bottom)
+    mask = Image.linear_gradient("L").resize((w, h), Image.Resampling.BILINEAR)
+    img = Image.composite(
+        Image.new("RGB", (w, h), _BOTTOM_COLOR), Image.new("RGB", (w, h), _TOP_COLOR), mask
+    )
 
     # Белая полупрозрачная карточка в центре
-    card_margin_x = 80
-    card_margin_y = 80
-    card_radius = 40
-    card_color = (255, 255, 255, 235)
-
-    card = Image.new("RGBA", (w - card_margin_x * 2, h - card_margin_y * 2), (0, 0, 0, 0))
-    card_draw = ImageDraw.Draw(card)
-    card_draw.rounded_rectangle(
+    mx, my = _CARD_MARGIN
+    card = Image.new("RGBA", (w - mx * 2, h - my * 2), (0, 0, 0, 0))
+    ImageDraw.Draw(card).rounded_rectangle(
         [(0, 0), (card.size[0], card.size[1])],
-        radius=card_radius,
-        fill=card_color,
+        radius=40,
+        fill=(255, 255, 255, 235),
     )
-    img.paste(card, (card_margin_x, card_margin_y), card)
+    img.paste(card, (mx, my), card)
+    return img
+
+
+def draw_card(
+    *,
+    title: str,
+    recipient_line: str,
+    date: dt.date,
+    brand_line: str = "Сбер",
+) -> Image.Image:
+    """Draw the card in memory (no disk I/O), e.g. to prepare a fallback ahead of time."""
+    w, h = CARD_SIZE
+    mx, my = _CARD_MARGIN
+    font_title, font_body, font_small = _fonts()
+    img = _base_layer().copy()
 
     # Текст внутри карточки
     text_draw = ImageDraw.Draw(img)
-    margin_inner_x = card_margin_x + 80
-    y = card_margin_y + 70
+    margin_inner_x = mx + 80
+    y = my + 70
 
     # Заголовок (повод)
-    text_draw.text(
-        (margin_inner_x, y),
-        title,
-        fill=(5, 88, 55),
-        font=font_title,
-    )
+    text_draw.text((margin_inner_x, y), title, fill=(5, 88, 55), font=font_title)
     y += 120
 
     # Кому
-    text_draw.text(
-        (margin_inner_x, y),
-        recipient_line,
-        fill=(20, 20, 20),
-        font=font_body,
-    )
+    text_draw.text((margin_inner_x, y), recipient_line, fill=(20, 20, 20), font=font_body)
 
     # Нижняя подпись
     footer_text = f"{brand_line} • {date.isoformat()}"
     # Pillow совместимость: используем textbbox вместо textsize
     bbox = text_draw.textbbox((0, 0), footer_text, font=font_small)
     footer_w = bbox[2] - bbox[0]
-    footer_x = w - card_margin_x - 80 - footer_w
-    footer_y = h - card_margin_y - 60
-    text_draw.text(
-        (footer_x, footer_y),
-        footer_text,
-        fill=(60, 60, 60),
-        font=font_small,
+    footer_x = w - mx - 80 - footer_w
+    footer_y = h - my - 60
+    text_draw.text((footer_x, footer_y), footer_text, fill=(60, 60, 60), font=font_small)
+    return img
+
+
+def save_card(
+    img: Image.Image,
+    *,
+    out_dir: Path,
+    title: str,
+    recipient_line: str,
+    date: dt.date,
+    brand_line: str = "Сбер",
+) -> Path:
+    path = card_path(
+        out_dir=out_dir,
+        title=title,
+        recipient_line=recipient_line,
+        date=date,
+        brand_line=brand_line,
     )
+    return write_card(img, path)
 
-    filename = f"card_{date.isoformat()}_{abs(hash(recipient_line + title)) % 10_000_000}.png"
-    path = out_dir / filename
-    img.save(path, format="PNG")
+
+def write_card(img: Image.Image, path: Path) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a unique temp file and rename: concurrent writers (threads or processes) of the
+    # same card never expose a half-written PNG, and the last identical write simply wins.
+    tmp = path.with_name(f".{path.stem}.{uuid.uuid4().hex}.tmp")
+    try:
+        img.save(tmp, format="PNG")
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
     return path
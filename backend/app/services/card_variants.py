@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+import os
+import uuid
+from pathlib import Path
+
+from PIL import Image, features
+
+from app.core.config import settings
+from app.services.artifact_layout import artifact_path
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+# Max width per use; height keeps the aspect ratio. Cards are never upscaled. Variants are
+# rendered on first use only (card page, messenger outbox, SMTP attachment).
+VARIANT_WIDTHS = {
+    "web": 480,  # greetings list (shown at 200px, 2x for HiDPI screens)
+    "messenger": 1024,
+    "email": 1200,
+}
+
+
+def variant_format(name: str) -> str:
+    """Email gets JPEG (WebP is still unsupported by some mail clients); the rest is configurable."""
+    fmt = (settings.card_image_format or "webp").lower()
+    if name == "email" or fmt not in {"webp", "jpeg"}:
+        return "jpeg"
+    if fmt == "webp" and not features.check("webp"):
+        return "jpeg"
+    return fmt
+
+
+def variant_rel_path(image_path: str, name: str) -> str:
+    """Path (relative to data/) of a variant of the card stored at data/<image_path>."""
+    if name not in VARIANT_WIDTHS:
+        raise ValueError(f"Unknown card variant: {name!r}")
+    src = Path(image_path)
+    fmt = variant_format(name)
+    ext = "jpg" if fmt == "jpeg" else fmt
+    quality = int(settings.card_image_quality)
+    # <root>/variants/[<shard>/]<stem>.<variant>.q<quality>.<ext>, root = "cards"
+    root = Path(src.parts[0]) if len(src.parts) > 1 else Path()
+    return artifact_path(root / "variants", f"{src.stem}.{name}.q{quality}.{ext}").as_posix()
+
+
+# Variants that would not be smaller than their source (e.g. flat Pillow PNGs re-encoded as a
+# same-size JPEG): serve the original instead. Remembered per process to avoid re-encoding.
+_KEEP_ORIGINAL: set[Path] = set()
+
+
+def _write_variant(src: Path, dst: Path, *, width: int, fmt: str, quality: int) -> bool:
+    """Encode src into dst. False (nothing written) if it would not save any bytes."""
+    with Image.open(src) as img:
+        img = img.convert("RGB")
+        resized = img.width > width
+        if resized:
+            img = img.resize(
+                (width, round(img.height * width / img.width)), Image.Resampling.LANCZOS
+            )
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            if fmt == "webp":
+                img.save(tmp, format="WEBP", quality=quality, method=4)
+            else:
+                img.save(tmp, format="JPEG", quality=quality, optimize=True, progressive=True)
+            if not resized and tmp.stat().st_size >= src.stat().st_size:
+                return False
+            os.replace(tmp, dst)
+            return True
+        finally:
+            tmp.unlink(missing_ok=True)
+
+
+def ensure_variant(image_path: str, name: str, *, data_dir: Path = DATA_DIR) -> Path | None:
+    """Return the variant file, rendering it on first use. None if the source card is missing.
+
+    Returns the source itself when a variant would not be smaller.
+    """
+    dst = data_dir / variant_rel_path(image_path, name)
+    if dst.is_file():
+        return dst
+    src = data_dir / image_path
+    if not src.is_file():
+        return None
+    if dst in _KEEP_ORIGINAL:
+        return src
+    written = _write_variant(
+        src,
+        dst,
+        width=VARIANT_WIDTHS[name],
+        fmt=variant_format(name),
+        quality=int(settings.card_image_quality),
+    )
+    if not written:
+        _KEEP_ORIGINAL.add(dst)
+        return src
+    return dst
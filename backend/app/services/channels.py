@@ -0,0 +1,350 @@
+"""Channel adapters: how a greeting reaches a client (Client.preferred_channel).
+
+An adapter performs the channel I/O for one greeting and returns an outcome; it never touches
+the DB (the sender records outcomes as Delivery rows, idempotent by key). Each logical channel
+(email, sms, messenger) has its own limits: at most CHANNEL_<X>_CONCURRENCY sends in flight and
+CHANNEL_<X>_RATE_PER_SEC sends per second, so a batch can go out over all channels in parallel
+without any one of them exceeding its provider's throughput.
+
+- email: SMTP (SEND_MODE=smtp, with the safety guards) or the file outbox (SEND_MODE=file);
+- sms, messenger: local stand-ins that write into the outbox like the file sender
+  (`sms_<greeting>_<key>.txt`, `messenger_<greeting>_<key>.txt`) until real providers exist;
+- SEND_MODE=noop: nothing is sent on any channel.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from email.message import EmailMessage
+from pathlib import Path
+from typing import Protocol
+
+from app.core.config import settings
+from app.db.models import Client, Greeting
+from app.services.artifact_layout import artifact_path
+from app.services.card_pool import get_card_pool
+from app.services.card_variants import ensure_variant
+from app.services.lazy_cards import materialize_card
+from app.services.mime_parts import attach_file
+from app.services.outbox_spool import get_spool_writer
+from app.services.smtp_pool import get_smtp_pool
+
+CHANNELS = ("email", "sms", "messenger")
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+
+FAILED = "failed"  # outcome/Delivery.status of a send that no retry can fix
+
+
+@dataclass(frozen=True)
+class SendOutcome:
+    status: str  # sent|skipped|error (retried)|failed (terminal)
+    provider_message: str
+
+
+@dataclass(frozen=True)
+class Message:
+    """What an adapter sends: a plain copy of the greeting, detached from the DB session (the
+    channel I/O of a batch runs while the session records other sends)."""
+
+    greeting_id: int
+    subject: str
+    body: str
+    image_path: str | None = None
+    card_spec: dict | None = None
+    demo: bool = False  # Client.is_demo
+
+    @classmethod
+    def of(cls, greeting: Greeting, client: Client | None = None) -> Message:
+        return cls(
+            greeting_id=greeting.id,
+            subject=greeting.subject,
+            body=greeting.body,
+            image_path=greeting.image_path,
+            card_spec=greeting.card_spec,
+            demo=bool(getattr(client, "is_demo", False)),
+        )
+
+
+class ChannelLimiter:
+    """Concurrency + rate cap of one channel.
+
+    The rate is paced (one send every 1/rate seconds, no bursts). asyncio primitives are bound
+    to a loop and the limiter outlives one (tests, CLI runs), so they are rebuilt per loop.
+    """
+
+    def __init__(self, *, concurrency: int, rate_per_sec: float) -> None:
+        self.concurrency = max(1, int(concurrency))
+        self.rate_per_sec = max(0.0, float(rate_per_sec))
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._next_at = 0.0
+
+    def _bind(self) -> tuple[asyncio.AbstractEventLoop, asyncio.Semaphore]:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop or self._slots is None:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.concurrency)
+            self._next_at = 0.0
+        return loop, self._slots
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        loop, slots = self._bind()
+        async with slots:
+            if self.rate_per_sec > 0:
+                now = loop.time()
+                start = max(now, self._next_at)
+                self._next_at = start + 1.0 / self.rate_per_sec
+                if start > now:
+                    await asyncio.sleep(start - now)
+            yield
+
+
+_limiters: dict[str, ChannelLimiter] = {}
+
+
+def get_limiter(channel: str) -> ChannelLimiter:
+    """Process-wide limiter of a logical channel (rebuilt when its settings change)."""
+    concurrency = int(getattr(settings, f"channel_{channel}_concurrency"))
+    rate = float(getattr(settings, f"channel_{channel}_rate_per_sec"))
+    limiter = _limiters.get(channel)
+    if limiter is None or (limiter.concurrency, limiter.rate_per_sec) != (
+        max(1, concurrency),
+        max(0.0, rate),
+    ):
+        limiter = _limiters[channel] = ChannelLimiter(concurrency=concurrency, rate_per_sec=rate)
+    return limiter
+
+
+class Reachable(Protocol):
+    """The contact fields resolve_channel reads: a Client, or a row selecting these columns."""
+
+    @property
+    def email(self) -> str | None: ...
+
+    @property
+    def phone(self) -> str | None: ...
+
+    @property
+    def preferred_channel(self) -> str | None: ...
+
+
+def resolve_channel(client: Reachable) -> tuple[str, str]:
+    """(channel, recipient) for a client: the preferred channel if the client has an address
+    for it, else the first channel that has one (email; sms/messenger use the phone)."""
+    addresses = {
+        "email": (client.email or "").strip(),
+        "sms": (client.phone or "").strip(),
+        "messenger": (client.phone or "").strip(),
+    }
+    preferred = (client.preferred_channel or "email").strip().lower()
+    if preferred not in CHANNELS:
+        preferred = "email"
+    for channel in (preferred, *(c for c in CHANNELS if c != preferred)):
+        if addresses[channel]:
+            return channel, addresses[channel]
+    return preferred, ""
+
+
+def effective_mode(client: Client | None) -> str:
+    mode = (settings.send_mode or "file").lower()
+    # Safety UX: if SMTP is enabled, NEVER send real emails to demo clients, but still
+    # allow the demo flow to be shown by writing to file outbox instead.
+    if mode == "smtp" and client is not None and bool(getattr(client, "is_demo", False)):
+        return "file"
+    return mode
+
+
+class ChannelAdapter:
+    """Sends one greeting over one channel; `channel` is recorded as Delivery.channel."""
+
+    channel = ""
+    limits = "email"  # logical channel whose limiter applies
+
+    async def send(self, *, message: Message, recipient: str, key: str) -> SendOutcome:
+        raise NotImplementedError
+
+
+class NoopAdapter(ChannelAdapter):
+    def __init__(self, channel: str) -> None:
+        self.channel = channel
+
+    async def send(self, *, message, recipient, key) -> SendOutcome:
+        return SendOutcome("skipped", "noop")
+
+
+class OutboxAdapter(ChannelAdapter):
+    """Writes the message into the outbox: the file sender, and the sms/messenger stand-ins."""
+
+    def __init__(self, channel: str = "file", *, outbox_dir: str | Path | None = None) -> None:
+        self.channel = channel
+        self.limits = "email" if channel == "file" else channel
+        self.outbox_dir = Path(outbox_dir or settings.outbox_dir)
+        # SMS carries text only; the original file outbox keeps its "delivery_" names.
+        self.with_image = channel != "sms"
+        self.variant = "messenger" if channel == "messenger" else None
+        self.prefix = "delivery" if channel == "file" else channel
+
+    async def send(self, *, message, recipient, key) -> SendOutcome:
+        image = (message.image_path or "") if self.with_image else ""
+        if image:
+            # Lazy cards are rendered at delivery time, so the outbox never references a
+            # missing file.
+            image = await get_card_pool().run(_outbox_image, image, message.card_spec, self.variant)
+        async with get_limiter(self.limits).slot():
+            ref = await asyncio.to_thread(self._write, message, recipient, key, image)
+        return SendOutcome("sent", f"written:{ref}")
+
+    def _write(self, message: Message, recipient: str, key: str, image: str) -> str:
+        self.outbox_dir.mkdir(parents=True, exist_ok=True)
+        if (settings.outbox_format or "files").lower() == "spool":
+            record = {
+                "key": key,
+                "greeting_id": message.greeting_id,
+                "to": recipient,
+                "subject": message.subject,
+                "body": message.body,
+                "image": image,
+                "written_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            }
+            if self.channel != "file":
+                record["channel"] = self.channel
+            return get_spool_writer(self.outbox_dir).append(record)
+
+        # The name is the reference; its shard directory follows from it (artifact_layout).
+        ref = f"{self.prefix}_{message.greeting_id}_{key}.txt"
+        lines = [f"TO: {recipient}"]
+        if self.channel != "file":
+            lines.append(f"CHANNEL: {self.channel}")
+        lines += [f"SUBJECT: {message.subject}", "", message.body, "", f"IMAGE: {image}"]
+        path = artifact_path(self.outbox_dir, ref)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text("\n".join(lines), encoding="utf-8")
+        return ref
+
+
+def _outbox_image(image_path: str, card_spec: dict | None, variant: str | None) -> str:
+    """The card an outbox message references (relative to data/): its `variant` if any."""
+    materialize_card(image_path, card_spec, data_dir=DATA_DIR)
+    if variant is not None:
+        try:
+            p = ensure_variant(image_path, variant, data_dir=DATA_DIR)
+        except Exception:
+            p = None
+        if p is not None:
+            return p.relative_to(DATA_DIR).as_posix()
+    return image_path
+
+
+def _split_domains(csv: str) -> set[str]:
+    return {d.strip().lower() for d in (csv or "").split(",") if d.strip()}
+
+
+def _is_demo_or_test_email(email: str) -> bool:
+    low = (email or "").strip().lower()
+    if not low:
+        return True
+    if low.endswith("@example.com"):
+        return True
+    if low.startswith("demo_client_") and low.endswith("@example.com"):
+        return True
+    # common non-routable examples
+    if low.endswith(".invalid") or low.endswith(".example"):
+        return True
+    return False
+
+
+def _recipient_domain(email: str) -> str:
+    low = (email or "").strip().lower()
+    if "@" not in low:
+        return ""
+    return low.split("@", 1)[1]
+
+
+def _email_image(image_path: str, card_spec: dict | None) -> Path | None:
+    """The compact email variant of the card (the original as a fallback), rendered if lazy."""
+    p = DATA_DIR / image_path
+    try:
+        materialize_card(image_path, card_spec, data_dir=DATA_DIR)
+        p = ensure_variant(image_path, "email", data_dir=DATA_DIR) or p
+    except Exception:
+        pass
+    return p if p.is_file() else None
+
+
+class SmtpAdapter(ChannelAdapter):
+    """Email over pooled SMTP sessions, with safety guards.
+
+    - Demo clients (Client.is_demo) are NEVER sent via SMTP.
+    - *@example.com (and other test-ish domains) are blocked by default.
+    - Optional domain allowlist for SMTP.
+
+    Errors no retry can fix (no SMTP host, not an email address) are `failed`, so the queue
+    dead-letters them right away instead of retrying with backoff.
+    """
+
+    channel = "email"
+
+    def _blocked(self, recipient: str, message: Message) -> SendOutcome | None:
+        # Require a valid email recipient for SMTP.
+        if "@" not in (recipient or ""):
+            return SendOutcome(FAILED, "smtp:invalid-email-recipient")
+        if message.demo:
+            return SendOutcome("skipped", "blocked:demo-client")
+        if _is_demo_or_test_email(recipient):
+            return SendOutcome("skipped", "blocked:test-recipient")
+        # Domain allowlist (recommended): for safety, by default we require allowlist OR
+        # explicit allow-all flag.
+        allowlist = _split_domains(settings.smtp_allowlist_domains)
+        if not settings.smtp_allow_all_recipients:
+            dom = _recipient_domain(recipient)
+            if not allowlist:
+                return SendOutcome("skipped", "blocked:allowlist-empty")
+            if dom not in allowlist:
+                return SendOutcome("skipped", f"blocked:domain-not-allowlisted:{dom}")
+        if not settings.smtp_host:
+            return SendOutcome(FAILED, "smtp:not-configured")
+        return None
+
+    async def send(self, *, message, recipient, key) -> SendOutcome:
+        blocked = self._blocked(recipient, message)
+        if blocked is not None:
+            return blocked
+
+        from_email = settings.smtp_from_email or settings.smtp_username or "no-reply@example.com"
+        msg = EmailMessage()
+        msg["From"] = from_email
+        msg["To"] = recipient
+        msg["Subject"] = message.subject
+        msg.set_content(message.body)
+        if message.image_path:
+            image = await get_card_pool().run(_email_image, message.image_path, message.card_spec)
+            if image is not None:
+                attach_file(msg, image)
+
+        try:
+            # Pooled, authenticated sessions; the blocking SMTP I/O runs in worker threads.
+            async with get_limiter("email").slot():
+                await get_smtp_pool().send(msg)
+        except Exception as e:
+            return SendOutcome("error", f"smtp:error:{e.__class__.__name__}")
+        return SendOutcome("sent", "smtp:sent")
+
+
+def get_adapter(channel: str, client: Client | None) -> ChannelAdapter:
+    """Adapter for a logical channel under the current SEND_MODE."""
+    mode = effective_mode(client)
+    if channel in ("sms", "messenger"):
+        return NoopAdapter(channel) if mode == "noop" else OutboxAdapter(channel)
+    if mode == "noop":
+        return NoopAdapter("file")
+    if mode == "smtp":
+        return SmtpAdapter()
+    # file, or an unknown mode -> safe fallback to the file outbox
+    return OutboxAdapter("file")
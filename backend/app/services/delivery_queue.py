@@ -0,0 +1,576 @@
+"""Transactional delivery outbox.
+
+Deciding to send (due sender, VIP approval) and queueing the send are one commit: the decision
+writes a DeliveryJob row next to the greeting status change. Dispatch workers then lease due jobs
+with a single conditional UPDATE (safe with several workers/processes), call the sender and finish
+each job: done (sent/skipped), back to queued with exponential backoff, or dead after the last
+attempt. A worker that dies mid-send loses its lease after DELIVERY_LEASE_SEC; the retry is safe
+because deliveries are idempotent by key.
+
+The Delivery row of a failed send records the retry state: `retrying` with attempts,
+next_attempt_at and last_error while the job waits (the retry resends through the same row),
+`failed` once the job is dead. Claims only read due rows through ix_delivery_jobs_due.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import logging
+import os
+import random
+import socket
+import uuid
+from collections.abc import Iterable, Sequence
+from dataclasses import dataclass
+
+from sqlalchemy import and_, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.models import Client, Delivery, DeliveryJob, Greeting, utcnow
+from app.services.channels import FAILED
+from app.services.sender import (
+    RETRYING,
+    SendRequest,
+    delivery_key,
+    existing_deliveries,
+    perform_sends,
+    plan_sends,
+    record_sends,
+)
+
+log = logging.getLogger(__name__)
+
+JOB_QUEUED = "queued"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_DEAD = "dead"
+
+
+@dataclass(frozen=True)
+class DispatchResult:
+    job_id: int
+    outcome: str  # sent|skipped|retry|dead
+    delivery_id: int | None = None
+    message: str | None = None
+    next_attempt_at: dt.datetime | None = None
+
+
+def retry_delay(attempts: int, *, jitter: float | None = None) -> float:
+    """Backoff before the next attempt, after `attempts` failed ones (seconds).
+
+    Exponential and capped, minus a random share of up to DELIVERY_RETRY_JITTER, so sends that
+    failed together (a relay outage) don't all come back at the same instant.
+    """
+    base = float(settings.delivery_retry_base_sec)
+    delay = min(base * 2.0 ** max(attempts - 1, 0), float(settings.delivery_retry_max_sec))
+    jitter = float(settings.delivery_retry_jitter if jitter is None else jitter)
+    return delay * (1.0 - random.uniform(0.0, min(max(jitter, 0.0), 1.0)))
+
+
+def _due_at(not_before: dt.datetime | None, now: dt.datetime) -> dt.datetime:
+    return max(not_before, now) if not_before is not None else now
+
+
+async def _revive(
+    session: AsyncSession,
+    job: DeliveryJob,
+    *,
+    recipient: str,
+    channel: str,
+    due_at: dt.datetime,
+    now: dt.datetime,
+) -> None:
+    """Put a dead job back in the queue with a fresh attempt budget."""
+    if job.delivery_id is not None:
+        failed = await session.get(Delivery, job.delivery_id)
+        if failed is not None and failed.status in {FAILED, "error"}:
+            # The new attempts are sent (and tracked) through the same row.
+            failed.status = RETRYING
+            failed.next_attempt_at = due_at
+        else:
+            job.delivery_id = None
+    job.status = JOB_QUEUED
+    job.channel = channel
+    job.recipient = recipient
+    job.attempts = 0
+    job.next_attempt_at = due_at
+    job.updated_at = now
+
+
+async def enqueue_delivery(
+    session: AsyncSession,
+    *,
+    greeting: Greeting,
+    recipient: str,
+    channel: str = "email",
+    not_before: dt.datetime | None = None,
+    now: dt.datetime | None = None,
+) -> DeliveryJob:
+    """Queue a send of `greeting` over `channel`; the caller commits it with its decision.
+
+    Marks the greeting `queued`. `not_before`: the send slot (app.services.send_window);
+    dispatch leaves the job alone until then. Idempotent per greeting: an existing job is
+    returned as is, a dead one is revived with a fresh attempt budget.
+    """
+    (job,) = await enqueue_deliveries(
+        session, [(greeting, recipient, channel, not_before)], now=now
+    )
+    return job
+
+
+async def enqueue_deliveries(
+    session: AsyncSession,
+    items: Sequence[tuple[Greeting, str, str, dt.datetime | None]],
+    *,
+    now: dt.datetime | None = None,
+) -> list[DeliveryJob]:
+    """enqueue_delivery for a batch of (greeting, recipient, channel, not_before).
+
+    One SELECT finds the existing jobs and a single multi-row INSERT adds the new ones (read
+    back with one more SELECT), whatever the batch size. Jobs are returned in `items` order.
+    """
+    now = now or utcnow()
+    greeting_ids = [greeting.id for greeting, *_ in items]
+    existing = {
+        job.greeting_id: job
+        for job in (
+            await session.execute(
+                select(DeliveryJob).where(DeliveryJob.greeting_id.in_(greeting_ids))
+            )
+        ).scalars()
+    }
+    new_rows: dict[int, dict] = {}
+    for greeting, recipient, channel, not_before in items:
+        due_at = _due_at(not_before, now)
+        job = existing.get(greeting.id)
+        if job is None:
+            new_rows.setdefault(
+                greeting.id,
+                {
+                    "greeting_id": greeting.id,
+                    "channel": channel,
+                    "recipient": recipient,
+                    "status": JOB_QUEUED,
+                    "attempts": 0,
+                    "next_attempt_at": due_at,
+                    "created_at": now,
+                    "updated_at": now,
+                },
+            )
+        elif job.status == JOB_DEAD:
+            await _revive(
+                session, job, recipient=recipient, channel=channel, due_at=due_at, now=now
+            )
+        if job is None or job.status != JOB_DONE:
+            greeting.status = "queued"
+    if new_rows:
+        await session.execute(insert(DeliveryJob), list(new_rows.values()))
+        existing.update(
+            (job.greeting_id, job)
+            for job in (
+                await session.execute(
+                    select(DeliveryJob).where(DeliveryJob.greeting_id.in_(list(new_rows)))
+                )
+            ).scalars()
+        )
+    await session.flush()
+    return [existing[greeting_id] for greeting_id in greeting_ids]
+
+
+def _claimable(now: dt.datetime):
+    return or_(
+        and_(DeliveryJob.status == JOB_QUEUED, DeliveryJob.next_attempt_at <= now),
+        and_(DeliveryJob.status == JOB_LEASED, DeliveryJob.lease_expires_at <= now),
+    )
+
+
+async def claim_jobs(
+    session: AsyncSession,
+    *,
+    owner: str,
+    limit: int,
+    job_ids: Iterable[int] | None = None,
+    now: dt.datetime | None = None,
+) -> list[int]:
+    """Lease up to `limit` due jobs (or expired leases) for `owner`; returns their ids.
+
+    Each claim counts as an attempt, so a job that keeps crashing its worker still runs out.
+    """
+    now = now or utcnow()
+    due = (
+        select(DeliveryJob.id)
+        .where(_claimable(now))
+        .order_by(DeliveryJob.next_attempt_at, DeliveryJob.id)
+        .limit(max(1, int(limit)))
+    )
+    if job_ids is not None:
+        due = due.where(DeliveryJob.id.in_(list(job_ids)))
+    res = await session.execute(
+        update(DeliveryJob)
+        .where(DeliveryJob.id.in_(due.scalar_subquery()))
+        .where(_claimable(now))
+        .values(
+            status=JOB_LEASED,
+            lease_owner=owner,
+            lease_expires_at=now + dt.timedelta(seconds=float(settings.delivery_lease_sec)),
+            attempts=DeliveryJob.attempts + 1,
+            updated_at=now,
+        )
+        .returning(DeliveryJob.id)
+        .execution_options(synchronize_session=False)
+    )
+    ids = sorted(res.scalars().all())
+    await session.commit()
+    return ids
+
+
+async def dispatch_jobs(
+    session: AsyncSession,
+    job_ids: list[int],
+    *,
+    owner: str,
+    now: dt.datetime | None = None,
+) -> list[DispatchResult]:
+    """Send a batch of leased jobs and record their outcomes in one commit.
+
+    Jobs, greetings, clients and already recorded deliveries (by idempotency key) are loaded
+    with one query each for the whole batch, instead of per message; the sends then run in
+    parallel across channels (`perform_sends`, no DB access). Each record is a savepoint, so
+    a failing one only fails its own job. Jobs whose lease was lost meanwhile are left alone.
+    """
+    if not job_ids:
+        return []
+    jobs = (
+        (
+            await session.execute(
+                select(DeliveryJob)
+                .where(DeliveryJob.id.in_(job_ids))
+                .order_by(DeliveryJob.id)
+                .execution_options(populate_existing=True)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    jobs = [j for j in jobs if j.status == JOB_LEASED and j.lease_owner == owner]
+    greetings = {
+        g.id: g
+        for g in (
+            await session.execute(
+                select(Greeting)
+                .where(Greeting.id.in_({j.greeting_id for j in jobs}))
+                .execution_options(populate_existing=True)
+            )
+        ).scalars()
+    }
+    client_ids = {g.client_id for g in greetings.values() if g.client_id is not None}
+    clients = {
+        c.id: c
+        for c in (await session.execute(select(Client).where(Client.id.in_(client_ids)))).scalars()
+    }
+
+    requests: list[SendRequest] = []
+    for j in jobs:
+        g = greetings.get(j.greeting_id)
+        if g is not None:
+            client = clients.get(g.client_id) if g.client_id is not None else None
+            requests.append(SendRequest(g, j.recipient, client, j.channel or "email"))
+    existing = await existing_deliveries(
+        session,
+        (
+            delivery_key(
+                greeting=r.greeting, recipient=r.recipient, client=r.client, channel=r.channel
+            )
+            for r in requests
+        ),
+    )
+    planned = await plan_sends(session, requests, existing=existing)
+
+    outcomes = await perform_sends(planned)
+
+    # The deliveries are committed before the job bookkeeping: if that fails, the retry finds
+    # them by key instead of sending the messages again.
+    try:
+        recorded = await record_sends(session, planned, outcomes, commit=False)
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+    try:
+        sent = iter(recorded)
+        results: list[DispatchResult] = []
+        now = now or utcnow()
+        for job in jobs:
+            greeting = greetings.get(job.greeting_id)
+            outcome = next(sent) if greeting is not None else None
+            results.append(await _finish(session, job, greeting, outcome, now=now))
+        await session.commit()
+    except Exception:
+        # The jobs stay leased (see `_release`); their deliveries are already recorded.
+        await session.rollback()
+        raise
+    return results
+
+
+async def dispatch_job(
+    session: AsyncSession, job_id: int, *, owner: str, now: dt.datetime | None = None
+) -> DispatchResult | None:
+    """Send one leased job and record its outcome; None if the lease was lost meanwhile."""
+    results = await dispatch_jobs(session, [job_id], owner=owner, now=now)
+    return results[0] if results else None
+
+
+async def _finish(
+    session: AsyncSession,
+    job: DeliveryJob,
+    greeting: Greeting | None,
+    outcome: Delivery | Exception | None,
+    *,
+    now: dt.datetime,
+) -> DispatchResult:
+    """Apply a send outcome to its job, greeting and delivery; the caller commits the batch."""
+    delivery: Delivery | None = None
+    message: str | None
+    if greeting is None or outcome is None:
+        status, message = "error", "greeting-missing"
+    elif isinstance(outcome, Exception):
+        log.error(
+            "delivery job=%s greeting=%s failed: %r",
+            job.id,
+            greeting.id,
+            outcome,
+            exc_info=outcome,
+        )
+        status, message = "error", f"exception:{outcome.__class__.__name__}"
+    else:
+        delivery = outcome
+        status, message = delivery.status, delivery.provider_message
+
+    job.lease_owner = None
+    job.lease_expires_at = None
+    job.updated_at = now
+    if delivery is not None and delivery.id != job.delivery_id:
+        if job.delivery_id is not None:
+            # The revived job went out under another key (channel/recipient changed): the
+            # previous row's retries are over.
+            previous = await session.get(Delivery, job.delivery_id)
+            if previous is not None and previous.status == RETRYING:
+                previous.status = FAILED
+                previous.next_attempt_at = None
+        job.delivery_id = delivery.id
+
+    if greeting is not None and status in {"sent", "skipped"}:
+        job.status = JOB_DONE
+        job.last_error = None
+        greeting.status = status
+        return DispatchResult(job.id, status, job.delivery_id, message)
+
+    job.last_error = message
+    if delivery is not None:
+        delivery.last_error = message
+    if greeting is None or status == FAILED or job.attempts >= int(settings.delivery_max_attempts):
+        job.status = JOB_DEAD
+        if greeting is not None:
+            greeting.status = "error"
+        if delivery is not None:
+            delivery.status = FAILED
+            delivery.next_attempt_at = None
+        log.warning("delivery job=%s dead after %s attempts: %s", job.id, job.attempts, message)
+        return DispatchResult(job.id, "dead", job.delivery_id, message)
+
+    job.status = JOB_QUEUED
+    job.next_attempt_at = now + dt.timedelta(seconds=retry_delay(job.attempts))
+    if delivery is not None:
+        # Not a final outcome: the sender resends a `retrying` row instead of returning it.
+        delivery.status = RETRYING
+        delivery.next_attempt_at = job.next_attempt_at
+    return DispatchResult(job.id, "retry", job.delivery_id, message, job.next_attempt_at)
+
+
+def _concurrent() -> bool:
+    return (settings.due_send_mode or "sequential").lower() == "concurrent"
+
+
+async def _release(
+    session: AsyncSession, job_ids: list[int], *, owner: str, error: str
+) -> list[DispatchResult]:
+    """Put the jobs `owner` leased from a batch that failed as a whole back in the queue.
+
+    They wait out the usual backoff (the claim counted the attempt), or go dead after the
+    last one. Deliveries the batch recorded as errors are marked for a resend, since the
+    bookkeeping that would have done so was rolled back; sent ones are kept as they are.
+    """
+    now = utcnow()
+    jobs = (
+        (
+            await session.execute(
+                select(DeliveryJob)
+                .where(DeliveryJob.id.in_(job_ids))
+                .where(DeliveryJob.status == JOB_LEASED)
+                .where(DeliveryJob.lease_owner == owner)
+                .order_by(DeliveryJob.id)
+                .execution_options(populate_existing=True)
+            )
+        )
+        .scalars()
+        .all()
+    )
+    results: list[DispatchResult] = []
+    dead: list[int] = []
+    retry_at: dict[int, dt.datetime] = {}
+    for job in jobs:
+        job.lease_owner = None
+        job.lease_expires_at = None
+        job.last_error = error
+        job.updated_at = now
+        if job.attempts >= int(settings.delivery_max_attempts):
+            job.status = JOB_DEAD
+            dead.append(job.greeting_id)
+            log.warning("delivery job=%s dead after %s attempts: %s", job.id, job.attempts, error)
+            results.append(DispatchResult(job.id, "dead", job.delivery_id, error))
+            continue
+        job.status = JOB_QUEUED
+        job.next_attempt_at = now + dt.timedelta(seconds=retry_delay(job.attempts))
+        retry_at[job.greeting_id] = job.next_attempt_at
+        results.append(DispatchResult(job.id, "retry", job.delivery_id, error, job.next_attempt_at))
+    if dead:
+        await session.execute(
+            update(Greeting)
+            .where(Greeting.id.in_(dead))
+            .values(status="error")
+            .execution_options(synchronize_session=False)
+        )
+    if retry_at:
+        errored = await session.execute(
+            select(Delivery)
+            .where(Delivery.greeting_id.in_(list(retry_at)))
+            .where(Delivery.status == "error")
+        )
+        for delivery in errored.scalars():
+            delivery.status = RETRYING
+            delivery.next_attempt_at = retry_at[delivery.greeting_id]
+    await session.commit()
+    return results
+
+
+async def _dispatch_batch(
+    session: AsyncSession, *, owner: str, limit: int, job_ids: list[int] | None = None
+) -> list[DispatchResult]:
+    """Claim and send one batch. A batch that fails as a whole is logged and its leases are
+    released (`_release`), so one bad batch never stops the caller."""
+    claimed: list[int] = []
+    try:
+        claimed = await claim_jobs(session, owner=owner, limit=limit, job_ids=job_ids)
+        return await dispatch_jobs(session, claimed, owner=owner)
+    except Exception as e:
+        log.exception("dispatch of %s jobs by %s failed", len(claimed), owner)
+        await session.rollback()
+        if not claimed:
+            return []
+        try:
+            return await _release(
+                session, claimed, owner=owner, error=f"dispatch:{type(e).__name__}"
+            )
+        except Exception:
+            # The leases expire after DELIVERY_LEASE_SEC instead.
+            log.exception("releasing %s jobs of %s failed", len(claimed), owner)
+            await session.rollback()
+            return []
+
+
+async def dispatch_now(session: AsyncSession, job_ids: list[int]) -> list[DispatchResult]:
+    """Inline dispatch of freshly queued jobs by the deciding process (DELIVERY_DISPATCH=inline).
+
+    Batch by batch, so that leases don't run out while earlier batches are being sent. With
+    DUE_SEND_MODE=concurrent up to DUE_SEND_WORKERS batches are in flight at once, each worker
+    on its own session, so the total time is bound by the channels' limits rather than by the
+    slowest send of each batch. The leases of a batch that fails as a whole are released at
+    once: its jobs come back as `retry` (still queued, with backoff) or `dead`.
+    """
+    if not job_ids:
+        return []
+    owner = f"inline:{uuid.uuid4().hex[:12]}"
+    size = max(1, int(settings.delivery_batch_size))
+    chunks = [job_ids[i : i + size] for i in range(0, len(job_ids), size)]
+    workers = min(max(1, int(settings.due_send_workers)), len(chunks))
+    if not _concurrent() or workers < 2:
+        results: list[DispatchResult] = []
+        for chunk in chunks:
+            results += await _dispatch_batch(session, owner=owner, limit=len(chunk), job_ids=chunk)
+        return results
+
+    factory = async_sessionmaker(session.bind, expire_on_commit=False, class_=AsyncSession)
+    pending = iter(enumerate(chunks))
+    done: dict[int, list[DispatchResult]] = {}
+
+    async def _worker() -> None:
+        async with factory() as own:
+            for i, chunk in pending:
+                done[i] = await _dispatch_batch(own, owner=owner, limit=len(chunk), job_ids=chunk)
+
+    await asyncio.gather(*(_worker() for _ in range(workers)))
+    return [r for i in sorted(done) for r in done[i]]
+
+
+async def run_dispatch_worker(
+    session_factory: async_sessionmaker[AsyncSession],
+    *,
+    owner: str,
+    batch_size: int | None = None,
+    poll_sec: float | None = None,
+    once: bool = False,
+    stop: asyncio.Event | None = None,
+) -> dict[str, int]:
+    """Lease and send due jobs in batches; with `once`, return when nothing is due.
+
+    A batch that fails as a whole is logged and put back with backoff; the loop goes on.
+    """
+    batch_size = int(batch_size or settings.delivery_batch_size)
+    poll_sec = float(settings.delivery_poll_sec if poll_sec is None else poll_sec)
+    counts = {"sent": 0, "skipped": 0, "retry": 0, "dead": 0}
+    while stop is None or not stop.is_set():
+        async with session_factory() as session:
+            results = await _dispatch_batch(session, owner=owner, limit=batch_size)
+        for result in results:
+            counts[result.outcome] += 1
+        if results:
+            continue
+        if once:
+            break
+        if stop is None:
+            await asyncio.sleep(poll_sec)
+        else:
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=poll_sec)
+            except asyncio.TimeoutError:
+                pass
+    return counts
+
+
+async def run_dispatch_workers(
+    session_factory: async_sessionmaker[AsyncSession] | None = None,
+    *,
+    workers: int | None = None,
+    once: bool = False,
+    stop: asyncio.Event | None = None,
+) -> dict[str, int]:
+    """Run `workers` dispatch loops concurrently; returns the summed outcome counts."""
+    if session_factory is None:
+        from app.db.session import SessionLocal
+
+        session_factory = SessionLocal
+    n = max(1, int(workers or settings.delivery_workers))
+    prefix = f"{socket.gethostname()}:{os.getpid()}"
+    per_worker = await asyncio.gather(
+        *(
+            run_dispatch_worker(session_factory, owner=f"{prefix}:{i}", once=once, stop=stop)
+            for i in range(n)
+        )
+    )
+    total = {"sent": 0, "skipped": 0, "retry": 0, "dead": 0}
+    for counts in per_worker:
+        for k, v in counts.items():
+            total[k] += v
+    return total
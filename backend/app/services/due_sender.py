@@ -2,40 +2,106 @@ from __future__ import annotations
 
 import datetime as dt
 import logging
+from collections.abc import AsyncIterator, Sequence
+from typing import cast
 
-from sqlalchemy import select
+from sqlalchemy import CursorResult, Row, and_, case, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import Client, Event, Greeting
-from app.services.sender import send_greeting
+from app.core.config import settings
+from app.db.models import Client, Event, Greeting, utcnow
+from app.services.channels import resolve_channel
+from app.services.delivery_queue import JOB_DONE, dispatch_now, enqueue_deliveries
+from app.services.send_window import SlotRequest, assign_slots, client_tz, window_enabled
 
 log = logging.getLogger(__name__)
 
 _SENDABLE_STATUSES = {"generated", "approved"}
 _CONSIDER_STATUSES = {"generated", "approved", "needs_approval"}
 
+# Winners are loaded and queued in pages of this many greetings (one commit per page).
+_CHUNK = 500
 
-def _event_priority(ev: Event) -> int:
-    """Lower is higher priority."""
-    et = (getattr(ev, "event_type", "") or "").lower()
-    if et == "birthday":
-        return 0
-    if et == "manual":
-        return 1
-    if et == "holiday":
-        tags = (getattr(ev, "details", None) or {}).get("holiday_tags", {}) or {}
-        if (tags.get("type") or "").lower() == "professional":
-            return 2
-        return 3
-    return 9
 
+def _event_priority():
+    """Lower is higher priority: birthday, manual, professional holiday, other holiday."""
+    et = func.lower(Event.event_type)
+    tag = func.lower(func.coalesce(Event.details[("holiday_tags", "type")].as_string(), ""))
+    return case(
+        (et == "birthday", 0),
+        (et == "manual", 1),
+        (and_(et == "holiday", tag == "professional"), 2),
+        (et == "holiday", 3),
+        else_=9,
+    )
 
-def _is_sendable_today(*, g: Greeting, c: Client) -> bool:
+
+def _is_sendable_today():
     """Whether greeting is eligible to be sent (ignoring date, which is handled by query)."""
-    is_vip = (c.segment or "").lower() == "vip"
-    if is_vip:
-        return g.status == "approved"
-    return g.status in _SENDABLE_STATUSES
+    is_vip = func.lower(func.coalesce(Client.segment, "")) == "vip"
+    return case(
+        (is_vip, Greeting.status == "approved"),
+        else_=Greeting.status.in_(_SENDABLE_STATUSES),
+    )
+
+
+def _due_ranked(today: dt.date):
+    """Greetings due today, ranked per client (rn=1: the client's candidate).
+
+    - If a birthday exists on this day: birthday is the ONLY candidate (even if not approved
+      yet for VIP, in which case nothing is sent).
+    - Else: the best sendable greeting by priority, then id.
+    """
+    is_birthday = func.lower(Event.event_type) == "birthday"
+    sendable = _is_sendable_today()
+    rn = func.row_number().over(
+        partition_by=Greeting.client_id,
+        order_by=(is_birthday.desc(), sendable.desc(), _event_priority(), Greeting.id),
+    )
+    return (
+        select(
+            Greeting.id.label("greeting_id"),
+            Greeting.client_id.label("client_id"),
+            sendable.label("sendable"),
+            rn.label("rn"),
+        )
+        .join(Event, Event.id == Greeting.event_id)
+        .join(Client, Client.id == Greeting.client_id)
+        .where(Event.event_date == today)
+        .where(Greeting.status.in_(_CONSIDER_STATUSES))
+        .subquery("due")
+    )
+
+
+async def _winner_pages(session: AsyncSession, today: dt.date) -> AsyncIterator[Sequence[Row]]:
+    """Today's sendable greetings with their client's contact columns, _CHUNK at a time.
+
+    Keyset pages (id > the last one seen), so memory stays bounded by the page size.
+    """
+    last_id = 0
+    while True:
+        page = (
+            await session.execute(
+                select(
+                    Greeting.id,
+                    Client.preferred_channel,
+                    Client.email,
+                    Client.phone,
+                    Client.timezone,
+                )
+                .join(Event, Event.id == Greeting.event_id)
+                .join(Client, Client.id == Greeting.client_id)
+                .where(Event.event_date == today)
+                .where(_is_sendable_today())
+                .where(Greeting.id > last_id)
+                .order_by(Greeting.id)
+                .limit(_CHUNK)
+            )
+        ).all()
+        if not page:
+            return
+        yield page
+        last_id = page[-1].id
 
 
 async def send_due_greetings(
@@ -43,112 +109,111 @@ async def send_due_greetings(
     *,
     today: dt.date,
 ) -> dict:
-    """Send greetings that are due today.
+    """Queue (and with DELIVERY_DISPATCH=inline, send) greetings that are due today.
+
+    With SEND_SCHEDULE=window each send is queued for its slot in today's send window and
+    released by dispatch when the slot comes (`queued` counts those still waiting).
 
     Principles:
     - We MAY generate greetings ahead of time (lookahead window).
     - We send ONLY on the day of the event (Event.event_date == today).
     - VIP greetings are sent ONLY if they were approved before/at today.
+    - At most 1 message per client per day: the winner is picked in SQL (ROW_NUMBER per
+      client), the other sendable greetings are suppressed with one bulk UPDATE.
 
     Returns counts for reporting/UI.
     """
     sent = 0
     skipped = 0
     errors = 0
-    suppressed = 0
+    job_ids: list[int] = []
 
-    # Select due greetings with their event + client (including needs_approval to enforce priority).
-    rows = (
+    due = _due_ranked(today)
+    due_total, clients_total = (
+        await session.execute(select(func.count(), func.count(func.distinct(due.c.client_id))))
+    ).one()
+
+    # Suppress the losers (so we never send multiple messages in one day). Afterwards every
+    # client has at most one sendable greeting due today: its winner.
+    suppression = cast(
+        CursorResult,
         await session.execute(
-            select(Greeting, Event, Client)
-            .join(Event, Event.id == Greeting.event_id)
-            .join(Client, Client.id == Greeting.client_id)
-            .where(Event.event_date == today)
-            .where(Greeting.status.in_(_CONSIDER_STATUSES))
-        )
-    ).all()
-
-    # Group by client so we can enforce "1 message per client per day" with priority.
-    by_client: dict[int, list[tuple[Greeting, Event, Client]]] = {}
-    for g, ev, c in rows:
-        by_client.setdefault(int(c.id), []).append((g, ev, c))
-
-    for _client_id, items in by_client.items():
-        # All items share the same client
-        c = items[0][2]
-        birthday_items = [t for t in items if (t[1].event_type or "").lower() == "birthday"]
-
-        # Choose the winner:
-        # - If birthday exists on this day: birthday is the ONLY candidate (even if not approved yet for VIP).
-        # - Else: choose the best sendable item by priority.
-        winner: tuple[Greeting, Event, Client] | None = None
-        if birthday_items:
-            winner = sorted(birthday_items, key=lambda t: _event_priority(t[1]))[0]
-        else:
-            sendable = [t for t in items if _is_sendable_today(g=t[0], c=c)]
-            if sendable:
-                winner = sorted(sendable, key=lambda t: (_event_priority(t[1]), t[0].id))[0]
-
-        # Suppress other sendable greetings (so we never send multiple messages in one day).
-        for g, _ev, _c in items:
-            if winner is not None and g.id == winner[0].id:
+            update(Greeting)
+            .where(
+                Greeting.id.in_(
+                    select(due.c.greeting_id).where(due.c.rn > 1).where(due.c.sendable.is_(True))
+                )
+            )
+            .values(status="skipped")
+            .execution_options(synchronize_session=False)
+        ),
+    )
+    suppressed = max(suppression.rowcount or 0, 0)
+    await session.commit()
+
+    slots: dict[int, dt.datetime] = {}
+    if window_enabled():
+        # The slots spread the whole day's volume, so they need every winner up front.
+        requests: list[SlotRequest] = []
+        async for page in _winner_pages(session, today):
+            requests.extend(SlotRequest(w.id, resolve_channel(w)[0], client_tz(w)) for w in page)
+        slots = assign_slots(requests, day=today, now=utcnow())
+
+    # Queued winners stop being sendable, but pages are keyed by id, so none is skipped.
+    async for page in _winner_pages(session, today):
+        greetings = {
+            g.id: g
+            for g in (
+                await session.execute(
+                    select(Greeting)
+                    .where(Greeting.id.in_([w.id for w in page]))
+                    .execution_options(populate_existing=True)
+                )
+            ).scalars()
+        }
+        items: list[tuple[Greeting, str, str, dt.datetime | None]] = []
+        for w in page:
+            g = greetings.get(w.id)
+            if g is None:
                 continue
-            if _is_sendable_today(g=g, c=c):
-                g.status = "skipped"
-                suppressed += 1
-        if suppressed:
-            await session.commit()
-
-        if winner is None:
-            continue
-
-        g, ev, _c = winner
-        # If birthday exists but is not eligible (VIP not approved), we do NOT send anything.
-        if birthday_items and not _is_sendable_today(g=g, c=c):
-            continue
-
-        try:
-            recipient = c.email or c.phone or ""
+            # The preferred channel, or one the client has an address for.
+            channel, recipient = resolve_channel(w)
             if not recipient:
                 g.status = "error"
-                await session.commit()
                 errors += 1
                 continue
-
-            delivery = await send_greeting(session, greeting=g, recipient=recipient, client=c)
-            if delivery.status == "sent":
-                g.status = "sent"
-                await session.commit()
+            items.append((g, recipient, channel, slots.get(g.id)))
+        if items:
+            try:
+                async with session.begin_nested():
+                    jobs = await enqueue_deliveries(session, items)
+                job_ids.extend(job.id for job in jobs if job.status != JOB_DONE)
+            except Exception as e:
+                log.exception("due send failed for %s greetings: %s", len(items), e)
+                errors += len(items)
+        await session.commit()
+
+    # Jobs still waiting: worker mode, or a failed inline attempt that is retried with backoff.
+    queued = len(job_ids)
+    if job_ids and (settings.delivery_dispatch or "inline").lower() == "inline":
+        for result in await dispatch_now(session, job_ids):
+            if result.outcome == "sent":
                 sent += 1
-            elif delivery.status == "skipped":
+            elif result.outcome == "skipped":
                 # Safety outcome: don't retry automatically forever in regular mode.
-                g.status = "skipped"
-                await session.commit()
                 skipped += 1
-            else:
-                g.status = "error"
-                await session.commit()
+            elif result.outcome == "dead":
                 errors += 1
-        except Exception as e:
-            log.exception(
-                "due send failed for greeting=%s event=%s client=%s: %s",
-                getattr(g, "id", None),
-                getattr(ev, "id", None),
-                getattr(c, "id", None),
-                e,
-            )
-            try:
-                g.status = "error"
-                await session.commit()
-            except Exception:
-                await session.rollback()
-            errors += 1
+            else:
+                continue
+            queued -= 1
 
     return {
         "sent": sent,
         "skipped": skipped,
         "suppressed": suppressed,
         "errors": errors,
-        "due_total": len(rows),
-        "clients_total": len(by_client),
+        "queued": queued,
+        "due_total": due_total,
+        "clients_total": clients_total,
     }
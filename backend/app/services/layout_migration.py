@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import itertools
+import logging
+import os
+import shutil
+from collections.abc import Iterator
+from pathlib import Path
+from typing import Any
+
+from sqlalchemy import bindparam, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.db.models import Greeting
+from app.services.artifact_layout import LAYOUTS, artifact_path, current_layout, shard_dirs
+
+log = logging.getLogger(__name__)
+
+DATA_DIR = Path(__file__).resolve().parents[2] / "data"
+
+
+def _misplaced(base: Path, layout: str) -> Iterator[tuple[Path, Path]]:
+    """(current, target) for files that are not where `layout` puts them, shard by shard."""
+    for shard in shard_dirs(base):
+        for p in shard.iterdir():
+            if not p.is_file() or p.name.endswith(".tmp") or p.name.startswith("spool-"):
+                continue
+            target = artifact_path(base, p.name, layout)
+            if target != p:
+                yield p, target
+
+
+def _next_batch(moves: Iterator[tuple[Path, Path]], size: int) -> list[tuple[Path, Path]]:
+    return list(itertools.islice(moves, size))
+
+
+def _link(src: Path, dst: Path) -> None:
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    if dst.exists():
+        return
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+
+def _link_all(moves: list[tuple[Path, Path]]) -> None:
+    for src, dst in moves:
+        _link(src, dst)
+
+
+def _unlink_sources(moves: list[tuple[Path, Path]]) -> None:
+    for src, _dst in moves:
+        src.unlink(missing_ok=True)
+
+
+def _rename_all(moves: list[tuple[Path, Path]]) -> None:
+    for src, dst in moves:
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        os.replace(src, dst)
+
+
+def _prune_empty_shards(base: Path) -> None:
+    for shard in reversed(list(shard_dirs(base))):
+        if shard == base:
+            continue
+        for d in (shard, shard.parent):
+            try:
+                d.rmdir()
+            except OSError:
+                pass
+
+
+async def migrate_layout(
+    session: AsyncSession,
+    *,
+    data_dir: Path = DATA_DIR,
+    layout: str | None = None,
+    batch_size: int | None = None,
+    dry_run: bool = False,
+) -> dict:
+    """Move cards, card variants and outbox files into `layout` (default: ARTIFACT_LAYOUT).
+
+    Cards are referenced by Greeting.image_path: each batch is linked into place first, the
+    paths are updated and committed, and only then are the old names removed, so an
+    interruption never leaves a greeting pointing at a missing file (re-running resumes).
+    Variants are derived files and outbox references carry only the file name, so those are
+    simply renamed. Spool segments stay at the outbox root.
+    """
+    layout = (layout or current_layout()).lower()
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown artifact layout: {layout!r} (expected one of {LAYOUTS})")
+    size = max(1, int(batch_size or settings.artifact_migrate_batch_size))
+    report: dict[str, Any] = {
+        "layout": layout,
+        "cards": 0,
+        "variants": 0,
+        "outbox": 0,
+        "greetings_updated": 0,
+    }
+
+    # Files are listed one shard at a time and moved batch by batch: memory stays bounded by
+    # the batch size, however many artifacts there are.
+    cards = data_dir / "cards"
+    moves = _misplaced(cards, layout)
+    while batch := await asyncio.to_thread(_next_batch, moves, size):
+        report["cards"] += len(batch)
+        if dry_run:
+            continue
+        await asyncio.to_thread(_link_all, batch)
+        params = [
+            {
+                "old_path": src.relative_to(data_dir).as_posix(),
+                "new_path": dst.relative_to(data_dir).as_posix(),
+            }
+            for src, dst in batch
+        ]
+        conn = await session.connection()
+        res = await conn.execute(
+            update(Greeting)
+            .where(Greeting.image_path == bindparam("old_path"))
+            .values(image_path=bindparam("new_path")),
+            params,
+        )
+        await session.commit()
+        report["greetings_updated"] += max(res.rowcount or 0, 0)
+        await asyncio.to_thread(_unlink_sources, batch)
+
+    for key, base in (("variants", cards / "variants"), ("outbox", data_dir / "outbox")):
+        moves = _misplaced(base, layout)
+        while batch := await asyncio.to_thread(_next_batch, moves, size):
+            report[key] += len(batch)
+            if not dry_run:
+                await asyncio.to_thread(_rename_all, batch)
+
+    if not dry_run:
+        for base in (cards, cards / "variants", data_dir / "outbox"):
+            await asyncio.to_thread(_prune_empty_shards, base)
+    log.info("artifact layout migration%s: %s", " (dry run)" if dry_run else "", report)
+    return report
@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import datetime as dt
+import functools
+import hashlib
+from pathlib import Path
+
+from app.services.card_renderer import card_path, draw_card, write_card
+from app.services.card_variants import DATA_DIR, VARIANT_WIDTHS, variant_rel_path
+
+
+def card_spec(*, title: str, recipient_line: str, date: dt.date, brand_line: str) -> dict:
+    """Everything render_card needs, JSON-serializable (stored on Greeting.card_spec)."""
+    return {
+        "title": title,
+        "recipient_line": recipient_line,
+        "date": date.isoformat(),
+        "brand_line": brand_line,
+    }
+
+
+def materialize_card(
+    image_path: str | None, spec: dict | None, *, data_dir: Path = DATA_DIR
+) -> Path | None:
+    """Return the card file, rendering it from its spec on first access (blocking).
+
+    Cards are content-addressed, so the spec renders exactly to `image_path`.
+    None if there is no card and nothing to render it from.
+    """
+    if not image_path:
+        return None
+    path = data_dir / image_path
+    if path.is_file() or not spec:
+        return path if path.is_file() else None
+    inputs = {
+        "title": spec["title"],
+        "recipient_line": spec["recipient_line"],
+        "date": dt.date.fromisoformat(spec["date"]),
+        "brand_line": spec.get("brand_line") or "Сбер",
+    }
+    # Written exactly to image_path, whatever artifact layout was current when it was stored.
+    if card_path(out_dir=path.parent, **inputs).name != path.name:
+        return None
+    return write_card(draw_card(**inputs), path)
+
+
+# Bounded: size and mtime are only part of the key, so a changed file gets a new entry.
+@functools.lru_cache(maxsize=4096)
+def _etag(path: str, size: int, mtime_ns: int) -> str:  # noqa: ARG001
+    return f'"{hashlib.sha256(Path(path).read_bytes()).hexdigest()[:32]}"'
+
+
+def strong_etag(path: Path) -> str:
+    """Quoted strong ETag: digest of the file bytes (LRU-memoized by path, size and mtime)."""
+    st = path.stat()
+    return _etag(str(path), st.st_size, st.st_mtime_ns)
+
+
+def card_url(image_path: str | None, greeting_id: int, variant: str = "original") -> str:
+    """URL of the card endpoint. `v` changes with the card, so responses can be immutable.
+
+    For a variant it also covers the encoding (CARD_IMAGE_FORMAT, CARD_IMAGE_QUALITY, width).
+    """
+    if not image_path:
+        return ""
+    version = image_path
+    if variant in VARIANT_WIDTHS:
+        version += f"|{variant_rel_path(image_path, variant)}|{VARIANT_WIDTHS[variant]}"
+    v = hashlib.sha256(version.encode("utf-8")).hexdigest()[:12]
+    return f"/api/cards/{greeting_id}?variant={variant}&v={v}"
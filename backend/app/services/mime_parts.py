@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import base64
+import mimetypes
+import threading
+from collections import OrderedDict
+from email.message import EmailMessage
+from pathlib import Path
+
+from app.core.config import settings
+
+
+class AttachmentCache:
+    """Bounded LRU of base64-encoded attachment bodies, keyed by (path, size, mtime).
+
+    Card images are shared by many emails (holiday cards, themed GigaChat illustrations);
+    reading, type-guessing and encoding them once per file instead of once per message cuts
+    CPU and disk reads per send. A changed file gets a new key, so entries never go stale.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: OrderedDict[tuple[str, int, int], tuple[str, str, str]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, path: Path) -> tuple[str, str, str]:
+        """(maintype, subtype, base64 body) of `path`."""
+        st = path.stat()
+        key = (str(path), st.st_size, st.st_mtime_ns)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        ctype, _ = mimetypes.guess_type(str(path))
+        maintype, subtype = ("application", "octet-stream")
+        if ctype and "/" in ctype:
+            maintype, subtype = ctype.split("/", 1)
+        entry = (maintype, subtype, base64.encodebytes(path.read_bytes()).decode("ascii"))
+        with self._lock:
+            self.misses += 1
+            size = len(entry[2])
+            if size > self.max_bytes:
+                return entry
+            if key not in self._entries:
+                self._entries[key] = entry
+                self._size += size
+            while self._size > self.max_bytes:
+                _, (_, _, body) = self._entries.popitem(last=False)
+                self._size -= len(body)
+        return entry
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+
+_cache: AttachmentCache | None = None
+
+
+def get_attachment_cache() -> AttachmentCache:
+    global _cache
+    if _cache is None or _cache.max_bytes != int(settings.mime_cache_max_bytes):
+        _cache = AttachmentCache(settings.mime_cache_max_bytes)
+    return _cache
+
+
+def attach_file(msg: EmailMessage, path: Path) -> None:
+    """Add `path` as an attachment, from the cached pre-encoded body (no re-encoding)."""
+    maintype, subtype, body = get_attachment_cache().get(path)
+    part = EmailMessage(policy=msg.policy)
+    part["Content-Type"] = f"{maintype}/{subtype}"
+    part["Content-Transfer-Encoding"] = "base64"
+    part.add_header("Content-Disposition", "attachment", filename=path.name)
+    part.set_payload(body)
+    if msg.get_content_type() != "multipart/mixed":
+        msg.make_mixed()
+    msg.attach(part)
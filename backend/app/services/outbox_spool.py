@@ -0,0 +1,175 @@
+"""Append-only spool for the file outbox (OUTBOX_FORMAT=spool).
+
+Instead of one .txt file per delivery, deliveries are appended as JSON lines to rotating segment
+files `spool-<YYYYMMDD>-<host>.<pid>-<seq>.jsonl` in the outbox directory. Segments are created
+exclusively, so each has a single writer even when several hosts or containers (all pid 1) share
+the directory, and the byte offset of a record is stable; the delivery keeps the provenance as
+`provider_message="written:<segment>#<offset>"`. Every record is handed to the OS with a single
+write; fsync is batched (OUTBOX_SPOOL_FSYNC_EVERY records, and on rotation/close).
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import io
+import json
+import os
+import re
+import socket
+import threading
+from collections.abc import Iterator
+from pathlib import Path
+
+from app.core.config import settings
+
+SEGMENT_RE = re.compile(r"^spool-\d{8}-[A-Za-z0-9.]+-\d{4}\.jsonl$")
+_REF_RE = re.compile(r"^(spool-\d{8}-[A-Za-z0-9.]+-\d{4}\.jsonl)#(\d+)$")
+
+
+def _instance_id() -> str:
+    """`<host>.<pid>`: the pid alone repeats across containers (all pid 1)."""
+    host = re.sub(r"[^A-Za-z0-9]+", "", socket.gethostname())[:32] or "host"
+    return f"{host}.{os.getpid()}"
+
+
+class SpoolWriter:
+    def __init__(self, out_dir: Path, *, segment_bytes: int, fsync_every: int) -> None:
+        self.out_dir = Path(out_dir)
+        self.segment_bytes = max(1024, int(segment_bytes))
+        self.fsync_every = max(1, int(fsync_every))
+        self._lock = threading.Lock()
+        self._file: io.FileIO | None = None
+        self._path: Path | None = None
+        self._day = ""
+        self._unsynced = 0
+
+    def append(self, record: dict) -> str:
+        """Append one record; returns its reference `<segment>#<offset>`."""
+        line = (json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n").encode()
+        with self._lock:
+            f = self._segment_for(len(line))
+            offset = f.tell()
+            f.write(line)
+            self._unsynced += 1
+            if self._unsynced >= self.fsync_every:
+                self._sync()
+            assert self._path is not None
+            return f"{self._path.name}#{offset}"
+
+    def _segment_for(self, incoming: int) -> io.FileIO:
+        day = dt.date.today().strftime("%Y%m%d")
+        f = self._file
+        if f is not None:
+            st = os.fstat(f.fileno())
+            # Rotate on size or day; reopen if the segment was removed underneath us (reset/GC).
+            if st.st_nlink and day == self._day and st.st_size + incoming <= self.segment_bytes:
+                return f
+            self._close_segment()
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        instance = _instance_id()
+        seq = 1
+        while True:
+            path = self.out_dir / f"spool-{day}-{instance}-{seq:04d}.jsonl"
+            try:
+                # Exclusive create: a segment has exactly one writer, however many share the dir.
+                fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL | os.O_APPEND, 0o644)
+            except FileExistsError:
+                seq += 1
+                continue
+            break
+        # Unbuffered: each record is a single write(); the file stays open across appends.
+        self._file = io.FileIO(fd, "ab", closefd=True)
+        self._path = path
+        self._day = day
+        return self._file
+
+    def _sync(self) -> None:
+        if self._file is not None and self._unsynced:
+            os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _close_segment(self) -> None:
+        if self._file is not None:
+            self._sync()
+            self._file.close()
+        self._file = None
+        self._path = None
+
+    def flush(self) -> None:
+        with self._lock:
+            self._sync()
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_segment()
+
+
+_writers: dict[Path, SpoolWriter] = {}
+_writers_lock = threading.Lock()
+
+
+def get_spool_writer(out_dir: Path) -> SpoolWriter:
+    """Process-wide writer per outbox directory."""
+    key = Path(out_dir).resolve()
+    with _writers_lock:
+        writer = _writers.get(key)
+        if writer is None:
+            writer = SpoolWriter(
+                key,
+                segment_bytes=settings.outbox_spool_segment_bytes,
+                fsync_every=settings.outbox_spool_fsync_every,
+            )
+            _writers[key] = writer
+        return writer
+
+
+def close_spool_writers() -> None:
+    with _writers_lock:
+        for writer in _writers.values():
+            writer.close()
+        _writers.clear()
+
+
+def parse_ref(provider_message: str | None) -> tuple[str, int] | None:
+    """(segment name, offset) of a spooled delivery's `written:` provenance, else None."""
+    if not provider_message or not provider_message.startswith("written:"):
+        return None
+    m = _REF_RE.match(provider_message[len("written:") :])
+    return (m.group(1), int(m.group(2))) if m else None
+
+
+def read_record(out_dir: Path, segment: str, offset: int) -> dict:
+    """The record at `offset` of `segment` (one seek + one line read)."""
+    if not SEGMENT_RE.match(segment):
+        raise ValueError(f"not a spool segment: {segment}")
+    with (Path(out_dir) / segment).open("rb") as f:
+        f.seek(offset)
+        record: dict = json.loads(f.readline())
+        return record
+
+
+def scan_segment(path: Path) -> Iterator[tuple[int, dict]]:
+    """(offset, record) for every complete record of a segment (a torn tail is skipped)."""
+    with path.open("rb") as f:
+        offset = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                yield offset, json.loads(line)
+            except ValueError:
+                pass
+            offset += len(line)
+
+
+def build_index(out_dir: Path) -> dict[str, str]:
+    """Idempotency key -> `<segment>#<offset>` over all segments (for records without a DB row)."""
+    index: dict[str, str] = {}
+    for path in sorted(Path(out_dir).glob("spool-*.jsonl")):
+        if not SEGMENT_RE.match(path.name):
+            continue
+        for offset, record in scan_segment(path):
+            key = record.get("key")
+            if key:
+                index[str(key)] = f"{path.name}#{offset}"
+    return index
@@ -5,16 +5,18 @@ from pathlib import Path
 from sqlalchemy import delete
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.models import AgentRun, Delivery, Event, Greeting
+from app.db.models import AgentRun, Delivery, DeliveryJob, Event, Greeting
+from app.services.artifact_layout import iter_files
 
 
 async def reset_runtime_data(session: AsyncSession) -> dict:
     """Reset runtime-generated data for clean demos.
 
     - Keeps Clients and Holidays
-    - Clears Events, Greetings, Deliveries, AgentRuns
+    - Clears Events, Greetings, Deliveries (and queued jobs), AgentRuns
     - Clears artifacts in data/outbox, data/cards, data/smoke
     """
+    await session.execute(delete(DeliveryJob))
     await session.execute(delete(Delivery))
     await session.execute(delete(Greeting))
     await session.execute(delete(Event))
@@ -24,15 +26,12 @@ async def reset_runtime_data(session: AsyncSession) -> dict:
     base = Path(__file__).resolve().parents[2] / "data"
     cleared_files = 0
     for sub in ("outbox", "cards", "smoke"):
-        d = base / sub
-        if not d.exists():
-            continue
-        for p in d.glob("*"):
-            if p.is_file():
-                try:
-                    p.unlink()
-                    cleared_files += 1
-                except Exception:
-                    pass
+        # Shard by shard (ARTIFACT_LAYOUT=hash2), never one huge listing.
+        for p in iter_files(base / sub):
+            try:
+                p.unlink()
+                cleared_files += 1
+            except Exception:
+                pass
 
     return {"ok": True, "cleared_files": cleared_files}
@@ -0,0 +1,149 @@
+"""Send windows (SEND_SCHEDULE=window): spread the day's sends instead of one morning burst.
+
+Each due greeting gets a send slot inside SEND_WINDOW_START..SEND_WINDOW_END of its client's
+local day (Client.timezone, else TZ). Each zone's greetings are spaced evenly over that zone's
+window, and per channel never closer than CHANNEL_<X>_RATE_PER_SEC allows, so the relay sees a
+bounded, steady rate. The slot is the DeliveryJob's next_attempt_at: dispatch releases jobs as
+their slots come due. A slot never passes its window end: volume the rate cap can't fit in the
+window is clamped to the end (and logged), where the channel limiter paces the actual sends.
+"""
+
+from __future__ import annotations
+
+import datetime as dt
+import logging
+from dataclasses import dataclass
+from typing import Protocol
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SlotRequest:
+    greeting_id: int
+    channel: str  # logical channel: email|sms|messenger
+    tz: str | None = None  # IANA name; None = TZ
+
+
+def window_enabled() -> bool:
+    return (settings.send_schedule or "immediate").lower() == "window"
+
+
+def _parse_hhmm(value: str) -> dt.time:
+    try:
+        hh, mm = (value or "").strip().split(":", 1)
+        return dt.time(int(hh), int(mm))
+    except ValueError as e:
+        raise ValueError(f"Invalid time of day {value!r} (expected HH:MM)") from e
+
+
+def zone_of(tz: str | None) -> ZoneInfo:
+    for name in (tz, settings.tz, "UTC"):
+        if name:
+            try:
+                return ZoneInfo(name)
+            except (ZoneInfoNotFoundError, ValueError):
+                continue
+    return ZoneInfo("UTC")
+
+
+class _Zoned(Protocol):
+    @property
+    def timezone(self) -> str | None: ...
+
+
+def client_tz(client: _Zoned | None) -> str | None:
+    return (getattr(client, "timezone", None) or "").strip() or None
+
+
+def _local_day(day: dt.date, tz: str | None) -> tuple[dt.datetime, dt.datetime]:
+    zone = zone_of(tz)
+    start = dt.datetime.combine(day, dt.time(0), tzinfo=zone)
+    end = dt.datetime.combine(day + dt.timedelta(days=1), dt.time(0), tzinfo=zone)
+    return start.astimezone(dt.timezone.utc), end.astimezone(dt.timezone.utc)
+
+
+def window_bounds(day: dt.date, tz: str | None = None) -> tuple[dt.datetime, dt.datetime]:
+    """The send window of `day` in the zone `tz`, as UTC datetimes."""
+    zone = zone_of(tz)
+    start = dt.datetime.combine(day, _parse_hhmm(settings.send_window_start), tzinfo=zone)
+    end = dt.datetime.combine(day, _parse_hhmm(settings.send_window_end), tzinfo=zone)
+    if end <= start:
+        raise ValueError("SEND_WINDOW_END must be after SEND_WINDOW_START")
+    return start.astimezone(dt.timezone.utc), end.astimezone(dt.timezone.utc)
+
+
+def _usable_window(
+    day: dt.date, tz: str | None, now: dt.datetime
+) -> tuple[dt.datetime, dt.datetime] | None:
+    """What is left of the zone's window of `day` at `now`; None once the local day is over.
+
+    A window that has already closed falls back to the rest of the local day: the greeting is
+    still sent on its day, just outside the preferred hours.
+    """
+    start, end = window_bounds(day, tz)
+    if now >= end:
+        start, end = _local_day(day, tz)
+    if now >= end:
+        return None
+    return max(start, now), end
+
+
+def assign_slots(
+    requests: list[SlotRequest], *, day: dt.date, now: dt.datetime
+) -> dict[int, dt.datetime]:
+    """Send slot (UTC) per greeting id; never earlier than `now`.
+
+    Each time zone's greetings are spread evenly over what is left of that zone's window, so
+    they fit it whatever the volume. Per channel the slots are then kept at least 1/rate cap
+    apart; a slot the cap pushes past its window end is clamped to the end (dispatch paces
+    those sends through the channel limiter) and reported. Greetings whose local day is already
+    over get `now` and are reported too.
+    """
+    slots: dict[int, dt.datetime] = {}
+    by_window: dict[tuple[str, tuple[dt.datetime, dt.datetime]], list[int]] = {}
+    late: dict[str, int] = {}
+    for r in requests:
+        window = _usable_window(day, r.tz, now)
+        if window is None:
+            slots[r.greeting_id] = now
+            late[r.channel] = late.get(r.channel, 0) + 1
+            continue
+        by_window.setdefault((r.channel, window), []).append(r.greeting_id)
+
+    # Ideal slots: evenly spaced within each zone's window.
+    by_channel: dict[str, list[tuple[dt.datetime, int, dt.datetime]]] = {}
+    for (channel, (start, end)), ids in by_window.items():
+        step = (end - start) / len(ids)
+        by_channel.setdefault(channel, []).extend(
+            (start + i * step, greeting_id, end) for i, greeting_id in enumerate(sorted(ids))
+        )
+
+    overflow: dict[str, int] = {}
+    for channel, items in by_channel.items():
+        items.sort()
+        rate = float(getattr(settings, f"channel_{channel}_rate_per_sec", 0) or 0)
+        gap = dt.timedelta(seconds=1.0 / rate) if rate > 0 else dt.timedelta(0)
+        last: dt.datetime | None = None
+        for ideal, greeting_id, end in items:
+            slot = ideal if last is None else max(ideal, last + gap)
+            if slot > end:
+                slot = end
+                overflow[channel] = overflow.get(channel, 0) + 1
+            slots[greeting_id] = slot
+            last = max(slot, last) if last is not None else slot
+
+    for channel, n in overflow.items():
+        log.warning(
+            "send window: %s %s greetings exceed CHANNEL_%s_RATE_PER_SEC within their window; "
+            "clamped to the window end",
+            n,
+            channel,
+            channel.upper(),
+        )
+    for channel, n in late.items():
+        log.warning("send window: %s %s greetings are past their local day", n, channel)
+    return slots
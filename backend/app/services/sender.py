@@ -1,17 +1,28 @@
 from __future__ import annotations
 
+import asyncio
 import datetime as dt
 import hashlib
-import mimetypes
-import smtplib
-from email.message import EmailMessage
+from collections.abc import Iterable
+from dataclasses import dataclass
 from pathlib import Path
 
+from sqlalchemy import inspect as sa_inspect
 from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.core.config import settings
 from app.db.models import Client, Delivery, Greeting
+from app.services.channels import (
+    ChannelAdapter,
+    Message,
+    OutboxAdapter,
+    SendOutcome,
+    effective_mode,
+    get_adapter,
+)
+
+RETRYING = "retrying"  # Delivery.status of a failed send waiting for its next attempt
 
 
 def _idempotency_key(*, greeting_id: int, channel: str, recipient: str) -> str:
@@ -19,79 +30,248 @@ def _idempotency_key(*, greeting_id: int, channel: str, recipient: str) -> str:
     return hashlib.sha256(raw).hexdigest()[:40]
 
 
-async def send_greeting_file(
-    session: AsyncSession,
-    *,
-    greeting: Greeting,
-    recipient: str,
-    outbox_dir: str | Path | None = None,
-) -> Delivery:
-    """MVP sender: writes a .txt message into outbox directory.
+def _delivery_channel(channel: str, client: Client | None) -> str:
+    """Delivery.channel of a send: email goes out as "email" (SMTP) or "file" (outbox)."""
+    if channel in ("sms", "messenger"):
+        return channel
+    return "email" if effective_mode(client) == "smtp" else "file"
 
-    Idempotent by (greeting_id, channel, recipient).
-    """
-    channel = "file"
-    out_dir = Path(outbox_dir or settings.outbox_dir)
-    out_dir.mkdir(parents=True, exist_ok=True)
-
-    key = _idempotency_key(greeting_id=greeting.id, channel=channel, recipient=recipient)
-    existing = (
-        await session.execute(select(Delivery).where(Delivery.idempotency_key == key))
-    ).scalar_one_or_none()
-    if existing:
-        return existing
-
-    filename = f"delivery_{greeting.id}_{key}.txt"
-    path = out_dir / filename
-    payload = "\n".join(
-        [
-            f"TO: {recipient}",
-            f"SUBJECT: {greeting.subject}",
-            "",
-            greeting.body,
-            "",
-            f"IMAGE: {greeting.image_path or ''}",
-        ]
-    )
-    path.write_text(payload, encoding="utf-8")
 
-    delivery = Delivery(
+def delivery_key(
+    *, greeting: Greeting, recipient: str, client: Client | None, channel: str = "email"
+) -> str:
+    """Idempotency key `send_greeting` will use for this greeting/recipient/client/channel."""
+    return _idempotency_key(
         greeting_id=greeting.id,
-        channel=channel,
+        channel=_delivery_channel(channel, client),
         recipient=recipient,
-        status="sent",
-        provider_message=f"written:{path.name}",
-        sent_at=dt.datetime.now(dt.timezone.utc),
-        idempotency_key=key,
     )
-    session.add(delivery)
-    await session.commit()
+
+
+async def existing_deliveries(session: AsyncSession, keys: Iterable[str]) -> dict[str, Delivery]:
+    """Deliveries already recorded for `keys`, in one query per 500 keys (bulk dedupe)."""
+    keys = sorted(set(keys))
+    found: dict[str, Delivery] = {}
+    for i in range(0, len(keys), 500):
+        rows = await session.execute(
+            select(Delivery).where(Delivery.idempotency_key.in_(keys[i : i + 500]))
+        )
+        found.update((d.idempotency_key, d) for d in rows.scalars())
+    return found
+
+
+async def _find_existing(
+    session: AsyncSession, key: str, existing: dict[str, Delivery] | None
+) -> Delivery | None:
+    if existing is None:
+        return (
+            await session.execute(select(Delivery).where(Delivery.idempotency_key == key))
+        ).scalar_one_or_none()
+    # Pre-fetched by the caller for the whole batch: a miss means "not delivered yet".
+    found = existing.get(key)
+    if found is not None and sa_inspect(found).expired:
+        await session.refresh(found)
+    return found
+
+
+async def _record(session: AsyncSession, delivery: Delivery, *, commit: bool = True) -> Delivery:
+    """Insert (+ commit); if a concurrent sender recorded the same key first, return its row.
+
+    The unique constraint on idempotency_key is the real guard; the insert runs in a savepoint
+    so losing the race doesn't roll back (and expire) the caller's other pending state.
+    """
+    try:
+        async with session.begin_nested():
+            session.add(delivery)
+    except IntegrityError:
+        winner = (
+            await session.execute(
+                select(Delivery).where(Delivery.idempotency_key == delivery.idempotency_key)
+            )
+        ).scalar_one_or_none()
+        if winner is None:
+            raise
+        delivery = winner
+    if commit:
+        await session.commit()
     return delivery
 
 
-def _split_domains(csv: str) -> set[str]:
-    return {d.strip().lower() for d in (csv or "").split(",") if d.strip()}
+@dataclass(frozen=True)
+class SendRequest:
+    greeting: Greeting
+    recipient: str
+    client: Client | None = None
+    channel: str = "email"  # logical channel: email|sms|messenger
+
+
+@dataclass(frozen=True)
+class PlannedSend:
+    """One send of a batch: what goes out, where, and the delivery already recorded for it."""
+
+    adapter: ChannelAdapter
+    message: Message
+    recipient: str
+    key: str
+    found: Delivery | None = None
+
+    @property
+    def due(self) -> bool:
+        """False for keys already delivered (a delivery waiting for its retry is resent)."""
+        return self.found is None or self.found.status == RETRYING
+
+
+async def _plan(
+    session: AsyncSession,
+    items: list[tuple[ChannelAdapter, Greeting, str, Client | None]],
+    existing: dict[str, Delivery] | None,
+) -> list[PlannedSend]:
+    planned = []
+    for adapter, greeting, recipient, client in items:
+        key = _idempotency_key(
+            greeting_id=greeting.id, channel=adapter.channel, recipient=recipient
+        )
+        found = await _find_existing(session, key, existing)
+        planned.append(PlannedSend(adapter, Message.of(greeting, client), recipient, key, found))
+    return planned
+
+
+def _items(
+    requests: list[SendRequest],
+) -> list[tuple[ChannelAdapter, Greeting, str, Client | None]]:
+    return [(get_adapter(r.channel, r.client), r.greeting, r.recipient, r.client) for r in requests]
+
+
+async def plan_sends(
+    session: AsyncSession,
+    requests: list[SendRequest],
+    *,
+    existing: dict[str, Delivery] | None = None,
+) -> list[PlannedSend]:
+    """DB phase 1 of a batch: resolve adapters and keys, look up recorded deliveries."""
+    return await _plan(session, _items(requests), existing)
+
+
+async def perform_sends(planned: list[PlannedSend]) -> list[SendOutcome | BaseException | None]:
+    """The channel I/O of a batch, concurrently; no DB access (messages are detached copies).
+
+    Each adapter bounds its channel's concurrency and rate, so the batch goes out as fast as
+    the channels allow. None for sends that are not due; a raised exception is returned in
+    place of its outcome.
+    """
+
+    async def _send(p: PlannedSend) -> SendOutcome | None:
+        if not p.due:
+            return None
+        return await p.adapter.send(message=p.message, recipient=p.recipient, key=p.key)
+
+    return await asyncio.gather(*(_send(p) for p in planned), return_exceptions=True)
+
 
+async def record_sends(
+    session: AsyncSession,
+    planned: list[PlannedSend],
+    outcomes: list[SendOutcome | BaseException | None],
+    *,
+    commit: bool = True,
+) -> list[Delivery | Exception]:
+    """DB phase 2 of a batch: record the outcomes as deliveries.
+
+    Each write runs in its own savepoint, so one failing record doesn't undo the others. With
+    `commit=False` the caller commits the whole batch (together with its own state changes).
+    A failure is returned in place of its delivery.
+    """
+    results: list[Delivery | Exception] = []
+    for p, outcome in zip(planned, outcomes, strict=True):
+        found = p.found
+        if found is not None and sa_inspect(found).expired:
+            await session.refresh(found)
+        if outcome is None:  # not due: already delivered
+            assert found is not None
+            results.append(found)
+            continue
+        if isinstance(outcome, BaseException):
+            if not isinstance(outcome, Exception):
+                raise outcome
+            results.append(outcome)
+            continue
+        try:
+            if found is not None:
+                # A retry: the same row (and idempotency key) records the new attempt.
+                async with session.begin_nested():
+                    found.status = outcome.status
+                    found.provider_message = outcome.provider_message
+                    found.sent_at = dt.datetime.now(dt.timezone.utc)
+                    found.attempts += 1
+                    found.next_attempt_at = None
+                if commit:
+                    await session.commit()
+                results.append(found)
+                continue
+            delivery = Delivery(
+                greeting_id=p.message.greeting_id,
+                channel=p.adapter.channel,
+                recipient=p.recipient,
+                status=outcome.status,
+                provider_message=outcome.provider_message,
+                sent_at=dt.datetime.now(dt.timezone.utc),
+                idempotency_key=p.key,
+            )
+            results.append(await _record(session, delivery, commit=commit))
+        except Exception as e:
+            if commit:
+                await session.rollback()
+            results.append(e)
+    return results
 
-def _is_demo_or_test_email(email: str) -> bool:
-    low = (email or "").strip().lower()
-    if not low:
-        return True
-    if low.endswith("@example.com"):
-        return True
-    if low.startswith("demo_client_") and low.endswith("@example.com"):
-        return True
-    # common non-routable examples
-    if low.endswith(".invalid") or low.endswith(".example"):
-        return True
-    return False
+
+async def _deliver(
+    session: AsyncSession,
+    items: list[tuple[ChannelAdapter, Greeting, str, Client | None]],
+    existing: dict[str, Delivery] | None,
+) -> list[Delivery | Exception]:
+    """Send (adapter, greeting, recipient, client) items and record their deliveries.
+
+    Already delivered keys are returned as is, except deliveries waiting for a retry: those are
+    resent and updated in place. The channel I/O runs concurrently; the outcomes are then
+    recorded one by one on `session`. A failure is returned in place of its delivery, the
+    others still go out.
+    """
+    planned = await _plan(session, items, existing)
+    return await record_sends(session, planned, await perform_sends(planned))
 
 
-def _recipient_domain(email: str) -> str:
-    low = (email or "").strip().lower()
-    if "@" not in low:
-        return ""
-    return low.split("@", 1)[1]
+async def send_greetings(
+    session: AsyncSession,
+    requests: list[SendRequest],
+    *,
+    existing: dict[str, Delivery] | None = None,
+) -> list[Delivery | Exception]:
+    """Send a batch of greetings across their channels in parallel (see `_deliver`).
+
+    Results are in request order; an exception stands in for a send that failed.
+    """
+    return await _deliver(session, _items(requests), existing)
+
+
+async def send_greeting_file(
+    session: AsyncSession,
+    *,
+    greeting: Greeting,
+    recipient: str,
+    outbox_dir: str | Path | None = None,
+    existing: dict[str, Delivery] | None = None,
+) -> Delivery:
+    """MVP sender: writes a .txt message into outbox directory (or appends it to the spool).
+
+    Idempotent by (greeting_id, channel, recipient). `existing`: deliveries pre-fetched by
+    `existing_deliveries` for a batch (skips the per-message lookup).
+    """
+    adapter = OutboxAdapter("file", outbox_dir=outbox_dir)
+    (result,) = await _deliver(session, [(adapter, greeting, recipient, None)], existing)
+    if isinstance(result, Exception):
+        raise result
+    return result
 
 
 async def send_greeting(
@@ -100,210 +280,22 @@ async def send_greeting(
     greeting: Greeting,
     recipient: str,
     client: Client | None = None,
+    existing: dict[str, Delivery] | None = None,
+    channel: str = "email",
 ) -> Delivery:
-    """Send greeting using configured SEND_MODE with safety guards.
+    """Send greeting over `channel` using configured SEND_MODE (see app.services.channels).
 
-    - Demo clients (Client.is_demo) are NEVER sent via SMTP.
-    - *@example.com (and other test-ish domains) are blocked by default.
-    - Optional domain allowlist for SMTP.
+    Email safety guards (demo clients, test recipients, domain allowlist) apply to SMTP.
+    `existing`: deliveries pre-fetched by `existing_deliveries` for a batch of sends.
     """
-    mode = (settings.send_mode or "file").lower()
-
     # Resolve client if needed (for safety rules and for demo fallbacks).
     if client is None and greeting.client_id is not None:
         client = (
             await session.execute(select(Client).where(Client.id == greeting.client_id))
         ).scalar_one_or_none()
 
-    # Safety UX: if SMTP is enabled, NEVER send real emails to demo clients, but still
-    # allow the demo flow to be shown by writing to file outbox instead.
-    effective_mode = mode
-    if effective_mode == "smtp" and client is not None and bool(getattr(client, "is_demo", False)):
-        effective_mode = "file"
-
-    # Determine channel (MVP: only email + file)
-    channel = "email" if effective_mode == "smtp" else "file"
-
-    key = _idempotency_key(greeting_id=greeting.id, channel=channel, recipient=recipient)
-    existing = (
-        await session.execute(select(Delivery).where(Delivery.idempotency_key == key))
-    ).scalar_one_or_none()
-    if existing:
-        return existing
-
-    if effective_mode == "noop":
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel=channel,
-            recipient=recipient,
-            status="skipped",
-            provider_message="noop",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-
-    if effective_mode == "file":
-        return await send_greeting_file(session, greeting=greeting, recipient=recipient)
-
-    if effective_mode != "smtp":
-        # Unknown mode -> safe fallback to file
-        return await send_greeting_file(session, greeting=greeting, recipient=recipient)
-
-    # SMTP mode: safety checks
-    # Require a valid email recipient for SMTP.
-    if "@" not in (recipient or ""):
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="error",
-            provider_message="smtp:invalid-email-recipient",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-
-    if client is not None and bool(getattr(client, "is_demo", False)):
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="skipped",
-            provider_message="blocked:demo-client",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-
-    if _is_demo_or_test_email(recipient):
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="skipped",
-            provider_message="blocked:test-recipient",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-
-    # Domain allowlist (recommended): for safety, by default we require allowlist OR explicit allow-all flag.
-    allowlist = _split_domains(settings.smtp_allowlist_domains)
-    if not settings.smtp_allow_all_recipients:
-        dom = _recipient_domain(recipient)
-        if not allowlist:
-            d = Delivery(
-                greeting_id=greeting.id,
-                channel="email",
-                recipient=recipient,
-                status="skipped",
-                provider_message="blocked:allowlist-empty",
-                sent_at=dt.datetime.now(dt.timezone.utc),
-                idempotency_key=key,
-            )
-            session.add(d)
-            await session.commit()
-            return d
-        if dom not in allowlist:
-            d = Delivery(
-                greeting_id=greeting.id,
-                channel="email",
-                recipient=recipient,
-                status="skipped",
-                provider_message=f"blocked:domain-not-allowlisted:{dom}",
-                sent_at=dt.datetime.now(dt.timezone.utc),
-                idempotency_key=key,
-            )
-            session.add(d)
-            await session.commit()
-            return d
-
-    # SMTP config
-    if not settings.smtp_host:
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="error",
-            provider_message="smtp:not-configured",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-
-    from_email = settings.smtp_from_email or settings.smtp_username or "no-reply@example.com"
-
-    msg = EmailMessage()
-    msg["From"] = from_email
-    msg["To"] = recipient
-    msg["Subject"] = greeting.subject
-    msg.set_content(greeting.body)
-
-    # Attach image if available
-    if greeting.image_path:
-        cards_dir = Path(__file__).resolve().parents[2] / "data"
-        p = cards_dir / greeting.image_path
-        if p.exists() and p.is_file():
-            ctype, _ = mimetypes.guess_type(str(p))
-            maintype, subtype = ("application", "octet-stream")
-            if ctype and "/" in ctype:
-                maintype, subtype = ctype.split("/", 1)
-            msg.add_attachment(p.read_bytes(), maintype=maintype, subtype=subtype, filename=p.name)
-
-    try:
-        if settings.smtp_ssl:
-            with smtplib.SMTP_SSL(
-                settings.smtp_host,
-                int(settings.smtp_port),
-                timeout=float(settings.smtp_timeout_sec),
-            ) as s:
-                if settings.smtp_username and settings.smtp_password:
-                    s.login(settings.smtp_username, settings.smtp_password)
-                s.send_message(msg)
-        else:
-            with smtplib.SMTP(
-                settings.smtp_host,
-                int(settings.smtp_port),
-                timeout=float(settings.smtp_timeout_sec),
-            ) as s:
-                if settings.smtp_starttls:
-                    s.starttls()
-                if settings.smtp_username and settings.smtp_password:
-                    s.login(settings.smtp_username, settings.smtp_password)
-                s.send_message(msg)
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="sent",
-            provider_message="smtp:sent",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
-    except Exception as e:
-        d = Delivery(
-            greeting_id=greeting.id,
-            channel="email",
-            recipient=recipient,
-            status="error",
-            provider_message=f"smtp:error:{e.__class__.__name__}",
-            sent_at=dt.datetime.now(dt.timezone.utc),
-            idempotency_key=key,
-        )
-        session.add(d)
-        await session.commit()
-        return d
+    request = SendRequest(greeting=greeting, recipient=recipient, client=client, channel=channel)
+    (result,) = await send_greetings(session, [request], existing=existing)
+    if isinstance(result, Exception):
+        raise result
+    return result
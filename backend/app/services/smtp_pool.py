@@ -0,0 +1,182 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import queue
+import smtplib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.message import EmailMessage
+
+from app.core.config import settings
+
+log = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class SMTPConfig:
+    host: str
+    port: int
+    username: str | None
+    password: str | None
+    starttls: bool
+    ssl: bool
+    timeout: float
+
+    @classmethod
+    def from_settings(cls) -> SMTPConfig:
+        return cls(
+            host=settings.smtp_host or "",
+            port=int(settings.smtp_port),
+            username=settings.smtp_username,
+            password=settings.smtp_password,
+            starttls=bool(settings.smtp_starttls),
+            ssl=bool(settings.smtp_ssl),
+            timeout=float(settings.smtp_timeout_sec),
+        )
+
+
+class _Conn:
+    def __init__(self, smtp: smtplib.SMTP) -> None:
+        self.smtp = smtp
+        self.sent = 0
+        self.last_used = time.monotonic()
+
+
+class SMTPPool:
+    """Small pool of authenticated SMTP sessions, used from worker threads.
+
+    - up to `size` connections (and as many sends in parallel); each sends many messages;
+    - idle sessions older than `idle_sec` or past `max_messages` are replaced, since servers
+      drop idle connections and cap messages per session;
+    - a dead connection is replaced and the message retried once, transparently;
+    - per-message rejections (refused recipient, data error) are raised as before and keep
+      the session, so Delivery outcomes are the same as with one connection per message.
+    """
+
+    def __init__(
+        self,
+        config: SMTPConfig,
+        *,
+        size: int = 2,
+        idle_sec: float = 60.0,
+        max_messages: int = 100,
+    ) -> None:
+        self.config = config
+        self.size = max(1, int(size))
+        self.idle_sec = float(idle_sec)
+        self.max_messages = max(1, int(max_messages))
+        self._idle: queue.LifoQueue[_Conn] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._executor = ThreadPoolExecutor(max_workers=self.size, thread_name_prefix="smtp")
+        self.connects = 0
+
+    def _connect(self) -> _Conn:
+        cfg = self.config
+        if cfg.ssl:
+            smtp: smtplib.SMTP = smtplib.SMTP_SSL(cfg.host, cfg.port, timeout=cfg.timeout)
+        else:
+            smtp = smtplib.SMTP(cfg.host, cfg.port, timeout=cfg.timeout)
+        try:
+            if not cfg.ssl and cfg.starttls:
+                smtp.starttls()
+            if cfg.username and cfg.password:
+                smtp.login(cfg.username, cfg.password)
+        except Exception:
+            _close(smtp)
+            raise
+        self.connects += 1
+        return _Conn(smtp)
+
+    def _checkout(self) -> _Conn:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return self._connect()
+            stale = time.monotonic() - conn.last_used > self.idle_sec
+            if stale or conn.sent >= self.max_messages:
+                _close(conn.smtp)
+                continue
+            return conn
+
+    def _checkin(self, conn: _Conn) -> None:
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def send_message(self, msg: EmailMessage) -> None:
+        """Blocking send (call from a worker thread); raises like smtplib's send_message."""
+        with self._slots:
+            conn = self._checkout()
+            retried = False
+            while True:
+                try:
+                    conn.smtp.send_message(msg)
+                except smtplib.SMTPServerDisconnected as e:
+                    error: Exception = e
+                except smtplib.SMTPException:
+                    self._checkin(conn)
+                    raise
+                except OSError as e:  # reset, timeout, broken pipe
+                    error = e
+                else:
+                    conn.sent += 1
+                    self._checkin(conn)
+                    return
+                _close(conn.smtp)
+                if retried:
+                    raise error
+                retried = True
+                log.info("SMTP connection lost (%s); reconnecting", error.__class__.__name__)
+                conn = self._connect()
+
+    async def send(self, msg: EmailMessage) -> None:
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._executor, self.send_message, msg)
+
+    def close(self) -> None:
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            _close(conn.smtp)
+        self._executor.shutdown(wait=False)
+
+
+def _close(smtp: smtplib.SMTP) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+_pool: SMTPPool | None = None
+
+
+def get_smtp_pool() -> SMTPPool:
+    """Process-wide pool for the current SMTP settings (rebuilt when they change)."""
+    global _pool
+    config = SMTPConfig.from_settings()
+    if _pool is None or _pool.config != config:
+        if _pool is not None:
+            _pool.close()
+        _pool = SMTPPool(
+            config,
+            size=settings.smtp_pool_size,
+            idle_sec=settings.smtp_pool_idle_sec,
+            max_messages=settings.smtp_max_messages_per_connection,
+        )
+    return _pool
+
+
+def shutdown_smtp_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
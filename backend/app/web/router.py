@@ -2,7 +2,9 @@ from __future__ import annotations
 
 import datetime as dt
 import re
+from collections.abc import Sequence
 from pathlib import Path
+from typing import Any
 from urllib.parse import quote
 
 from fastapi import APIRouter, Depends, Form, Request
@@ -13,15 +15,18 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 
 from app.agent.orchestrator import run_once
+from app.core.config import settings
 from app.db.models import AgentRun, Client, Delivery, Event, Greeting
 from app.db.session import get_session
 from app.services.approval import approve_greeting, reject_greeting
+from app.services.lazy_cards import card_url
 from app.services.reset_runtime import reset_runtime_data
 
 router = APIRouter()
 
 TEMPLATES_DIR = Path(__file__).resolve().parent / "templates"
 templates = Jinja2Templates(directory=str(TEMPLATES_DIR))
+templates.env.globals["card_url"] = card_url
 
 
 @router.get("/", response_class=HTMLResponse)
@@ -268,4 +273,55 @@ async def runs_page(request: Request, session: AsyncSession = Depends(get_sessio
         .scalars()
         .all()
     )
-    return templates.TemplateResponse("runs.html", {"request": request, "runs": runs})
+    # Token spend per greeting, by event type and client segment (only greetings that used an LLM).
+    token_rows: Sequence[Any] = (
+        await session.execute(
+            select(
+                Event.event_type,
+                Client.segment,
+                func.count(Greeting.id),
+                func.sum(Greeting.prompt_tokens),
+                func.sum(Greeting.completion_tokens),
+                func.avg(Greeting.prompt_tokens),
+                func.avg(Greeting.completion_tokens),
+                func.avg(Greeting.llm_latency_ms),
+            )
+            .join(Event, Event.id == Greeting.event_id)
+            .join(Client, Client.id == Greeting.client_id)
+            .where(Greeting.prompt_tokens.is_not(None))
+            .group_by(Event.event_type, Client.segment)
+            .order_by(Event.event_type, Client.segment)
+        )
+    ).all()
+    token_stats = [
+        {
+            "event_type": event_type,
+            "segment": segment,
+            "greetings": int(n),
+            "prompt_tokens": int(sum_prompt or 0),
+            "completion_tokens": int(sum_completion or 0),
+            "avg_prompt_tokens": round(float(avg_prompt or 0)),
+            "avg_completion_tokens": round(float(avg_completion or 0)),
+            "avg_latency_ms": round(float(avg_latency or 0)),
+        }
+        for (
+            event_type,
+            segment,
+            n,
+            sum_prompt,
+            sum_completion,
+            avg_prompt,
+            avg_completion,
+            avg_latency,
+        ) in token_rows
+    ]
+    return templates.TemplateResponse(
+        "runs.html",
+        {
+            "request": request,
+            "runs": runs,
+            "token_stats": token_stats,
+            "price_prompt": float(settings.llm_price_per_1k_prompt_tokens),
+            "price_completion": float(settings.llm_price_per_1k_completion_tokens),
+        },
+    )
@@ -0,0 +1,371 @@
+"""Local stand-in for OpenAI / GigaChat HTTP APIs (load + latency testing, fully offline).
+
+Implements just enough of both APIs for the real clients in app/agent to work unchanged:
+
+- POST /v1/chat/completions                 OpenAI-compatible chat (OPENAI_BASE_URL=.../v1)
+- POST /api/v2/oauth                        GigaChat OAuth (GIGACHAT_OAUTH_URL)
+- POST /api/v1/chat/completions             GigaChat chat; function_call="auto" + "Нарисуй ..."
+                                            answers with <img src="file_id" fuse="true"/>
+- GET|POST /api/v1/files/{file_id}/content  GigaChat image download (JPEG bytes)
+
+Responses are deterministic: greeting JSON depends only on the request messages, file ids on
+--seed + call counter, JPEG bytes on the file id. Latency distributions and error/429 injection
+are configurable per endpoint group.
+
+Usage (from backend/):
+
+    python -m app.worker.llm_standin --port 8090 --chat-latency lognormal:800:0.4 --rate-limit-rate 0.05
+
+and point the app to it (backend/.env):
+
+    GIGACHAT_CREDENTIALS=standin
+    GIGACHAT_OAUTH_URL=http://127.0.0.1:8090/api/v2/oauth
+    GIGACHAT_BASE_URL=http://127.0.0.1:8090/api/v1
+    OPENAI_API_KEY=standin
+    OPENAI_BASE_URL=http://127.0.0.1:8090/v1
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import io
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Header, Request
+from fastapi.responses import JSONResponse, Response
+from PIL import Image, ImageDraw
+
+_FILE_ID_NAMESPACE = uuid.UUID("6f1c2a56-7f0e-4a8e-9a43-3c1f0d6f5b21")
+
+
+class LatencyDistribution:
+    """Parse and sample a latency spec (milliseconds).
+
+    Specs: "0" / "250" (fixed), "uniform:MIN:MAX", "normal:MEAN:STD", "lognormal:MEDIAN:SIGMA".
+    """
+
+    def __init__(self, spec: str) -> None:
+        self.spec = (spec or "0").strip()
+        parts = self.spec.split(":")
+        kind = parts[0].lower()
+        self._args: tuple[float, ...]
+        try:
+            if len(parts) == 1:
+                self._kind, self._args = "fixed", (float(parts[0]),)
+            elif kind in {"uniform", "normal", "lognormal"} and len(parts) == 3:
+                self._kind, self._args = kind, (float(parts[1]), float(parts[2]))
+            else:
+                raise ValueError
+        except ValueError as e:
+            raise ValueError(f"invalid latency spec: {spec!r}") from e
+
+    def sample_ms(self, rng: random.Random) -> float:
+        a = self._args
+        if self._kind == "fixed":
+            ms = a[0]
+        elif self._kind == "uniform":
+            ms = rng.uniform(a[0], a[1])
+        elif self._kind == "normal":
+            ms = rng.gauss(a[0], a[1])
+        else:
+            ms = a[0] * math.exp(rng.gauss(0.0, a[1]))
+        return max(0.0, ms)
+
+
+@dataclass
+class StandinConfig:
+    seed: int = 42
+    oauth_latency: str = "0"
+    chat_latency: str = "0"
+    image_latency: str = "0"
+    file_latency: str = "0"
+    # Share of chat/file requests answered with HTTP 500 / HTTP 429 (Retry-After: 1).
+    error_rate: float = 0.0
+    rate_limit_rate: float = 0.0
+    token_ttl_sec: int = 1800
+    image_size: int = 512
+    image_cache_items: int = 64
+
+
+@dataclass
+class StandinStats:
+    requests: dict[str, int] = field(default_factory=dict)
+    injected_errors: int = 0
+    injected_rate_limits: int = 0
+
+    def hit(self, name: str) -> None:
+        self.requests[name] = self.requests.get(name, 0) + 1
+
+
+def _digest(*parts: str) -> int:
+    h = hashlib.sha256("\x1f".join(parts).encode("utf-8")).digest()
+    return int.from_bytes(h[:8], "big")
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough, deterministic estimate (Cyrillic ≈ 3 chars/token); good enough for load sizing.
+    return max(1, math.ceil(len(text) / 3))
+
+
+_OPENINGS = [
+    "{name}, пусть этот день станет началом особенно удачного периода.",
+    "{name}, в такой день хочется сказать самые тёплые слова.",
+    "{name}, примите наши искренние поздравления.",
+    "{name}, от всей команды Сбера — с праздником!",
+]
+_MIDDLES = [
+    "Желаем уверенных решений, надёжных партнёров и спокойной уверенности в завтрашнем дне. "
+    "Пусть каждая новая задача приносит удовольствие, а результаты радуют Вас и Вашу команду.",
+    "Пусть работа приносит вдохновение, а рядом всегда будут люди, на которых можно положиться. "
+    "Желаем стабильного роста, смелых идей и времени для самого важного.",
+    "Пусть впереди будет больше ярких событий, удачных проектов и поводов для гордости. "
+    "Желаем здоровья, гармонии и сил для реализации всех планов.",
+]
+_CLOSINGS = [
+    "Спасибо, что остаётесь с нами.\n\nС уважением,\nКоманда Сбер",
+    "Спасибо, что остаётесь с нами. Мы ценим Ваше доверие.\n\nС уважением,\nКоманда Сбер",
+]
+
+
+def _greeting_json(messages: list[dict]) -> str:
+    """Deterministic greeting in the strict JSON format the app asks for."""
+    user = next(
+        (str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), ""
+    )
+    name, title, tone = "Уважаемый клиент", "праздник", "warm"
+    try:
+        payload = json.loads(user)
+        facts = payload.get("facts") or {}
+        name = " ".join(x for x in (facts.get("first_name"), facts.get("middle_name")) if x) or name
+        title = (payload.get("event") or {}).get("title") or title
+        tone = payload.get("tone") or tone
+    except (ValueError, AttributeError):
+        pass
+
+    rng = random.Random(_digest(*(str(m.get("content", "")) for m in messages)))
+    body = "\n\n".join(
+        [
+            rng.choice(_OPENINGS).format(name=name) + f" Поздравляем Вас: {title}!",
+            rng.choice(_MIDDLES),
+            rng.choice(_MIDDLES),
+            rng.choice(_CLOSINGS),
+        ]
+    )
+    subject = f"{title[:60]}: поздравляем!"
+    return json.dumps({"tone": tone, "subject": subject, "body": body}, ensure_ascii=False)
+
+
+def _render_jpeg(file_id: str, size: int) -> bytes:
+    rng = random.Random(_digest(file_id))
+    base = (rng.randrange(0, 60), rng.randrange(90, 200), rng.randrange(60, 140))
+    img = Image.new("RGB", (size, size), base)
+    draw = ImageDraw.Draw(img)
+    for _ in range(12):
+        x, y, r = rng.randrange(size), rng.randrange(size), rng.randrange(size // 16, size // 4)
+        color = tuple(min(255, c + rng.randrange(20, 110)) for c in base)
+        draw.ellipse([x - r, y - r, x + r, y + r], fill=color)
+    buf = io.BytesIO()
+    img.save(buf, format="JPEG", quality=85)
+    return buf.getvalue()
+
+
+def create_standin_app(config: StandinConfig | None = None) -> FastAPI:
+    cfg = config or StandinConfig()
+    rng = random.Random(cfg.seed)
+    latency = {
+        "oauth": LatencyDistribution(cfg.oauth_latency),
+        "chat": LatencyDistribution(cfg.chat_latency),
+        "image": LatencyDistribution(cfg.image_latency),
+        "file": LatencyDistribution(cfg.file_latency),
+    }
+    stats = StandinStats()
+    tokens: dict[str, float] = {}
+    files: set[str] = set()
+    jpeg_cache: OrderedDict[str, bytes] = OrderedDict()
+    jpeg_lock = threading.Lock()
+    counter = {"file": 0}
+
+    app = FastAPI(title="LLM / GigaChat stand-in")
+    app.state.config = cfg
+    app.state.stats = stats
+
+    async def _delay(kind: str) -> None:
+        ms = latency[kind].sample_ms(rng)
+        if ms > 0:
+            await asyncio.sleep(ms / 1000.0)
+
+    def _injected_failure() -> Response | None:
+        roll = rng.random()
+        if roll < cfg.rate_limit_rate:
+            stats.injected_rate_limits += 1
+            return JSONResponse(
+                {"status": 429, "message": "Too Many Requests"},
+                status_code=429,
+                headers={"Retry-After": "1"},
+            )
+        if roll < cfg.rate_limit_rate + cfg.error_rate:
+            stats.injected_errors += 1
+            return JSONResponse(
+                {"status": 500, "message": "Internal Server Error"}, status_code=500
+            )
+        return None
+
+    def _bearer_ok(authorization: str | None) -> bool:
+        if not authorization or not authorization.startswith("Bearer "):
+            return False
+        expires = tokens.get(authorization[len("Bearer ") :])
+        # OpenAI-style static keys are accepted as-is; GigaChat tokens must be issued and alive.
+        return expires is None or expires > time.time()
+
+    def _chat_response(model: str, content: str, prompt: str, finish_reason: str) -> dict:
+        prompt_tokens = _estimate_tokens(prompt)
+        completion_tokens = _estimate_tokens(content)
+        return {
+            "id": f"chatcmpl-{_digest(prompt, content):016x}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": finish_reason,
+                }
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }
+
+    @app.get("/stats")
+    async def get_stats() -> dict:
+        return {
+            "requests": stats.requests,
+            "injected_errors": stats.injected_errors,
+            "injected_rate_limits": stats.injected_rate_limits,
+            "issued_tokens": len(tokens),
+            "files": len(files),
+        }
+
+    @app.post("/api/v2/oauth")
+    async def gigachat_oauth(authorization: str | None = Header(default=None)):
+        stats.hit("oauth")
+        await _delay("oauth")
+        if not authorization or not authorization.startswith("Basic "):
+            return JSONResponse({"code": 6, "message": "credentials doesn't match db data"}, 401)
+        token = uuid.UUID(int=rng.getrandbits(128)).hex
+        expires_at = time.time() + cfg.token_ttl_sec
+        tokens[token] = expires_at
+        return {"access_token": token, "expires_at": int(expires_at * 1000)}
+
+    async def _chat(request: Request, authorization: str | None, *, gigachat: bool):
+        stats.hit("gigachat_chat" if gigachat else "openai_chat")
+        if not _bearer_ok(authorization):
+            return JSONResponse({"status": 401, "message": "Unauthorized"}, status_code=401)
+        payload = await request.json()
+        messages = payload.get("messages") or []
+        prompt = "\n".join(str(m.get("content", "")) for m in messages)
+        model = str(payload.get("model") or ("GigaChat" if gigachat else "gpt-4o-mini"))
+        last_user = next(
+            (str(m.get("content", "")) for m in reversed(messages) if m.get("role") == "user"), ""
+        )
+        wants_image = (
+            gigachat
+            and payload.get("function_call") == "auto"
+            and last_user.lstrip().lower().startswith("нарисуй")
+        )
+
+        await _delay("image" if wants_image else "chat")
+        failure = _injected_failure()
+        if failure is not None:
+            return failure
+
+        if wants_image:
+            counter["file"] += 1
+            file_id = str(uuid.uuid5(_FILE_ID_NAMESPACE, f"{cfg.seed}:{counter['file']}"))
+            files.add(file_id)
+            content = f'<img src="{file_id}" fuse="true"/>'
+            return _chat_response(model, content, prompt, "stop")
+        return _chat_response(model, _greeting_json(messages), prompt, "stop")
+
+    @app.post("/api/v1/chat/completions")
+    async def gigachat_chat(request: Request, authorization: str | None = Header(default=None)):
+        return await _chat(request, authorization, gigachat=True)
+
+    @app.post("/v1/chat/completions")
+    async def openai_chat(request: Request, authorization: str | None = Header(default=None)):
+        return await _chat(request, authorization, gigachat=False)
+
+    def _jpeg_for(file_id: str) -> bytes:
+        with jpeg_lock:
+            cached = jpeg_cache.get(file_id)
+            if cached is not None:
+                jpeg_cache.move_to_end(file_id)
+                return cached
+        data = _render_jpeg(file_id, cfg.image_size)
+        with jpeg_lock:
+            jpeg_cache[file_id] = data
+            while len(jpeg_cache) > cfg.image_cache_items:
+                jpeg_cache.popitem(last=False)
+        return data
+
+    @app.api_route("/api/v1/files/{file_id}/content", methods=["GET", "POST"])
+    async def gigachat_file_content(file_id: str, authorization: str | None = Header(default=None)):
+        stats.hit("file_content")
+        if not _bearer_ok(authorization):
+            return JSONResponse({"status": 401, "message": "Unauthorized"}, status_code=401)
+        await _delay("file")
+        failure = _injected_failure()
+        if failure is not None:
+            return failure
+        if file_id not in files:
+            return JSONResponse({"status": 404, "message": "file not found"}, status_code=404)
+        data = await asyncio.to_thread(_jpeg_for, file_id)
+        return Response(content=data, media_type="image/jpeg")
+
+    return app
+
+
+def main() -> None:
+    import uvicorn
+
+    ap = argparse.ArgumentParser(description="Local OpenAI/GigaChat stand-in server")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=8090)
+    ap.add_argument("--seed", type=int, default=42)
+    ap.add_argument("--oauth-latency", default="0", help='ms spec, e.g. "50" or "uniform:20:80"')
+    ap.add_argument("--chat-latency", default="0", help='e.g. "lognormal:800:0.4"')
+    ap.add_argument("--image-latency", default="0", help='e.g. "normal:6000:1500"')
+    ap.add_argument("--file-latency", default="0", help='e.g. "uniform:100:400"')
+    ap.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500 answers")
+    ap.add_argument("--rate-limit-rate", type=float, default=0.0, help="share of HTTP 429 answers")
+    ap.add_argument("--image-size", type=int, default=512)
+    args = ap.parse_args()
+
+    cfg = StandinConfig(
+        seed=args.seed,
+        oauth_latency=args.oauth_latency,
+        chat_latency=args.chat_latency,
+        image_latency=args.image_latency,
+        file_latency=args.file_latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        image_size=args.image_size,
+    )
+    print(f"[*] LLM/GigaChat stand-in on http://{args.host}:{args.port}/ (stats: /stats)")
+    uvicorn.run(create_standin_app(cfg), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Move existing cards/outbox files into the ARTIFACT_LAYOUT directory layout.
+
+Run from backend/ after changing ARTIFACT_LAYOUT (safe to re-run; resumes where it stopped):
+
+    python -m app.worker.migrate_layout [--layout flat|hash2] [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+
+from app.core.logging import configure_logging
+from app.db.init_db import init_db
+from app.db.session import SessionLocal
+from app.services.layout_migration import migrate_layout
+
+
+async def _run(*, layout: str | None, dry_run: bool, batch_size: int | None) -> dict:
+    await init_db()
+    async with SessionLocal() as session:
+        return await migrate_layout(session, layout=layout, dry_run=dry_run, batch_size=batch_size)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--layout", choices=["flat", "hash2"], default=None)
+    ap.add_argument("--dry-run", action="store_true", help="report only, move nothing")
+    ap.add_argument("--batch-size", type=int, default=None)
+    args = ap.parse_args()
+    configure_logging()
+    report = asyncio.run(_run(layout=args.layout, dry_run=args.dry_run, batch_size=args.batch_size))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
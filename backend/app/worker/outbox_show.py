@@ -0,0 +1,63 @@
+"""Show one outbox delivery (file or spool record).
+
+Run from backend/:
+
+    python -m app.worker.outbox_show --delivery-id 42
+    python -m app.worker.outbox_show --key <idempotency_key>   # scans spool segments
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from pathlib import Path
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import Delivery
+from app.db.session import SessionLocal
+from app.services.artifact_layout import locate
+from app.services.outbox_spool import build_index, parse_ref, read_record
+
+
+async def _provider_message(delivery_id: int) -> str | None:
+    async with SessionLocal() as session:
+        return (
+            await session.execute(
+                select(Delivery.provider_message).where(Delivery.id == delivery_id)
+            )
+        ).scalar_one_or_none()
+
+
+def show(out_dir: Path, provider_message: str | None) -> str:
+    ref = parse_ref(provider_message)
+    if ref is not None:
+        return json.dumps(read_record(out_dir, *ref), ensure_ascii=False, indent=2)
+    if provider_message and provider_message.startswith("written:"):
+        path = locate(out_dir, provider_message[len("written:") :])
+        if path is not None:
+            return path.read_text(encoding="utf-8")
+    raise SystemExit(f"not an outbox delivery: {provider_message!r}")
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = ap.add_mutually_exclusive_group(required=True)
+    group.add_argument("--delivery-id", type=int)
+    group.add_argument("--key", help="idempotency key (also finds records without a DB row)")
+    ap.add_argument("--outbox-dir", default=None, help="default: OUTBOX_DIR")
+    args = ap.parse_args()
+    out_dir = Path(args.outbox_dir or settings.outbox_dir)
+
+    if args.delivery_id is not None:
+        message = asyncio.run(_provider_message(args.delivery_id))
+    else:
+        ref = build_index(out_dir).get(args.key)
+        message = f"written:{ref}" if ref else None
+    print(show(out_dir, message))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,37 @@
+"""Delivery dispatch workers: drain the delivery outbox (DeliveryJob queue).
+
+Run from backend/ (with DELIVERY_DISPATCH=worker, several processes may run side by side):
+
+    python -m app.worker.run_dispatcher [--workers N] [--once]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+
+from app.core.logging import configure_logging
+from app.db.init_db import init_db
+from app.services.delivery_queue import run_dispatch_workers
+
+
+async def _run(*, workers: int | None, once: bool) -> dict:
+    await init_db()
+    logging.getLogger(__name__).info("delivery dispatch started (once=%s)", once)
+    return await run_dispatch_workers(workers=workers, once=once)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--workers", type=int, default=None, help="default: DELIVERY_WORKERS")
+    ap.add_argument("--once", action="store_true", help="exit when no job is due")
+    args = ap.parse_args()
+    configure_logging()
+    counts = asyncio.run(_run(workers=args.workers, once=args.once))
+    print(json.dumps(counts, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+"""Delete orphaned and expired runtime artifacts (cards, variants, outbox, smoke).
+
+Run from backend/:
+
+    python -m app.worker.run_gc [--dry-run]
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+
+from app.core.logging import configure_logging
+from app.db.init_db import init_db
+from app.db.session import SessionLocal
+from app.services.artifact_gc import collect_garbage
+
+
+async def _run(*, dry_run: bool, batch_size: int | None) -> dict:
+    await init_db()
+    async with SessionLocal() as session:
+        report = await collect_garbage(session, dry_run=dry_run, batch_size=batch_size)
+    return report.as_dict()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--dry-run", action="store_true", help="report only, delete nothing")
+    ap.add_argument("--batch-size", type=int, default=None)
+    args = ap.parse_args()
+    configure_logging()
+    report = asyncio.run(_run(dry_run=args.dry_run, batch_size=args.batch_size))
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -11,6 +11,9 @@ from app.agent.orchestrator import run_once
 from app.core.config import settings
 from app.core.logging import configure_logging
 from app.db.session import SessionLocal
+from app.services.artifact_gc import collect_garbage
+from app.services.delivery_queue import run_dispatch_workers
+from app.services.send_window import window_enabled
 
 
 async def _job() -> None:
@@ -19,11 +22,33 @@ async def _job() -> None:
         logging.getLogger(__name__).info("agent run summary: %s", summary.as_dict())
 
 
+async def _gc_job() -> None:
+    async with SessionLocal() as session:
+        report = await collect_garbage(session)
+        logging.getLogger(__name__).info("artifact gc: %s", report.as_dict())
+
+
+async def _dispatch_job() -> None:
+    # Retries and send-window slots of queued deliveries (inline mode);
+    # DELIVERY_DISPATCH=worker has its own workers.
+    counts = await run_dispatch_workers(workers=1, once=True)
+    if any(counts.values()):
+        logging.getLogger(__name__).info("delivery dispatch: %s", counts)
+
+
 async def main() -> None:
     configure_logging()
     scheduler = AsyncIOScheduler(timezone=ZoneInfo(getattr(settings, "tz", "Europe/Moscow")))
-    # Regular mode: every day at 09:00 in configured timezone
-    scheduler.add_job(_job, "cron", hour=9, minute=0)
+    if window_enabled():
+        # Send windows: plan the day right after midnight; dispatch releases the slots.
+        scheduler.add_job(_job, "cron", hour=0, minute=5)
+    else:
+        # Regular mode: every day at 09:00 in configured timezone
+        scheduler.add_job(_job, "cron", hour=9, minute=0)
+    # Nightly cleanup of orphaned/expired cards and outbox files
+    scheduler.add_job(_gc_job, "cron", hour=3, minute=30)
+    if (settings.delivery_dispatch or "inline").lower() == "inline":
+        scheduler.add_job(_dispatch_job, "interval", minutes=1, max_instances=1)
     scheduler.start()
 
     # Demo-friendly: run once on start (so you don't have to wait for 09:00).
@@ -0,0 +1,155 @@
+"""Throughput benchmark: card rendering with precomputed layers vs the previous renderer.
+
+Run from backend/:
+
+    python -m benchmarks.bench_card_renderer [--cards 200]
+
+Measures cards/sec for drawing alone and for drawing + PNG encoding (in memory, so the
+content-addressed card cache and disk speed don't affect the numbers).
+"""
+
+from __future__ import annotations
+
+import argparse
+import datetime as dt
+import io
+import time
+from collections.abc import Callable
+
+from PIL import Image, ImageChops, ImageDraw, ImageFont
+
+from app.services.card_renderer import draw_card
+
+
+def _legacy_draw_card(
+    *,
+    title: str,
+    recipient_line: str,
+    date: dt.date,
+    brand_line: str = "Сбер",
+) -> Image.Image:
+    """Previous implementation (kept verbatim for comparison)."""
+    w, h = 1200, 630
+
+    # Фон: мягкий градиент в фирменных зелёных тонах
+    img = Image.new("RGB", (w, h), color=(0, 82, 63))
+    top_color = (0, 82, 63)
+    bottom_color = (0, 181, 102)
+    for y in range(h):
+        ratio = y / h
+        r = int(top_color[0] * (1 - ratio) + bottom_color[0] * ratio)
+        g = int(top_color[1] * (1 - ratio) + bottom_color[1] * ratio)
+        b = int(top_color[2] * (1 - ratio) + bottom_color[2] * ratio)
+        ImageDraw.Draw(img).line([(0, y), (w, y)], fill=(r, g, b))
+
+    # Fonts: use default (portable). If custom fonts needed later, bundle them.
+    try:
+        font_title = ImageFont.truetype("arial.ttf", 60)
+        font_body = ImageFont.truetype("arial.ttf", 42)
+        font_small = ImageFont.truetype("arial.ttf", 28)
+    except Exception:
+        font_title = ImageFont.load_default()
+        font_body = ImageFont.load_default()
+        font_small = ImageFont.load_default()
+
+    # Белая полупрозрачная карточка в центре
+    card_margin_x = 80
+    card_margin_y = 80
+    card_radius = 40
+    card_color = (255, 255, 255, 235)
+
+    card = Image.new("RGBA", (w - card_margin_x * 2, h - card_margin_y * 2), (0, 0, 0, 0))
+    card_draw = ImageDraw.Draw(card)
+    card_draw.rounded_rectangle(
+        [(0, 0), (card.size[0], card.size[1])],
+        radius=card_radius,
+        fill=card_color,
+    )
+    img.paste(card, (card_margin_x, card_margin_y), card)
+
+    # Текст внутри карточки
+    text_draw = ImageDraw.Draw(img)
+    margin_inner_x = card_margin_x + 80
+    y = card_margin_y + 70
+
+    # Заголовок (повод)
+    text_draw.text(
+        (margin_inner_x, y),
+        title,
+        fill=(5, 88, 55),
+        font=font_title,
+    )
+    y += 120
+
+    # Кому
+    text_draw.text(
+        (margin_inner_x, y),
+        recipient_line,
+        fill=(20, 20, 20),
+        font=font_body,
+    )
+
+    # Нижняя подпись
+    footer_text = f"{brand_line} • {date.isoformat()}"
+    # Pillow совместимость: используем textbbox вместо textsize
+    bbox = text_draw.textbbox((0, 0), footer_text, font=font_small)
+    footer_w = bbox[2] - bbox[0]
+    footer_x = w - card_margin_x - 80 - footer_w
+    footer_y = h - card_margin_y - 60
+    text_draw.text(
+        (footer_x, footer_y),
+        footer_text,
+        fill=(60, 60, 60),
+        font=font_small,
+    )
+    return img
+
+
+def _inputs(n: int) -> list[dict]:
+    titles = ["С днём рождения!", "С Новым годом!", "С 8 Марта!", "С Днём защитника Отечества!"]
+    return [
+        {
+            "title": titles[i % len(titles)],
+            "recipient_line": f"Клиент Тестовый №{i}",
+            "date": dt.date(2026, 1, 1) + dt.timedelta(days=i),
+        }
+        for i in range(n)
+    ]
+
+
+def _bench(fn: Callable[..., Image.Image], inputs: list[dict], *, encode: bool) -> float:
+    started = time.perf_counter()
+    for kw in inputs:
+        img = fn(**kw)
+        if encode:
+            img.save(io.BytesIO(), format="PNG")
+    return len(inputs) / (time.perf_counter() - started)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--cards", type=int, default=200)
+    args = ap.parse_args()
+    inputs = _inputs(args.cards)
+
+    # Sanity: the gradient is computed differently, so allow rounding noise but nothing more.
+    sample = inputs[0]
+    diff = ImageChops.difference(_legacy_draw_card(**sample), draw_card(**sample))
+    worst = max(hi for _lo, hi in diff.getextrema())
+    if worst > 3:
+        raise SystemExit(f"renderers disagree: max channel difference {worst}")
+
+    draw_card(**sample)  # warm the per-process layer/font cache, as a worker would be
+    print(f"{args.cards} cards, max pixel difference vs legacy: {worst}")
+    for encode in (False, True):
+        label = "draw + PNG" if encode else "draw only "
+        legacy = _bench(_legacy_draw_card, inputs, encode=encode)
+        current = _bench(draw_card, inputs, encode=encode)
+        print(
+            f"{label}  legacy: {legacy:8.1f} cards/sec   current: {current:8.1f} cards/sec"
+            f"  ({current / legacy:.1f}x)"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""Throughput benchmark: parse_llm_json vs the previous multi-pass implementation.
+
+Run from backend/:
+
+    python -m benchmarks.bench_llm_parser [--rounds 2000]
+
+The corpus (benchmarks/corpus/llm_outputs.json) contains real-shaped provider outputs:
+compact/pretty JSON, markdown fences, GigaChat "almost JSON" with raw newlines, prose around
+the object, a refusal and a truncated answer. It also times the worst case of the brace
+scan: many deeply nested candidates that never close (each must be skipped as a whole).
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import re
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from app.agent.llm_provider import LLMProviderError, _validate_and_return, parse_llm_json
+
+CORPUS_PATH = Path(__file__).resolve().parent / "corpus" / "llm_outputs.json"
+
+
+def _legacy_parse_llm_json(content: str):
+    """Previous implementation (kept verbatim for comparison)."""
+    content_original = content
+    content = content.strip()
+
+    def _repair_unescaped_newlines_in_json_strings(s: str) -> str:
+        out: list[str] = []
+        in_str = False
+        esc = False
+        for ch in s:
+            if in_str:
+                if esc:
+                    out.append(ch)
+                    esc = False
+                    continue
+                if ch == "\\":
+                    out.append(ch)
+                    esc = True
+                    continue
+                if ch == '"':
+                    out.append(ch)
+                    in_str = False
+                    continue
+                if ch == "\n":
+                    out.append("\\n")
+                    continue
+                if ch == "\r":
+                    out.append("\\r")
+                    continue
+                out.append(ch)
+                continue
+            if ch == '"':
+                out.append(ch)
+                in_str = True
+            else:
+                out.append(ch)
+        return "".join(out)
+
+    def _try_parse(candidate: str) -> dict | None:
+        try:
+            obj = json.loads(candidate)
+            if isinstance(obj, dict) and {"tone", "subject", "body"} <= set(obj.keys()):
+                return obj
+        except json.JSONDecodeError:
+            pass
+        try:
+            repaired = _repair_unescaped_newlines_in_json_strings(candidate)
+            obj = json.loads(repaired)
+            if isinstance(obj, dict) and {"tone", "subject", "body"} <= set(obj.keys()):
+                return obj
+        except json.JSONDecodeError:
+            return None
+        return None
+
+    json_match = re.search(r"```(?:json)?\s*\n?(.*?)```", content, re.DOTALL | re.IGNORECASE)
+    if json_match:
+        content = json_match.group(1).strip()
+
+    obj = _try_parse(content)
+    if obj is not None:
+        return _validate_and_return(obj)
+
+    if not content.startswith("{"):
+        start_idx = content.find("{")
+        if start_idx >= 0:
+            brace_count = 0
+            end_idx = start_idx
+            for i in range(start_idx, len(content)):
+                if content[i] == "{":
+                    brace_count += 1
+                elif content[i] == "}":
+                    brace_count -= 1
+                    if brace_count == 0:
+                        end_idx = i + 1
+                        break
+            if end_idx > start_idx:
+                content = content[start_idx:end_idx]
+                obj = _try_parse(content)
+                if obj is not None:
+                    return _validate_and_return(obj)
+
+    json_match = re.search(r"\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}", content, re.DOTALL)
+    if json_match:
+        obj = _try_parse(json_match.group(0))
+        if obj is not None:
+            return _validate_and_return(obj)
+
+    preview = content_original[:500] if len(content_original) > 500 else content_original
+    raise LLMProviderError(f"LLM did not return valid JSON: {preview!r}")
+
+
+def _outcome(fn: Callable, content: str):
+    try:
+        return fn(content)
+    except LLMProviderError:
+        return None
+
+
+def _bench(fn: Callable, corpus: list[str], rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for content in corpus:
+            _outcome(fn, content)
+    elapsed = time.perf_counter() - started
+    return rounds * len(corpus) / elapsed
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rounds", type=int, default=2000)
+    args = ap.parse_args()
+
+    items = json.loads(CORPUS_PATH.read_text(encoding="utf-8"))
+    corpus = [it["content"] for it in items]
+
+    # Sanity: the new parser must accept everything the old one accepted, with the same result.
+    for it in items:
+        old = _outcome(_legacy_parse_llm_json, it["content"])
+        new = _outcome(parse_llm_json, it["content"])
+        if old is not None and old != new:
+            raise SystemExit(f"result mismatch on corpus item {it['name']!r}: {old} != {new}")
+
+    legacy = _bench(_legacy_parse_llm_json, corpus, args.rounds)
+    current = _bench(parse_llm_json, corpus, args.rounds)
+    print(f"corpus: {len(corpus)} outputs x {args.rounds} rounds")
+    print(f"legacy  parse_llm_json: {legacy:12,.0f} outputs/sec")
+    print(f"current parse_llm_json: {current:12,.0f} outputs/sec  ({current / legacy:.1f}x)")
+
+    # Worst case for the scan: 40 unclosed candidates nested 500 deep (20,000 braces).
+    hostile = ('{"a":' * 500 + "0 ") * 40
+    started = time.perf_counter()
+    assert _outcome(parse_llm_json, hostile) is None
+    print(f"brace-heavy input ({len(hostile):,} chars): {time.perf_counter() - started:.4f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,9 +2,10 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import select
+from sqlalchemy import event, select
 
 from app.agent.orchestrator import run_once
+from app.core.config import settings
 from app.db.models import Client, Delivery, Greeting
 
 
@@ -32,3 +33,31 @@ async def test_agent_generates_and_sends_for_birthday(db_session):
     deliveries = (await db_session.execute(select(Delivery))).scalars().all()
     assert len(greetings) >= 1
     assert len(deliveries) >= 1
+
+
+async def test_agent_run_loads_clients_in_one_query(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "send_mode", "noop", raising=False)
+    today = dt.date.today()
+    for i in range(4):
+        db_session.add(
+            Client(
+                first_name=f"Клиент{i}",
+                last_name="Тестов",
+                segment="standard",
+                email=f"c{i}@corp.test",
+                birth_date=dt.date(1990, today.month, today.day),
+            )
+        )
+    await db_session.commit()
+
+    statements: list[str] = []
+    engine = db_session.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        summary = await run_once(db_session, today=today, lookahead_days=1)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert summary.generated_greetings == 4
+    # No per-event client lookup: the run prefetches them (clients.id IN (...)).
+    assert not [s for s in statements if "WHERE clients.id = ?" in s]
@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+import time
+
+from sqlalchemy import event
+
+from app.db.models import Delivery, Event, Greeting
+from app.services.artifact_gc import collect_garbage
+
+DAY = 86400
+
+
+def _file(path, *, age_days: float, size: int = 100):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+    t = time.time() - age_days * DAY
+    os.utime(path, (t, t))
+    return path
+
+
+async def test_gc_deletes_orphans_and_expired_files_only(db_session, tmp_path):
+    data = tmp_path / "data"
+    ev = Event(event_type="birthday", event_date=dt.date(2026, 1, 1), title="ДР")
+    db_session.add(ev)
+    await db_session.flush()
+    g = Greeting(event_id=ev.id, subject="s", body="b", image_path="cards/card_live.png")
+    db_session.add(g)
+    await db_session.flush()
+    db_session.add(
+        Delivery(
+            greeting_id=g.id,
+            channel="file",
+            recipient="r",
+            status="sent",
+            provider_message="written:delivery_live.txt",
+            idempotency_key="k1",
+        )
+    )
+    await db_session.commit()
+
+    keep = [
+        _file(data / "cards" / "card_live.png", age_days=10),
+        _file(data / "cards" / "variants" / "card_live.web.q82.webp", age_days=10),
+        _file(data / "cards" / "card_young_orphan.png", age_days=0.1),
+        _file(data / "cards" / "gigachat_0123456789ab_f1.jpg", age_days=10),  # library
+        _file(data / "outbox" / "delivery_live.txt", age_days=10),
+        _file(data / "smoke" / "card_recent.jpg", age_days=1),
+    ]
+    gone = [
+        _file(data / "cards" / "card_orphan.png", age_days=2, size=1000),
+        _file(data / "cards" / "variants" / "card_orphan.web.q82.webp", age_days=2, size=10),
+        _file(data / "cards" / ".card_x.png.abc.tmp", age_days=2),
+        _file(data / "cards" / "gigachat_0123456789ab_old.jpg", age_days=365),
+        _file(data / "outbox" / "delivery_orphan.txt", age_days=2),
+        _file(data / "outbox" / "delivery_old.txt", age_days=60),
+        _file(data / "smoke" / "card_old.jpg", age_days=30),
+    ]
+
+    dry = await collect_garbage(db_session, data_dir=data, batch_size=2, dry_run=True)
+    assert dry.deleted == len(gone)
+    assert all(p.exists() for p in gone)
+
+    report = await collect_garbage(db_session, data_dir=data, batch_size=2)
+    assert report.scanned == len(keep) + len(gone)
+    assert report.deleted == len(gone)
+    assert report.reclaimed_bytes == 1000 + 10 + 5 * 100
+    assert report.deleted_by_reason["card-orphan"] == 1
+    assert report.deleted_by_reason["outbox-expired"] == 1
+    assert all(p.exists() for p in keep)
+    assert not any(p.exists() for p in gone)
+
+
+async def test_gc_checks_variant_sources_with_one_query_per_batch(db_session, tmp_path):
+    data = tmp_path / "data"
+    ev = Event(event_type="birthday", event_date=dt.date(2026, 1, 1), title="ДР")
+    db_session.add(ev)
+    await db_session.flush()
+    for i in range(4):
+        db_session.add(
+            Greeting(event_id=ev.id, subject="s", body="b", image_path=f"cards/c{i}.png")
+        )
+        _file(data / "cards" / f"c{i}.png", age_days=10)
+        _file(data / "cards" / "variants" / f"c{i}.web.q82.webp", age_days=10)
+    await db_session.commit()
+    orphan = _file(data / "cards" / "variants" / "gone.web.q82.webp", age_days=10)
+
+    statements: list[str] = []
+    engine = db_session.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        report = await collect_garbage(db_session, data_dir=data, batch_size=100)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+    assert report.deleted_by_reason == {"variant-orphan": 1} and not orphan.exists()
+    # One reference query for the cards batch and one for the variants batch.
+    assert len([s for s in statements if "FROM greetings" in s]) == 2
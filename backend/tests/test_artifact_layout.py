@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import Client, Event, Greeting
+from app.services.artifact_gc import collect_garbage
+from app.services.artifact_layout import iter_files, shard_of
+from app.services.card_renderer import render_card
+from app.services.card_variants import ensure_variant
+from app.services.layout_migration import migrate_layout
+from app.services.lazy_cards import card_spec, materialize_card
+from app.services.sender import send_greeting_file
+from app.worker.outbox_show import show
+
+CARD = {"title": "С Новым годом!", "recipient_line": "Иван Петров", "date": dt.date(2025, 12, 31)}
+
+
+async def _greeting(session, *, image_path: str | None = None) -> Greeting:
+    c = Client(first_name="Иван", last_name="Петров", email="ivan@example.com")
+    session.add(c)
+    await session.commit()
+    ev = Event(client_id=c.id, event_type="manual", event_date=dt.date.today(), title="Тест")
+    session.add(ev)
+    await session.commit()
+    g = Greeting(
+        event_id=ev.id, client_id=c.id, subject="Тема", body="Текст", image_path=image_path
+    )
+    session.add(g)
+    await session.commit()
+    return g
+
+
+def test_hash2_shards_cards_variants_and_lazy_renders(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "artifact_layout", "hash2", raising=False)
+    data = tmp_path / "data"
+    card = render_card(out_dir=data / "cards", **CARD)
+    rel = card.relative_to(data).as_posix()
+    assert rel == f"cards/{shard_of(card.name)}/{card.name}"
+
+    variant = ensure_variant(rel, "web", data_dir=data)
+    assert variant is not None
+    assert variant.parent == data / "cards" / "variants" / shard_of(card.name)
+
+    # A lazy card is rendered exactly at its stored (sharded) path.
+    card.unlink()
+    spec = card_spec(brand_line="Сбер", **CARD)
+    assert materialize_card(rel, spec, data_dir=data) == card
+    assert card.is_file()
+
+
+async def test_migration_moves_files_and_db_paths_both_ways(db_session, tmp_path, monkeypatch):
+    data = tmp_path / "data"
+    card = render_card(out_dir=data / "cards", **CARD)  # flat (default layout)
+    g = await _greeting(db_session, image_path=f"cards/{card.name}")
+    assert ensure_variant(g.image_path, "web", data_dir=data) is not None
+    (data / "outbox").mkdir()
+    (data / "outbox" / "delivery_1_abc.txt").write_text("TO: x", encoding="utf-8")
+
+    report = await migrate_layout(db_session, data_dir=data, layout="hash2", dry_run=True)
+    assert (report["cards"], report["variants"], report["outbox"]) == (1, 1, 1)
+    assert card.is_file()
+
+    report = await migrate_layout(db_session, data_dir=data, layout="hash2")
+    assert report["greetings_updated"] == 1
+    await db_session.refresh(g)
+    assert g.image_path == f"cards/{shard_of(card.name, 'hash2')}/{card.name}"
+    assert (data / g.image_path).is_file() and not card.exists()
+    assert (data / "outbox" / shard_of("delivery_1_abc.txt", "hash2")).is_dir()
+
+    # Re-running is a no-op; going back to flat restores the original paths.
+    assert (await migrate_layout(db_session, data_dir=data, layout="hash2"))["cards"] == 0
+    await migrate_layout(db_session, data_dir=data, layout="flat")
+    await db_session.refresh(g)
+    assert g.image_path == f"cards/{card.name}" and card.is_file()
+    assert sorted(p.name for p in (data / "outbox").iterdir()) == ["delivery_1_abc.txt"]
+    assert [p.name for p in (data / "cards").iterdir() if p.is_dir()] == ["variants"]
+
+
+async def test_migration_works_in_batches(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "artifact_migrate_batch_size", 2, raising=False)
+    data = tmp_path / "data"
+    greetings = []
+    for i in range(5):
+        card = data / "cards" / f"card_{i}.png"
+        card.parent.mkdir(parents=True, exist_ok=True)
+        card.write_bytes(b"png")
+        greetings.append(await _greeting(db_session, image_path=f"cards/{card.name}"))
+
+    report = await migrate_layout(db_session, data_dir=data, layout="hash2")
+    assert (report["cards"], report["greetings_updated"]) == (5, 5)
+    for g in greetings:
+        await db_session.refresh(g)
+        assert (data / g.image_path).is_file() and g.image_path.count("/") == 3
+    assert [p for p in (data / "cards").iterdir() if p.is_file()] == []
+
+
+async def test_gc_and_outbox_lookups_work_per_shard(db_session, tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "artifact_layout", "hash2", raising=False)
+    data = tmp_path / "data"
+    live = render_card(out_dir=data / "cards", **CARD)
+    orphan = render_card(out_dir=data / "cards", **{**CARD, "recipient_line": "Кто-то"})
+    g = await _greeting(db_session, image_path=live.relative_to(data).as_posix())
+
+    d = await send_greeting_file(
+        db_session, greeting=g, recipient="ivan@example.com", outbox_dir=data / "outbox"
+    )
+    name = d.provider_message.removeprefix("written:")
+    assert "/" not in name  # provenance is still the bare file name
+    assert "TO: ivan@example.com" in show(data / "outbox", d.provider_message)
+
+    later = dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=2)
+    report = await collect_garbage(db_session, data_dir=data, now=later)
+    assert report.deleted_by_reason == {"card-orphan": 1}
+    assert live.is_file() and not orphan.exists()
+    assert {p.name for p in iter_files(data / "outbox")} == {name}
+    assert (await db_session.execute(select(Greeting))).scalars().all() == [g]
+    assert os.path.isdir(data / "cards" / shard_of(live.name))
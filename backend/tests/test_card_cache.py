@@ -0,0 +1,64 @@
+from __future__ import annotations
+
+import datetime as dt
+import subprocess
+import sys
+
+from app.services import card_renderer
+from app.services.card_renderer import card_key, render_card
+
+INPUTS = {
+    "title": "С днём рождения!",
+    "recipient_line": "Анна Петрова",
+    "date": dt.date(2026, 3, 8),
+}
+
+
+def test_same_inputs_reuse_one_file_without_rendering(tmp_path, monkeypatch):
+    cards = tmp_path / "cards"
+    first = render_card(out_dir=cards, **INPUTS)
+
+    def boom(**_kw):
+        raise AssertionError("cache hit must not render")
+
+    monkeypatch.setattr(card_renderer, "draw_card", boom)
+    second = render_card(out_dir=cards, **INPUTS)
+
+    assert first == second
+    assert [p.name for p in cards.iterdir()] == [first.name]
+
+
+def test_key_covers_every_input_and_template_version(monkeypatch):
+    base = card_key(**INPUTS)
+    assert card_key(**{**INPUTS, "title": "8 Марта"}) != base
+    assert card_key(**{**INPUTS, "recipient_line": "Иван"}) != base
+    assert card_key(**{**INPUTS, "date": dt.date(2026, 3, 9)}) != base
+    assert card_key(**INPUTS, brand_line="Другой бренд") != base
+    monkeypatch.setattr(card_renderer, "CARD_TEMPLATE_VERSION", 999)
+    assert card_key(**INPUTS) != base
+
+
+def test_key_is_stable_across_processes():
+    code = (
+        "import datetime as dt;"
+        "from app.services.card_renderer import card_key;"
+        "print(card_key(title='T', recipient_line='R', date=dt.date(2026, 1, 1)))"
+    )
+    keys = {
+        subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True
+        ).stdout.strip()
+        for _ in range(2)
+    }
+    assert keys == {card_key(title="T", recipient_line="R", date=dt.date(2026, 1, 1))}
+
+
+def test_draw_card_reuses_layers_without_mutating_them():
+    base = card_renderer._base_layer()
+    before = base.tobytes()
+    a = card_renderer.draw_card(**INPUTS)
+    b = card_renderer.draw_card(**{**INPUTS, "title": "Другой повод"})
+    assert card_renderer._base_layer() is base
+    assert base.tobytes() == before
+    assert a.size == b.size == card_renderer.CARD_SIZE
+    assert a.tobytes() != b.tobytes()
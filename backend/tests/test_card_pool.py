@@ -0,0 +1,70 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app.services.card_pool import CardPool
+from app.services.card_renderer import render_card
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self, *a, **kw):
+        super().__init__(*a, **kw)
+        self.submitted = 0
+
+    def submit(self, *a, **kw):
+        self.submitted += 1
+        return super().submit(*a, **kw)
+
+
+async def test_pool_bounds_jobs_in_flight():
+    pool = CardPool(kind="thread", workers=1, queue_size=1)
+    executor = CountingExecutor(max_workers=1)
+    pool._executor = executor
+    release = threading.Event()
+
+    tasks = [asyncio.create_task(pool.run(release.wait, 5)) for _ in range(5)]
+    await asyncio.sleep(0.05)
+    assert executor.submitted == 2  # 1 running + 1 queued; the rest await a slot
+
+    release.set()
+    assert await asyncio.gather(*tasks) == [True] * 5
+    assert executor.submitted == 5
+    pool.shutdown()
+
+
+async def test_process_pool_renders_without_blocking_loop(tmp_path):
+    pool = CardPool(kind="process", workers=1, queue_size=0)
+    ticks = 0
+    done = False
+
+    async def ticker():
+        nonlocal ticks
+        while not done:
+            ticks += 1
+            await asyncio.sleep(0.001)
+
+    t = asyncio.create_task(ticker())
+    try:
+        path = await pool.run(
+            render_card,
+            out_dir=tmp_path / "cards",
+            title="С днём рождения!",
+            recipient_line="Анна",
+            date=dt.date(2026, 1, 1),
+        )
+    finally:
+        done = True
+        await t
+        pool.shutdown()
+    assert path.is_file()
+    assert ticks > 1
+
+
+def test_unknown_pool_kind_is_rejected():
+    with pytest.raises(ValueError):
+        CardPool(kind="fibers")
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from PIL import Image
+
+from app.services.card_renderer import render_card
+from app.services.card_variants import (
+    VARIANT_WIDTHS,
+    ensure_variant,
+    variant_rel_path,
+)
+
+
+def test_variants_are_smaller_and_channel_sized(tmp_path):
+    card = render_card(
+        out_dir=tmp_path / "cards",
+        title="С днём рождения!",
+        recipient_line="Анна Петрова",
+        date=dt.date(2026, 3, 8),
+    )
+    image_path = f"cards/{card.name}"
+
+    paths = {name: ensure_variant(image_path, name, data_dir=tmp_path) for name in VARIANT_WIDTHS}
+    for name in ("web", "messenger"):
+        with Image.open(paths[name]) as img:
+            assert img.width == VARIANT_WIDTHS[name]
+            assert img.format == "WEBP"
+        assert paths[name].stat().st_size < card.stat().st_size
+    # Email keeps full width; the flat Pillow PNG is already smaller than a same-size JPEG.
+    assert paths["email"].stat().st_size <= card.stat().st_size
+
+
+def test_email_variant_is_jpeg_when_it_saves_bytes(tmp_path):
+    noisy = Image.effect_noise((1600, 840), 64).convert("RGB")
+    (tmp_path / "cards").mkdir()
+    noisy.save(tmp_path / "cards" / "gigachat_x.png")
+    email = ensure_variant("cards/gigachat_x.png", "email", data_dir=tmp_path)
+    with Image.open(email) as img:
+        assert (img.format, img.width) == ("JPEG", 1200)
+    assert email == tmp_path / variant_rel_path("cards/gigachat_x.png", "email")
@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+
+from PIL import Image
+from sqlalchemy import event, select
+
+from app.core.config import settings
+from app.db.models import Client, Delivery, DeliveryJob, Event, Greeting
+from app.services import channels, delivery_queue, sender
+from app.services.card_variants import variant_rel_path
+from app.services.channels import (
+    ChannelAdapter,
+    ChannelLimiter,
+    SendOutcome,
+    get_limiter,
+    resolve_channel,
+)
+from app.services.due_sender import send_due_greetings
+
+
+async def _due(session, *, today: dt.date, channel: str, email=None, phone=None) -> Greeting:
+    c = Client(
+        first_name="Иван",
+        last_name="Петров",
+        email=email,
+        phone=phone,
+        preferred_channel=channel,
+    )
+    session.add(c)
+    await session.commit()
+    ev = Event(client_id=c.id, event_type="manual", event_date=today, title="Событие")
+    session.add(ev)
+    await session.commit()
+    g = Greeting(
+        event_id=ev.id,
+        client_id=c.id,
+        subject="Поздравление",
+        body="Текст",
+        image_path="cards/card.png",
+        status="generated",
+    )
+    session.add(g)
+    await session.commit()
+    return g
+
+
+def test_resolve_channel_prefers_the_clients_channel_with_fallback():
+    c = Client(
+        first_name="A", last_name="B", email="a@corp.test", phone="+7900", preferred_channel="sms"
+    )
+    assert resolve_channel(c) == ("sms", "+7900")
+    c.phone = None
+    assert resolve_channel(c) == ("email", "a@corp.test")
+    c.preferred_channel, c.email, c.phone = "email", None, "+7901"
+    assert resolve_channel(c) == ("sms", "+7901")
+    c.phone = None
+    assert resolve_channel(c) == ("email", "")
+
+
+async def test_limiter_bounds_concurrency_and_paces_rate():
+    limiter = ChannelLimiter(concurrency=2, rate_per_sec=50)
+    in_flight, peak = 0, 0
+
+    async def one():
+        nonlocal in_flight, peak
+        async with limiter.slot():
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.05)
+            in_flight -= 1
+
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    await asyncio.gather(*(one() for _ in range(6)))
+    assert peak == 2
+    assert loop.time() - started >= 5 / 50 - 0.01  # 6 sends paced 20 ms apart
+
+
+async def test_due_greetings_go_out_over_each_clients_channel(
+    db_session, hermetic_settings, monkeypatch
+):
+    today = dt.date(2025, 12, 20)
+    await _due(db_session, today=today, channel="email", email="a@corp.test")
+    await _due(db_session, today=today, channel="sms", email="b@corp.test", phone="+79001112233")
+    await _due(db_session, today=today, channel="messenger", phone="+79004445566")
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["sent"], res["errors"], res["queued"]) == (3, 0, 0)
+
+    deliveries = (await db_session.execute(select(Delivery))).scalars().all()
+    assert sorted((d.channel, d.recipient) for d in deliveries) == [
+        ("file", "a@corp.test"),
+        ("messenger", "+79004445566"),
+        ("sms", "+79001112233"),
+    ]
+    jobs = (await db_session.execute(select(DeliveryJob))).scalars().all()
+    assert sorted(j.channel for j in jobs) == ["email", "messenger", "sms"]
+
+    files = {p.name.split("_", 1)[0]: p for p in hermetic_settings.iterdir()}
+    assert set(files) == {"delivery", "sms", "messenger"}
+    sms = files["sms"].read_text(encoding="utf-8")
+    assert "CHANNEL: sms" in sms and sms.endswith("IMAGE: ")  # text only
+    assert files["messenger"].read_text(encoding="utf-8").endswith("IMAGE: cards/card.png")
+
+
+async def test_batch_sends_run_in_parallel_within_channel_limits(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "channel_email_concurrency", 2, raising=False)
+    monkeypatch.setattr(settings, "channel_sms_concurrency", 3, raising=False)
+    in_flight: dict[str, int] = {"email": 0, "sms": 0}
+    peak: dict[str, int] = {"email": 0, "sms": 0}
+
+    class SlowAdapter(ChannelAdapter):
+        def __init__(self, channel: str) -> None:
+            self.channel = self.limits = channel
+
+        async def send(self, *, message, recipient, key) -> SendOutcome:
+            async with get_limiter(self.limits).slot():
+                in_flight[self.channel] += 1
+                peak[self.channel] = max(peak[self.channel], in_flight[self.channel])
+                await asyncio.sleep(0.02)
+                in_flight[self.channel] -= 1
+            return SendOutcome("sent", "slow:sent")
+
+    monkeypatch.setattr(sender, "get_adapter", lambda channel, client: SlowAdapter(channel))
+    today = dt.date(2025, 12, 20)
+    requests = []
+    for i in range(6):
+        g = await _due(db_session, today=today, channel="email", email=f"u{i}@corp.test")
+        requests.append(sender.SendRequest(g, f"u{i}@corp.test", None, "email"))
+        g = await _due(db_session, today=today, channel="sms", phone=f"+7900{i}")
+        requests.append(sender.SendRequest(g, f"+7900{i}", None, "sms"))
+
+    results = await sender.send_greetings(db_session, requests)
+    assert [r.status for r in results] == ["sent"] * 12
+    assert peak == {"email": 2, "sms": 3}
+
+
+async def test_concurrent_due_sending_overlaps_batches_and_commits_per_batch(
+    db_session, monkeypatch
+):
+    monkeypatch.setattr(settings, "due_send_mode", "concurrent", raising=False)
+    monkeypatch.setattr(settings, "due_send_workers", 4, raising=False)
+    monkeypatch.setattr(settings, "delivery_batch_size", 2, raising=False)
+    monkeypatch.setattr(settings, "channel_email_concurrency", 3, raising=False)
+    in_flight, peak = 0, 0
+
+    class SlowAdapter(ChannelAdapter):
+        channel = limits = "email"
+
+        async def send(self, *, message, recipient, key) -> SendOutcome:
+            nonlocal in_flight, peak
+            async with get_limiter(self.limits).slot():
+                in_flight += 1
+                peak = max(peak, in_flight)
+                await asyncio.sleep(0.02)
+                in_flight -= 1
+            if recipient.startswith("bad"):
+                raise RuntimeError("relay hiccup")
+            return SendOutcome("sent", "slow:sent")
+
+    monkeypatch.setattr(sender, "get_adapter", lambda channel, client: SlowAdapter())
+    today = dt.date(2025, 12, 20)
+    for i in range(8):
+        await _due(db_session, today=today, channel="email", email=f"u{i}@corp.test")
+    await _due(db_session, today=today, channel="email", email="bad@corp.test")
+
+    commits: list[int] = []
+    engine = db_session.bind.sync_engine
+    listener = lambda conn: commits.append(1)  # noqa: E731
+    event.listen(engine, "commit", listener)
+    try:
+        res = await send_due_greetings(db_session, today=today)
+    finally:
+        event.remove(engine, "commit", listener)
+
+    # The failed send is isolated: it waits for its retry, the counters stay exact.
+    assert (res["sent"], res["errors"], res["queued"]) == (8, 0, 1)
+    # Batches of 2 overlap, so the channel limit (3), not the batch size, bounds the sends.
+    assert peak == 3
+    # Suppression + enqueue, then per batch (5 batches) one commit each for the claim, the
+    # deliveries and the job states.
+    assert len(commits) == 2 + 3 * 5
+    statuses = (await db_session.execute(select(Greeting.status))).scalars().all()
+    assert sorted(statuses) == ["queued"] + ["sent"] * 8
+
+
+async def _jobs(session) -> list[DeliveryJob]:
+    rows = await session.execute(
+        select(DeliveryJob).order_by(DeliveryJob.id).execution_options(populate_existing=True)
+    )
+    return list(rows.scalars())
+
+
+async def test_concurrent_batch_failure_releases_leases_with_backoff(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "due_send_mode", "concurrent", raising=False)
+    monkeypatch.setattr(settings, "due_send_workers", 2, raising=False)
+    monkeypatch.setattr(settings, "delivery_batch_size", 2, raising=False)
+    monkeypatch.setattr(settings, "delivery_retry_base_sec", 60.0, raising=False)
+    monkeypatch.setattr(settings, "delivery_retry_jitter", 0.0, raising=False)
+    real = delivery_queue.dispatch_jobs
+    failing: set[int] = set()
+
+    async def dispatch_jobs(session, job_ids, **kwargs):
+        if failing & set(job_ids):
+            raise RuntimeError("database hiccup")
+        return await real(session, job_ids, **kwargs)
+
+    monkeypatch.setattr(delivery_queue, "dispatch_jobs", dispatch_jobs)
+    today = dt.date(2025, 12, 20)
+    for i in range(4):
+        await _due(db_session, today=today, channel="email", email=f"u{i}@corp.test")
+    failing.add(1)  # the first job: its whole batch (jobs 1 and 2) fails
+
+    before = dt.datetime.now(dt.timezone.utc)
+    res = await send_due_greetings(db_session, today=today)
+    # The failed batch is still queued (for its retry), not an error.
+    assert (res["sent"], res["errors"], res["queued"]) == (2, 0, 2)
+    released = [j for j in await _jobs(db_session) if j.status == "queued"]
+    assert [(j.id, j.lease_owner, j.last_error) for j in released] == [
+        (1, None, "dispatch:RuntimeError"),
+        (2, None, "dispatch:RuntimeError"),
+    ]
+    backoff = before + dt.timedelta(seconds=60)
+    assert all(j.next_attempt_at.replace(tzinfo=dt.timezone.utc) >= backoff for j in released)
+
+
+async def test_bookkeeping_failure_after_the_sends_does_not_resend(
+    db_session, monkeypatch, hermetic_settings
+):
+    monkeypatch.setattr(settings, "delivery_retry_base_sec", 60.0, raising=False)
+    real = delivery_queue._finish
+    calls = 0
+
+    async def _finish(*args, **kwargs):
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            raise RuntimeError("commit lost")
+        return await real(*args, **kwargs)
+
+    monkeypatch.setattr(delivery_queue, "_finish", _finish)
+    today = dt.date(2025, 12, 20)
+    for i in range(2):
+        await _due(db_session, today=today, channel="email", email=f"u{i}@corp.test")
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["sent"], res["errors"], res["queued"]) == (0, 0, 2)
+    written = sorted(p for p in hermetic_settings.rglob("*") if p.is_file())
+    assert len(written) == 2
+    deliveries = (await db_session.execute(select(Delivery))).scalars().all()
+    assert [d.status for d in deliveries] == ["sent", "sent"]
+
+    # The retry finds the recorded deliveries and finishes the jobs without sending again.
+    later = dt.datetime.now(dt.timezone.utc) + dt.timedelta(minutes=2)
+    ids = await delivery_queue.claim_jobs(db_session, owner="w1", limit=10, now=later)
+    results = await delivery_queue.dispatch_jobs(db_session, ids, owner="w1", now=later)
+    assert [r.outcome for r in results] == ["sent", "sent"]
+    assert sorted(p for p in hermetic_settings.rglob("*") if p.is_file()) == written
+    assert [j.status for j in await _jobs(db_session)] == ["done", "done"]
+
+
+async def test_messenger_outbox_references_the_messenger_variant(tmp_path, monkeypatch):
+    monkeypatch.setattr(channels, "DATA_DIR", tmp_path)
+    noisy = Image.effect_noise((1600, 840), 64).convert("RGB")
+    (tmp_path / "cards").mkdir()
+    noisy.save(tmp_path / "cards" / "gigachat_x.png")
+    message = channels.Message(1, "Тема", "Текст", image_path="cards/gigachat_x.png")
+
+    outbox = tmp_path / "outbox"
+    adapter = channels.OutboxAdapter("messenger", outbox_dir=outbox)
+    await adapter.send(message=message, recipient="+79001112233", key="k")
+    variant = variant_rel_path("cards/gigachat_x.png", "messenger")
+    assert (outbox / "messenger_1_k.txt").read_text(encoding="utf-8").endswith(f"IMAGE: {variant}")
+    # Only the variant that was actually used exists.
+    assert [p.name for p in (tmp_path / "cards" / "variants").rglob("*.*")] == [
+        variant.rsplit("/", 1)[-1]
+    ]
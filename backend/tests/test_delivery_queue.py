@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.db.models import Client, Delivery, DeliveryJob, Event, Greeting
+from app.services import channels, delivery_queue
+from app.services.delivery_queue import (
+    _claimable,
+    claim_jobs,
+    dispatch_job,
+    enqueue_delivery,
+    retry_delay,
+    run_dispatch_worker,
+    run_dispatch_workers,
+)
+from app.services.due_sender import send_due_greetings
+
+
+async def _due_greeting(session, *, today: dt.date, email: str) -> Greeting:
+    c = Client(
+        first_name="Иван",
+        middle_name="Иванович",
+        last_name="Петров",
+        segment="standard",
+        email=email,
+        preferred_channel="email",
+    )
+    session.add(c)
+    await session.commit()
+    ev = Event(client_id=c.id, event_type="manual", event_date=today, title="Событие")
+    session.add(ev)
+    await session.commit()
+    g = Greeting(
+        event_id=ev.id, client_id=c.id, subject="Поздравление", body="Текст", status="generated"
+    )
+    session.add(g)
+    await session.commit()
+    return g
+
+
+async def test_worker_mode_queues_in_decision_commit_and_workers_send(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_dispatch", "worker", raising=False)
+    today = dt.date(2025, 12, 20)
+    g = await _due_greeting(db_session, today=today, email="user@example.com")
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["queued"], res["sent"]) == (1, 0)
+    assert g.status == "queued"
+    assert (await db_session.execute(select(Delivery))).scalars().all() == []
+
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False, class_=AsyncSession)
+    counts = await run_dispatch_workers(factory, workers=3, once=True)
+    assert counts == {"sent": 1, "skipped": 0, "retry": 0, "dead": 0}
+
+    await db_session.refresh(g)
+    assert g.status == "sent"
+    job = (await db_session.execute(select(DeliveryJob))).scalar_one()
+    assert (job.status, job.attempts, job.lease_owner) == ("done", 1, None)
+    assert job.delivery_id is not None
+
+
+class _DownRelay:
+    async def send(self, msg) -> None:
+        raise ConnectionRefusedError("relay down")
+
+
+def _smtp_down(monkeypatch) -> None:
+    monkeypatch.setattr(settings, "send_mode", "smtp", raising=False)
+    monkeypatch.setattr(settings, "smtp_host", "smtp.corp.test", raising=False)
+    monkeypatch.setattr(settings, "smtp_allow_all_recipients", True, raising=False)
+    monkeypatch.setattr(channels, "get_smtp_pool", lambda: _DownRelay())
+
+
+async def test_failed_send_backs_off_then_dead_letters(db_session, monkeypatch):
+    # The relay is down: every attempt ends with an error Delivery, retried with backoff.
+    _smtp_down(monkeypatch)
+    monkeypatch.setattr(settings, "delivery_max_attempts", 2, raising=False)
+    monkeypatch.setattr(settings, "delivery_retry_base_sec", 60.0, raising=False)
+    today = dt.date(2025, 12, 20)
+    g = await _due_greeting(db_session, today=today, email="user@corp.test")
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["sent"], res["errors"], res["queued"]) == (0, 0, 1)
+    job = (await db_session.execute(select(DeliveryJob))).scalar_one()
+    await db_session.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == (
+        "queued",
+        1,
+        "smtp:error:ConnectionRefusedError",
+    )
+    assert g.status == "queued"
+    # The failed attempt is tracked on its Delivery, which the retry resends through.
+    delivery = (await db_session.execute(select(Delivery))).scalar_one()
+    assert (delivery.status, delivery.attempts, delivery.last_error) == (
+        "retrying",
+        1,
+        "smtp:error:ConnectionRefusedError",
+    )
+    assert delivery.next_attempt_at == job.next_attempt_at
+
+    # Not due before the backoff has passed.
+    now = dt.datetime.now(dt.timezone.utc)
+    assert await claim_jobs(db_session, owner="w1", limit=10, now=now) == []
+
+    later = now + dt.timedelta(seconds=61)
+    (job_id,) = await claim_jobs(db_session, owner="w1", limit=10, now=later)
+    result = await dispatch_job(db_session, job_id, owner="w1", now=later)
+    assert result is not None and result.outcome == "dead"
+    await db_session.refresh(g)
+    assert g.status == "error"
+    await db_session.refresh(delivery)
+    assert (delivery.status, delivery.attempts, delivery.next_attempt_at) == ("failed", 2, None)
+    assert delivery.provider_message == "smtp:error:ConnectionRefusedError"
+
+    # Re-queueing a dead job revives it with a fresh attempt budget.
+    monkeypatch.setattr(settings, "send_mode", "file", raising=False)
+    job = await enqueue_delivery(db_session, greeting=g, recipient="user@corp.test")
+    await db_session.commit()
+    assert (job.status, job.attempts, g.status) == ("queued", 0, "queued")
+    (job_id,) = await claim_jobs(db_session, owner="w1", limit=10, now=later)
+    result = await dispatch_job(db_session, job_id, owner="w1", now=later)
+    assert result is not None and result.outcome == "sent"
+    # Sent under the file channel's key: the email row's retries are closed.
+    await db_session.refresh(delivery)
+    assert result.delivery_id != delivery.id and delivery.status == "failed"
+
+
+async def test_permanent_smtp_errors_are_not_retried(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "send_mode", "smtp", raising=False)
+    monkeypatch.setattr(settings, "smtp_host", None, raising=False)
+    monkeypatch.setattr(settings, "smtp_allow_all_recipients", True, raising=False)
+    today = dt.date(2025, 12, 20)
+    g = await _due_greeting(db_session, today=today, email="user@corp.test")
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["sent"], res["errors"], res["queued"]) == (0, 1, 0)
+    job = (await db_session.execute(select(DeliveryJob))).scalar_one()
+    await db_session.refresh(job)
+    assert (job.status, job.attempts, job.last_error) == ("dead", 1, "smtp:not-configured")
+    assert g.status == "error"
+    delivery = (await db_session.execute(select(Delivery))).scalar_one()
+    assert (delivery.status, delivery.next_attempt_at) == ("failed", None)
+
+
+def test_retry_delay_backs_off_exponentially_with_jitter(monkeypatch):
+    monkeypatch.setattr(settings, "delivery_retry_base_sec", 30.0, raising=False)
+    monkeypatch.setattr(settings, "delivery_retry_max_sec", 3600.0, raising=False)
+    assert [retry_delay(n, jitter=0) for n in (1, 2, 3, 10)] == [30.0, 60.0, 120.0, 3600.0]
+    delays = {retry_delay(3, jitter=0.5) for _ in range(50)}
+    assert all(60.0 <= d <= 120.0 for d in delays) and len(delays) > 1
+
+
+async def test_retry_scans_use_indexes(db_session):
+    conn = await db_session.connection()
+    now = dt.datetime.now(dt.timezone.utc)
+    due = select(DeliveryJob.id).where(_claimable(now))
+    retrying = (
+        select(Delivery.id)
+        .where(Delivery.status == "retrying")
+        .where(Delivery.next_attempt_at <= now)
+    )
+    for q, index in ((due, "ix_delivery_jobs_due"), (retrying, "ix_deliveries_retry_due")):
+        sql = str(q.compile(conn.sync_connection, compile_kwargs={"literal_binds": True}))
+        plan = " ".join(str(r) for r in (await conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {sql}")))
+        assert index in plan
+
+
+async def test_leases_are_exclusive_until_they_expire(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_lease_sec", 30.0, raising=False)
+    today = dt.date(2025, 12, 20)
+    for i in range(3):
+        g = await _due_greeting(db_session, today=today, email=f"user{i}@example.com")
+        await enqueue_delivery(db_session, greeting=g, recipient=f"user{i}@example.com")
+        await db_session.commit()
+
+    now = dt.datetime.now(dt.timezone.utc)
+    first = await claim_jobs(db_session, owner="w1", limit=2, now=now)
+    second = await claim_jobs(db_session, owner="w2", limit=10, now=now)
+    assert len(first) == 2 and len(second) == 1
+    assert not set(first) & set(second)
+
+    # w1 crashed: its leases are taken over after expiry, and w1 can no longer finish them.
+    later = now + dt.timedelta(seconds=31)
+    taken_over = await claim_jobs(db_session, owner="w3", limit=10, now=later)
+    assert sorted(taken_over) == sorted(first + second)
+    assert await dispatch_job(db_session, first[0], owner="w1", now=later) is None
+    result = await dispatch_job(db_session, first[0], owner="w3", now=later)
+    assert result is not None and result.outcome == "sent"
+
+
+async def test_worker_keeps_draining_after_a_failing_batch(db_session, monkeypatch):
+    today = dt.date(2025, 12, 20)
+    for i in range(3):
+        g = await _due_greeting(db_session, today=today, email=f"user{i}@example.com")
+        await enqueue_delivery(db_session, greeting=g, recipient=f"user{i}@example.com")
+        await db_session.commit()
+    real = delivery_queue.dispatch_jobs
+
+    async def dispatch_jobs(session, job_ids, **kwargs):
+        if 1 in job_ids:
+            raise RuntimeError("database hiccup")
+        return await real(session, job_ids, **kwargs)
+
+    monkeypatch.setattr(delivery_queue, "dispatch_jobs", dispatch_jobs)
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False, class_=AsyncSession)
+    counts = await run_dispatch_worker(factory, owner="w1", batch_size=1, once=True)
+    assert counts == {"sent": 2, "skipped": 0, "retry": 1, "dead": 0}
+    jobs = (
+        await db_session.execute(
+            select(DeliveryJob).order_by(DeliveryJob.id).execution_options(populate_existing=True)
+        )
+    ).scalars()
+    assert [(j.status, j.lease_owner) for j in jobs] == [
+        ("queued", None),
+        ("done", None),
+        ("done", None),
+    ]
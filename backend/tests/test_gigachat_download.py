@@ -0,0 +1,105 @@
+from __future__ import annotations
+
+import base64
+import datetime as dt
+import io
+
+import httpx
+import pytest
+from PIL import Image
+
+from app.agent.gigachat_client import (
+    AccessToken,
+    Base64StreamDecoder,
+    GigaChatClient,
+    GigaChatError,
+)
+from app.core.config import settings
+
+
+def _jpeg() -> bytes:
+    buf = io.BytesIO()
+    Image.effect_noise((64, 64), 50).convert("RGB").save(buf, format="JPEG")
+    return buf.getvalue()
+
+
+JPEG = _jpeg()
+
+
+def test_base64_stream_decoder_handles_any_chunking():
+    text = base64.encodebytes(JPEG)  # with line breaks, like some gateways send it
+    for size in (1, 3, 7, 64, 4096):
+        d = Base64StreamDecoder()
+        out = b"".join(d.feed(text[i : i + size]) for i in range(0, len(text), size))
+        assert out + d.finish() == JPEG
+
+
+@pytest.fixture()
+def serve(monkeypatch):
+    """Serve one canned response for the file download; body is streamed in small chunks."""
+    state: dict = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body, ctype = state["body"], state.get("ctype", "application/octet-stream")
+        size = state.get("chunk", 100)
+
+        async def chunks():
+            for i in range(0, len(body), size):
+                yield body[i : i + size]
+
+        return httpx.Response(200, headers={"content-type": ctype}, content=chunks())
+
+    real = httpx.AsyncClient
+
+    def _client(*args, **kwargs):
+        kwargs.pop("verify", None)
+        return real(*args, transport=httpx.MockTransport(handler), **kwargs)
+
+    async def _token(self):
+        return AccessToken(value="t", expires_at=dt.datetime.now(dt.timezone.utc))
+
+    monkeypatch.setattr(httpx, "AsyncClient", _client)
+    monkeypatch.setattr(GigaChatClient, "_get_token", _token)
+    monkeypatch.setattr(settings, "gigachat_credentials", "test-creds", raising=False)
+    monkeypatch.setattr(settings, "gigachat_base_url", "http://gigachat/api/v1")
+    return state
+
+
+@pytest.mark.parametrize(
+    "body,ctype,chunk",
+    [
+        (JPEG, "image/jpeg", 100),
+        (base64.b64encode(JPEG), "text/plain", 100),
+        # The sniff must not decide on a short first chunk.
+        (b"\r\n\r\n" + base64.b64encode(JPEG), "text/plain", 4),
+        (JPEG, "image/jpeg", 3),
+        (b'{"content": "' + base64.b64encode(JPEG) + b'"}', "application/json", 100),
+    ],
+    ids=["raw", "base64", "base64-tiny-chunks", "raw-tiny-chunks", "json"],
+)
+async def test_download_streams_to_card_file(serve, tmp_path, body, ctype, chunk):
+    serve.update(body=body, ctype=ctype, chunk=chunk)
+    cards = tmp_path / "cards"
+    path = await GigaChatClient().download_file_to(file_id="abc", dest_dir=cards, prefix="p_")
+    assert path == cards / "p_abc.jpg"
+    assert path.read_bytes() == JPEG
+    assert [p.name for p in cards.iterdir()] == ["p_abc.jpg"]
+
+
+@pytest.mark.parametrize(
+    "body,max_bytes,match",
+    [
+        (b"<html>gateway error</html>" * 10, None, "not an image"),
+        (JPEG, 100, "too large"),
+        (base64.b64encode(JPEG)[:-3], None, "base64"),
+    ],
+    ids=["not-image", "too-large", "truncated-base64"],
+)
+async def test_download_rejects_bad_files_and_leaves_nothing(
+    serve, tmp_path, body, max_bytes, match
+):
+    serve.update(body=body)
+    cards = tmp_path / "cards"
+    with pytest.raises(GigaChatError, match=match):
+        await GigaChatClient().download_file_to(file_id="abc", dest_dir=cards, max_bytes=max_bytes)
+    assert list(cards.iterdir()) == []
@@ -2,10 +2,12 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import select
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from app.db.models import Client, Delivery, Event, Greeting
-from app.services.sender import send_greeting_file
+from app.services.delivery_queue import claim_jobs, dispatch_jobs, enqueue_delivery
+from app.services.sender import delivery_key, existing_deliveries, send_greeting_file
 
 
 async def test_file_sender_is_idempotent(db_session, tmp_path):
@@ -57,3 +59,67 @@ async def test_file_sender_is_idempotent(db_session, tmp_path):
     assert files, "Expected outbox delivery file to be created"
     payload = files[0].read_text(encoding="utf-8")
     assert long_body in payload
+
+
+async def test_concurrent_sender_that_inserts_first_wins(db_session, tmp_path):
+    c = Client(first_name="А", last_name="Б", email="ab@example.com")
+    db_session.add(c)
+    await db_session.commit()
+    ev = Event(client_id=c.id, event_type="manual", event_date=dt.date.today(), title="Тест")
+    db_session.add(ev)
+    await db_session.commit()
+    g = Greeting(event_id=ev.id, client_id=c.id, subject="Subj", body="Текст")
+    db_session.add(g)
+    await db_session.commit()
+
+    # Batch pre-check says "not delivered yet"...
+    key = delivery_key(greeting=g, recipient="ab@example.com", client=c)
+    existing = await existing_deliveries(db_session, [key])
+    assert existing == {}
+
+    # ...but another sender records the delivery before this one commits.
+    factory = async_sessionmaker(db_session.bind, expire_on_commit=False, class_=AsyncSession)
+    async with factory() as other:
+        first = await send_greeting_file(other, greeting=g, recipient="ab@example.com")
+
+    g.status = "queued"  # caller's pending state must survive the lost race
+    d = await send_greeting_file(
+        db_session, greeting=g, recipient="ab@example.com", existing=existing
+    )
+    assert d.id == first.id
+    assert (await db_session.execute(select(Delivery))).scalars().all() == [d]
+    await db_session.refresh(g)
+    assert g.status == "queued"
+
+
+async def test_batch_dispatch_dedupes_with_one_delivery_query(db_session):
+    today = dt.date.today()
+    for i in range(5):
+        c = Client(first_name="А", last_name=f"Б{i}", email=f"c{i}@example.com")
+        db_session.add(c)
+        await db_session.commit()
+        ev = Event(client_id=c.id, event_type="manual", event_date=today, title="Тест")
+        db_session.add(ev)
+        await db_session.commit()
+        g = Greeting(event_id=ev.id, client_id=c.id, subject="Subj", body="Текст")
+        db_session.add(g)
+        await db_session.commit()
+        await enqueue_delivery(db_session, greeting=g, recipient=c.email)
+        await db_session.commit()
+
+    statements: list[str] = []
+
+    def _record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    engine = db_session.bind.sync_engine
+    event.listen(engine, "before_cursor_execute", _record)
+    try:
+        ids = await claim_jobs(db_session, owner="w1", limit=10)
+        results = await dispatch_jobs(db_session, ids, owner="w1")
+    finally:
+        event.remove(engine, "before_cursor_execute", _record)
+
+    assert [r.outcome for r in results] == ["sent"] * 5
+    lookups = [s for s in statements if s.lstrip().startswith("SELECT") and "FROM deliveries" in s]
+    assert len(lookups) == 1
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import asyncio
+
+from app.agent.illustration_library import IllustrationLibrary, theme_key
+from app.agent.llm_usage import LLMUsage
+
+
+class FakeImages:
+    def __init__(self):
+        self.calls = 0
+        self.last_usage: LLMUsage | None = None
+
+    async def generate_to_file(
+        self, *, system_style: str, prompt: str, dest_dir, prefix="", x_client_id=None
+    ):  # noqa: ARG002
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        self.last_usage = LLMUsage(prompt_tokens=10, completion_tokens=1, latency_ms=10, calls=1)
+        path = dest_dir / f"{prefix}f{self.calls}.jpg"
+        path.write_bytes(b"\xff\xd8\xffjpeg\xff\xd9")
+        return f"f{self.calls}", path
+
+
+BIRTHDAY = {"event_type": "birthday", "event_title": "День рождения"}
+
+
+async def test_theme_pool_is_shared_round_robin_and_persistent(tmp_path):
+    provider = FakeImages()
+    usage = LLMUsage()
+    lib = IllustrationLibrary(provider, cards_dir=tmp_path, per_theme=2, budget=10, usage=usage)
+
+    first = await lib.wait(**BIRTHDAY)
+    assert first is not None
+    assert lib.pick(**BIRTHDAY) == first  # served immediately while the pool tops up
+    await lib.aclose()
+    picks = [lib.pick(**BIRTHDAY) for _ in range(6)]
+
+    assert provider.calls == 2  # pool filled up to per_theme, not one image per client
+    assert all(p is not None for p in picks)
+    assert len(set(picks)) == 2
+    assert usage.calls == 2
+
+    # A new run reuses the images on disk without generating.
+    provider2 = FakeImages()
+    lib2 = IllustrationLibrary(provider2, cards_dir=tmp_path, per_theme=2, budget=10)
+    assert lib2.pick(**BIRTHDAY) is not None
+    await lib2.aclose()
+    assert provider2.calls == 0
+
+
+async def test_budget_limits_generations_and_themes_differ(tmp_path):
+    provider = FakeImages()
+    lib = IllustrationLibrary(provider, cards_dir=tmp_path, per_theme=3, budget=1)
+
+    assert await lib.wait(**BIRTHDAY) is not None
+    assert await lib.wait(event_type="holiday", event_title="8 Марта") is None
+    await lib.aclose()
+
+    assert provider.calls == 1
+    assert theme_key(**BIRTHDAY) != theme_key(event_type="holiday", event_title="8 Марта")
@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+import datetime as dt
+from types import SimpleNamespace
+
+from app.agent.illustration_library import theme_key
+from app.agent.image_budget import plan_images
+
+D = dt.date(2026, 3, 8)
+
+
+def _pair(event_id: int, segment: str, event_type: str, title: str, days: int = 0):
+    ev = SimpleNamespace(
+        id=event_id, event_type=event_type, title=title, event_date=D + dt.timedelta(days=days)
+    )
+    return ev, SimpleNamespace(segment=segment)
+
+
+def test_vip_birthday_gets_the_slot_before_standard_holidays():
+    candidates = [
+        _pair(1, "standard", "holiday", "8 Марта"),
+        _pair(2, "standard", "holiday", "8 Марта"),
+        _pair(3, "VIP", "birthday", "День рождения", days=3),
+    ]
+    plan = plan_images(candidates, slots=1, has_images=lambda _k: False)
+    assert plan.granted == {3}
+    assert plan.new_themes == (("birthday", "День рождения"),)
+
+
+def test_funded_and_existing_themes_cover_all_their_events():
+    holiday_key = theme_key(event_type="holiday", event_title="8 Марта")
+    candidates = [
+        _pair(1, "standard", "holiday", "8 Марта"),
+        _pair(2, "standard", "birthday", "День рождения"),
+        _pair(3, "vip", "birthday", "День рождения"),
+        _pair(4, "standard", "holiday", "Новый год"),
+    ]
+    plan = plan_images(candidates, slots=1, has_images=lambda k: k == holiday_key)
+    # 8 Марта is already in the library (free); birthday takes the only slot; Новый год waits.
+    assert plan.granted == {1, 2, 3}
+    assert plan.new_themes == (("birthday", "День рождения"),)
+
+
+def test_zero_slots_plans_only_existing_themes():
+    plan = plan_images([_pair(1, "vip", "birthday", "ДР")], slots=0, has_images=lambda _k: False)
+    assert plan.granted == frozenset() and plan.new_themes == ()
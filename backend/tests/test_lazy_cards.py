@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+import datetime as dt
+import uuid
+
+import httpx
+from sqlalchemy import select
+
+from app.agent.orchestrator import CARDS_DIR, run_once
+from app.core.config import settings
+from app.db.models import Client, Greeting
+from app.db.session import get_session
+from app.main import create_app
+from app.services.lazy_cards import card_url
+
+
+async def test_lazy_card_is_rendered_on_first_request_and_cached(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "card_render_mode", "lazy", raising=False)
+    today = dt.date.today()
+    # Unique name: cards are content-addressed and data/cards is shared by the test suite.
+    db_session.add(
+        Client(
+            first_name="Ленивый",
+            last_name=uuid.uuid4().hex[:8],
+            segment="standard",
+            email="lazy@example.com",
+            preferred_channel="email",
+            birth_date=dt.date(1990, today.month, today.day),
+        )
+    )
+    await db_session.commit()
+    # No sending: due greetings would materialize the card at delivery time.
+    monkeypatch.setattr(settings, "send_mode", "noop", raising=False)
+
+    await run_once(db_session, today=today, lookahead_days=1, triggered_by="test")
+    g = (await db_session.execute(select(Greeting))).scalars().one()
+    assert g.card_spec and g.card_spec["recipient_line"].startswith("Ленивый")
+    assert not (CARDS_DIR.parent / g.image_path).exists()
+
+    app = create_app()
+
+    async def _session():
+        yield db_session
+
+    app.dependency_overrides[get_session] = _session
+    url = card_url(g.image_path, g.id)
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://test"
+    ) as client:
+        first = await client.get(url)
+        assert first.status_code == 200
+        assert first.headers["content-type"] == "image/png"
+        assert "immutable" in first.headers["cache-control"]
+        etag = first.headers["etag"]
+        assert etag.startswith('"') and not etag.startswith("W/")
+        assert (CARDS_DIR.parent / g.image_path).is_file()
+
+        again = await client.get(url, headers={"If-None-Match": etag})
+        assert again.status_code == 304 and again.headers["etag"] == etag
+        # Cards are only served by the endpoint: the raw data directory is not exposed.
+        assert (await client.get(f"/data/{g.image_path}")).status_code == 404
+
+        web = await client.get(card_url(g.image_path, g.id, "web"))
+        assert web.status_code == 200 and web.headers["content-type"] == "image/webp"
+        assert web.headers["etag"] != etag
+
+        # Re-encoding the variant changes its URL, so the immutable cache can't go stale.
+        web_url = card_url(g.image_path, g.id, "web")
+        monkeypatch.setattr(settings, "card_image_quality", 60, raising=False)
+        assert card_url(g.image_path, g.id, "web") != web_url
+        monkeypatch.setattr(settings, "card_image_format", "jpeg", raising=False)
+        assert card_url(g.image_path, g.id, "web") != web_url
+        assert card_url(g.image_path, g.id) == url
+
+        assert (await client.get(card_url(g.image_path, g.id, "huge"))).status_code == 404
+        assert (await client.get(f"/api/cards/{g.id + 1}")).status_code == 404
@@ -52,11 +52,55 @@ def test_parse_llm_json_with_raw_newlines_inside_body_string():
     assert "\n\n" in res.body
 
 
+def test_parse_llm_json_skips_prose_and_stray_braces_around_object():
+    body = (
+        "Текст поздравления для клиента: желаем стабильного роста, сильных решений и удачных проектов. "
+        "Пусть впереди будет больше поводов для гордости.\nС уважением, Сбер"
+    )
+    content = (
+        "Конечно! Вот ответ в формате {JSON}, как просили:\n"
+        '{"hint": "not the answer"}\n'
+        f'{{"tone": "official", "subject": "Поздравляем с праздником!", "body": "{body}"}}\n'
+        "Надеюсь, это подойдёт {если нет — напишите}."
+    )
+    res = parse_llm_json(content)
+    assert res.tone == "official"
+    assert res.subject == "Поздравляем с праздником!"
+    assert res.body.endswith("С уважением, Сбер")
+    assert "\n" in res.body
+
+
+def test_parse_llm_json_with_raw_crlf_and_nested_braces_in_body():
+    content = (
+        "```json\r\n"
+        "{\r\n"
+        '  "tone": "warm",\r\n'
+        '  "subject": "С днём рождения!",\r\n'
+        '  "body": "Пусть {каждый} день приносит радость и новые возможности для развития.\r\n'
+        'Желаем здоровья, вдохновения и сильной команды рядом. Спасибо, что остаётесь с нами."\r\n'
+        "}\r\n"
+        "```"
+    )
+    res = parse_llm_json(content)
+    assert res.subject == "С днём рождения!"
+    assert "{каждый}" in res.body
+    assert "\r\n" in res.body
+
+
+def test_parse_llm_json_after_many_broken_candidates():
+    # Deeply nested, never closed candidates: each is skipped as a whole, not brace by brace.
+    body = "Текст поздравления для клиента: желаем стабильного роста и удачных проектов. " * 2
+    content = ('{"a":' * 500 + "0 ") * 40
+    content += f'{{"tone": "warm", "subject": "Поздравляем!", "body": "{body}"}}'
+    assert parse_llm_json(content).subject == "Поздравляем!"
+
+
 @pytest.mark.parametrize(
     "content",
     [
         "not json",
         "[]",
+        '{"tone":"warm","subject":"Незаконченный ответ","body":"Текст обрывается',
         '{"tone":"warm","subject":"hi","body":"x"}',
         '{"tone":"???","subject":"Нормальная тема","body":"Достаточно длинный текст для прохождения проверки."}',
     ],
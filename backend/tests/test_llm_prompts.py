@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+
+from app.agent.gigachat_client import GigaChatClient
+from app.agent.llm_prompts import build_system_prompt, build_user_prompt
+from app.agent.orchestrator import run_once
+from app.core.config import settings
+from app.db.models import Client
+
+
+def test_user_prompt_is_compact_json_suffix():
+    facts = {"first_name": "Анна", "middle_name": "", "company_name": None, "segment": "vip"}
+    user = build_user_prompt(
+        event_type="holiday",
+        event_title="8 Марта",
+        event_date=dt.date(2026, 3, 8),
+        segment="vip",
+        facts=facts,
+        tone_hint="warm",
+    )
+    obj = json.loads(user)
+    assert obj == {
+        "event": {"type": "holiday", "title": "8 Марта", "date": "2026-03-08"},
+        "segment": "vip",
+        "tone": "warm",
+        "facts": facts,
+    }
+    assert ", " not in user and "\n" not in user
+    # Static instructions live in the (cacheable) system prompt only.
+    assert "FACTS" in build_system_prompt()
+    assert "FACTS" not in user
+    # Company/position are only mentioned when they are known.
+    assert "компанию НЕ упоминай" in build_system_prompt()
+    assert "Компания:" not in build_system_prompt()
+
+
+def test_tone_defaults_by_segment():
+    def tone(segment: str) -> str:
+        user = build_user_prompt(
+            event_type="birthday",
+            event_title="День рождения",
+            event_date=dt.date(2026, 1, 1),
+            segment=segment,
+            facts={},
+        )
+        return json.loads(user)["tone"]
+
+    assert tone("VIP") == "official"
+    assert tone("standard") == "warm"
+
+
+async def test_run_shares_one_gigachat_session(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "llm_mode", "gigachat", raising=False)
+    monkeypatch.setattr(settings, "gigachat_credentials", "test-creds", raising=False)
+
+    seen: list[tuple[str | None, str]] = []
+
+    async def fake_chat_completions(self, *, messages, x_session_id=None, **_kw):
+        seen.append((x_session_id, messages[0]["content"]))
+        return {"choices": [{"message": {"content": "not json"}}]}
+
+    monkeypatch.setattr(GigaChatClient, "chat_completions", fake_chat_completions)
+
+    today = dt.date.today()
+    for i in range(2):
+        db_session.add(
+            Client(
+                first_name="Тест",
+                last_name=f"Клиент{i}",
+                segment="standard",
+                email=f"t{i}@example.com",
+                preferred_channel="email",
+                birth_date=dt.date(1990, today.month, today.day),
+            )
+        )
+    await db_session.commit()
+
+    await run_once(db_session, today=today, lookahead_days=1, triggered_by="test")
+
+    assert len(seen) >= 2
+    session_ids = {sid for sid, _system in seen}
+    assert len(session_ids) == 1 and None not in session_ids
+    assert {system for _sid, system in seen} == {build_system_prompt()}
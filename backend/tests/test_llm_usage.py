@@ -0,0 +1,77 @@
+from __future__ import annotations
+
+import datetime as dt
+import json
+
+from sqlalchemy import select
+
+from app.agent.llm_usage import LLMUsage, usage_from_response
+from app.agent.orchestrator import run_once
+from app.db.models import AgentRun, Client, Greeting
+
+
+def test_usage_from_response_reads_usage_block():
+    u = usage_from_response(
+        {"choices": [], "usage": {"prompt_tokens": 812, "completion_tokens": 245}},
+        latency_ms=1234.6,
+    )
+    assert (u.prompt_tokens, u.completion_tokens, u.latency_ms, u.calls) == (812, 245, 1235, 1)
+    assert u.total_tokens == 1057
+
+
+def test_usage_from_response_tolerates_missing_usage():
+    u = usage_from_response({"choices": []}, latency_ms=10)
+    assert (u.prompt_tokens, u.completion_tokens, u.calls) == (0, 0, 1)
+
+
+class FakeMeteredLLM:
+    def __init__(self, content: str):
+        self._content = content
+        self.last_usage: LLMUsage | None = None
+
+    async def generate(self, *, system: str, user: str) -> str:  # noqa: ARG002
+        self.last_usage = LLMUsage(prompt_tokens=700, completion_tokens=300, latency_ms=50, calls=1)
+        return self._content
+
+
+async def test_run_records_tokens_per_greeting_and_rolls_up(db_session, monkeypatch):
+    body = (
+        "Поздравляем с днём рождения! Желаем крепкого здоровья, уверенных решений и новых "
+        "достижений в работе. Пусть этот год принесёт вдохновение, поддержку команды и яркие "
+        "успехи. Мы ценим наше сотрудничество и надеемся на дальнейшее плодотворное "
+        "взаимодействие. Пусть каждый день будет наполнен новыми возможностями и "
+        "профессиональными победами, а все планы реализуются спокойно и уверенно.\n\n"
+        "Спасибо, что остаётесь с нами.\n\nС уважением, Команда Сбер"
+    )
+    content = json.dumps({"tone": "warm", "subject": "С днём рождения!", "body": body})
+    monkeypatch.setattr(
+        "app.agent.orchestrator.get_llm_provider", lambda **_: FakeMeteredLLM(content)
+    )
+
+    today = dt.date.today()
+    for i in range(2):
+        db_session.add(
+            Client(
+                first_name="Тест",
+                last_name=f"Клиент{i}",
+                segment="standard",
+                email=f"t{i}@example.com",
+                preferred_channel="email",
+                birth_date=dt.date(1990, today.month, today.day),
+            )
+        )
+    await db_session.commit()
+
+    summary = await run_once(db_session, today=today, lookahead_days=1, triggered_by="test")
+    greetings = (await db_session.execute(select(Greeting))).scalars().all()
+    n = len(greetings)
+    assert n >= 2
+    assert {(g.prompt_tokens, g.completion_tokens, g.llm_latency_ms) for g in greetings} == {
+        (700, 300, 50)
+    }
+
+    run = (await db_session.execute(select(AgentRun))).scalars().one()
+    assert run.llm_calls == n
+    assert run.prompt_tokens == 700 * n
+    assert run.completion_tokens == 300 * n
+    assert summary.as_dict()["prompt_tokens"] == 700 * n
@@ -0,0 +1,55 @@
+from __future__ import annotations
+
+import os
+from email import message_from_bytes, policy
+from email.message import EmailMessage
+
+from app.services.mime_parts import AttachmentCache, attach_file, get_attachment_cache
+
+
+def _msg() -> EmailMessage:
+    msg = EmailMessage()
+    msg["To"] = "a@corp.test"
+    msg["Subject"] = "Поздравление"
+    msg.set_content("Текст поздравления")
+    return msg
+
+
+def test_cached_attachment_matches_add_attachment(tmp_path):
+    card = tmp_path / "card_2025-12-20_abc.png"
+    card.write_bytes(os.urandom(5000))
+    get_attachment_cache().clear()
+
+    for _ in range(3):
+        msg = _msg()
+        attach_file(msg, card)
+        parsed = message_from_bytes(msg.as_bytes(), policy=policy.default)
+        (att,) = list(parsed.iter_attachments())
+        assert att.get_content_type() == "image/png"
+        assert att.get_filename() == card.name
+        assert att.get_content() == card.read_bytes()
+        assert parsed.get_body(("plain",)).get_content().strip() == "Текст поздравления"
+
+    cache = get_attachment_cache()
+    assert (cache.misses, cache.hits) == (1, 2)
+
+
+def test_cache_is_bounded_and_follows_file_changes(tmp_path):
+    files = []
+    for i in range(3):
+        p = tmp_path / f"c{i}.jpg"
+        p.write_bytes(os.urandom(3000))
+        files.append(p)
+    cache = AttachmentCache(max_bytes=9000)  # room for two ~4 KB encoded bodies
+
+    for p in files:
+        cache.get(p)
+    cache.get(files[0])  # evicted as least recently used
+    assert (cache.misses, cache.hits) == (4, 0)
+    cache.get(files[0])
+    assert cache.hits == 1
+
+    files[0].write_bytes(os.urandom(3001))  # new size/mtime -> new key
+    _, _, body = cache.get(files[0])
+    assert cache.misses == 5
+    assert len(body) > 4000
@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import json
+import time
+import uuid
+
+import pytest
+
+from app.agent.orchestrator import _gather_or_cancel, run_once
+from app.core.config import settings
+from app.db.models import Client
+
+DELAY = 0.25
+
+BODY = (
+    "Поздравляем с днём рождения! Желаем крепкого здоровья, уверенных решений и новых "
+    "достижений в работе. Пусть этот год принесёт вдохновение, поддержку команды и яркие "
+    "успехи. Мы ценим наше сотрудничество и надеемся на дальнейшее плодотворное "
+    "взаимодействие. Пусть каждый день будет наполнен новыми возможностями и "
+    "профессиональными победами, а все планы реализуются спокойно и уверенно.\n\n"
+    "Спасибо, что остаётесь с нами.\n\nС уважением, Команда Сбер"
+)
+
+
+class SlowLLM:
+    last_usage = None
+
+    async def generate(self, *, system: str, user: str) -> str:  # noqa: ARG002
+        await asyncio.sleep(DELAY)
+        return json.dumps({"tone": "warm", "subject": "С днём рождения!", "body": BODY})
+
+
+class SlowImages:
+    def __init__(self, **_kw):
+        self.last_usage = None
+        self.calls = 0
+
+    async def generate_to_file(
+        self, *, system_style: str, prompt: str, dest_dir, prefix="", x_client_id=None
+    ):  # noqa: ARG002
+        self.calls += 1
+        await asyncio.sleep(DELAY)
+        path = dest_dir / f"{prefix}{uuid.uuid4().hex}.jpg"
+        path.write_bytes(b"\xff\xd8\xfffake-jpeg\xff\xd9")
+        return path.stem, path
+
+
+async def _seed(db_session, n: int) -> None:
+    today = dt.date.today()
+    for i in range(n):
+        db_session.add(
+            Client(
+                first_name="Тест",
+                last_name=f"Клиент{i}",
+                segment="standard",
+                email=f"t{i}@example.com",
+                preferred_channel="email",
+                birth_date=dt.date(1990, today.month, today.day),
+            )
+        )
+    await db_session.commit()
+
+
+async def test_text_and_image_overlap(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "image_mode", "gigachat", raising=False)
+    monkeypatch.setattr(settings, "gigachat_credentials", "test-creds", raising=False)
+    monkeypatch.setattr("app.agent.orchestrator.get_llm_provider", lambda **_: SlowLLM())
+    monkeypatch.setattr("app.agent.orchestrator.GigaChatImageProvider", SlowImages)
+    await _seed(db_session, 2)
+
+    started = time.perf_counter()
+    summary = await run_once(
+        db_session, today=dt.date.today(), lookahead_days=1, triggered_by="test"
+    )
+    elapsed = time.perf_counter() - started
+
+    n = summary.generated_greetings
+    assert n >= 2
+    # Sequential text+image would take 2*DELAY per event.
+    assert elapsed < n * DELAY * 1.6
+
+
+async def test_fatal_failure_cancels_sibling():
+    cancelled = asyncio.Event()
+
+    async def slow_image():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    async def failing_text():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError, match="boom"):
+        await _gather_or_cancel(failing_text(), slow_image())
+    assert cancelled.is_set()
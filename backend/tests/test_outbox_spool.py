@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import datetime as dt
+import os
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import Client, Delivery, Event, Greeting
+from app.services.artifact_gc import collect_garbage
+from app.services.outbox_spool import (
+    SpoolWriter,
+    build_index,
+    close_spool_writers,
+    parse_ref,
+    read_record,
+    scan_segment,
+)
+from app.services.sender import send_greeting_file
+
+
+async def _greetings(session, n: int) -> list[Greeting]:
+    out = []
+    for i in range(n):
+        c = Client(first_name="Иван", last_name=f"Клиент{i}", email=f"c{i}@example.com")
+        session.add(c)
+        await session.commit()
+        ev = Event(client_id=c.id, event_type="manual", event_date=dt.date.today(), title="Тест")
+        session.add(ev)
+        await session.commit()
+        g = Greeting(event_id=ev.id, client_id=c.id, subject=f"Тема {i}", body=f"Текст\nстрока {i}")
+        session.add(g)
+        await session.commit()
+        out.append(g)
+    return out
+
+
+async def test_spool_outbox_appends_records_with_written_provenance(
+    db_session, monkeypatch, tmp_path
+):
+    out_dir = tmp_path / "spool_outbox"
+    monkeypatch.setattr(settings, "outbox_format", "spool", raising=False)
+    try:
+        deliveries = []
+        for i, g in enumerate(await _greetings(db_session, 3)):
+            deliveries.append(
+                await send_greeting_file(
+                    db_session, greeting=g, recipient=f"c{i}@example.com", outbox_dir=out_dir
+                )
+            )
+    finally:
+        close_spool_writers()
+
+    # One segment instead of one file per delivery.
+    (segment,) = os.listdir(out_dir)
+    for i, d in enumerate(deliveries):
+        ref = parse_ref(d.provider_message)
+        assert ref is not None and ref[0] == segment
+        record = read_record(out_dir, *ref)
+        assert (record["to"], record["subject"], record["key"]) == (
+            f"c{i}@example.com",
+            f"Тема {i}",
+            d.idempotency_key,
+        )
+        assert record["body"] == f"Текст\nстрока {i}"
+    assert build_index(out_dir) == {
+        d.idempotency_key: d.provider_message[len("written:") :] for d in deliveries
+    }
+
+    # Referenced segments survive GC; an unreferenced old one is collected.
+    data_dir = tmp_path / "data"
+    (data_dir / "outbox").mkdir(parents=True)
+    os.replace(out_dir / segment, data_dir / "outbox" / segment)
+    orphan = data_dir / "outbox" / "spool-20240101-1-0001.jsonl"
+    orphan.write_text('{"key":"x"}\n', encoding="utf-8")
+    later = dt.datetime.now(dt.timezone.utc) + dt.timedelta(days=2)
+    report = await collect_garbage(db_session, data_dir=data_dir, now=later)
+    assert report.deleted_by_reason == {"outbox-orphan": 1}
+    assert sorted(os.listdir(data_dir / "outbox")) == [segment]
+    assert len((await db_session.execute(select(Delivery))).scalars().all()) == 3
+
+
+def test_segments_rotate_by_size_and_survive_removal(tmp_path):
+    spool = tmp_path / "spool"
+    writer = SpoolWriter(spool, segment_bytes=1024, fsync_every=4)
+    refs = [writer.append({"key": f"k{i}", "body": "x" * 300}) for i in range(7)]
+    segments = sorted({r.split("#")[0] for r in refs})
+    assert len(segments) >= 2
+    for path in spool.iterdir():
+        assert path.stat().st_size <= 1024
+
+    # The current segment is deleted (runtime reset): the writer starts a new file.
+    for path in spool.iterdir():
+        path.unlink()
+    ref = writer.append({"key": "after-reset"})
+    writer.close()
+    name, offset = ref.split("#")
+    assert offset == "0"
+    assert [rec["key"] for _, rec in scan_segment(spool / name)] == ["after-reset"]
+
+
+def test_scan_skips_torn_tail(tmp_path):
+    seg = tmp_path / "spool-20250101-1-0001.jsonl"
+    seg.write_bytes(b'{"key":"a"}\n{"key":"b"}\n{"key":"c"')
+    assert [(o, r["key"]) for o, r in scan_segment(seg)] == [(0, "a"), (12, "b")]
+
+
+def test_writers_sharing_a_directory_never_share_a_segment(tmp_path):
+    # Same host and pid (like containers that all run as pid 1): still one writer per segment.
+    a = SpoolWriter(tmp_path, segment_bytes=1 << 20, fsync_every=1)
+    b = SpoolWriter(tmp_path, segment_bytes=1 << 20, fsync_every=1)
+    try:
+        ref_a = parse_ref("written:" + a.append({"key": "a"}))
+        ref_b = parse_ref("written:" + b.append({"key": "b"}))
+        ref_a2 = parse_ref("written:" + a.append({"key": "a2"}))
+    finally:
+        a.close()
+        b.close()
+    assert ref_a is not None and ref_b is not None and ref_a2 is not None
+    assert ref_a[0] != ref_b[0] and ref_a2[0] == ref_a[0]
+    assert (ref_a[1], ref_b[1]) == (0, 0)
+    assert read_record(tmp_path, *ref_a2)["key"] == "a2"
+    assert build_index(tmp_path) == {
+        "a": f"{ref_a[0]}#0",
+        "a2": f"{ref_a[0]}#{ref_a2[1]}",
+        "b": f"{ref_b[0]}#0",
+    }
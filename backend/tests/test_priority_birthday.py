@@ -2,8 +2,9 @@ from __future__ import annotations
 
 import datetime as dt
 
-from sqlalchemy import select
+from sqlalchemy import event, select
 
+from app.core.config import settings
 from app.db.models import Client, Delivery, Event, Greeting
 from app.services.due_sender import send_due_greetings
 
@@ -79,3 +80,96 @@ async def test_birthday_has_priority_over_professional_holiday_same_day(db_sessi
 
     deliveries = (await db_session.execute(select(Delivery))).scalars().all()
     assert len(deliveries) == 1
+
+
+async def _client_with(session, today, *, segment="standard", events=()):
+    c = Client(first_name="Иван", last_name="Петров", segment=segment, email="u@corp.test")
+    session.add(c)
+    await session.commit()
+    out = []
+    for i, (event_type, tag, status) in enumerate(events):
+        ev = Event(
+            client_id=c.id,
+            event_type=event_type,
+            event_date=today,
+            title=f"Событие {i}",
+            details={"holiday_tags": {"type": tag}} if tag else {},
+        )
+        session.add(ev)
+        await session.commit()
+        g = Greeting(event_id=ev.id, client_id=c.id, subject="Тема", body="Текст", status=status)
+        session.add(g)
+        await session.commit()
+        out.append(g)
+    return out
+
+
+async def test_winner_selection_by_priority_and_vip_rules(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_dispatch", "worker", raising=False)
+    today = dt.date(2025, 12, 20)
+    a = await _client_with(
+        db_session,
+        today,
+        events=[("holiday", None, "generated"), ("holiday", "professional", "generated")],
+    )
+    b = await _client_with(
+        db_session,
+        today,
+        events=[("holiday", "professional", "approved"), ("manual", None, "generated")],
+    )
+    # VIP: the unapproved birthday blocks the approved holiday; nothing goes out.
+    c = await _client_with(
+        db_session,
+        today,
+        segment="vip",
+        events=[("holiday", None, "approved"), ("birthday", None, "needs_approval")],
+    )
+    # VIP without a birthday: only approved greetings compete.
+    d = await _client_with(
+        db_session,
+        today,
+        segment="VIP",
+        events=[("manual", None, "generated"), ("holiday", None, "approved")],
+    )
+
+    res = await send_due_greetings(db_session, today=today)
+    assert (res["due_total"], res["clients_total"]) == (8, 4)
+    assert (res["queued"], res["suppressed"]) == (3, 3)
+    for g in a + b + c + d:
+        await db_session.refresh(g)
+    assert [g.status for g in a] == ["skipped", "queued"]
+    assert [g.status for g in b] == ["skipped", "queued"]
+    assert [g.status for g in c] == ["skipped", "needs_approval"]
+    assert [g.status for g in d] == ["generated", "queued"]
+
+
+async def test_winner_selection_statements_do_not_grow_with_volume(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "delivery_dispatch", "worker", raising=False)
+    statements: list[str] = []
+    engine = db_session.bind.sync_engine
+    listener = lambda *args: statements.append(args[2])  # noqa: E731
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        today = dt.date(2025, 12, 20)
+        for n in (2, 12):
+            for _ in range(n):
+                await _client_with(
+                    db_session,
+                    today,
+                    events=[("manual", None, "generated"), ("holiday", None, "generated")],
+                )
+            statements.clear()
+            res = await send_due_greetings(db_session, today=today)
+            assert res["suppressed"] == n
+            ranked = [s for s in statements if "row_number" in s.lower()]
+            updates = [s for s in statements if s.lstrip().upper().startswith("UPDATE GREETINGS")]
+            assert len(ranked) == 2  # counts + the bulk suppression
+            # One bulk suppression, then one batched status UPDATE and one job INSERT per page.
+            assert len([s for s in updates if "row_number" in s.lower()]) == 1
+            assert len(updates) == 2
+            inserts = [
+                s for s in statements if s.lstrip().upper().startswith("INSERT INTO DELIVERY")
+            ]
+            assert len(inserts) == 1
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
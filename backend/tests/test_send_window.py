@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import datetime as dt
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.db.models import Client, DeliveryJob, Event, Greeting, utcnow
+from app.services.due_sender import send_due_greetings
+from app.services.send_window import SlotRequest, assign_slots, window_bounds
+
+UTC = dt.timezone.utc
+DAY = dt.date(2025, 12, 20)
+
+
+def _window(monkeypatch, start="09:00", end="18:00"):
+    monkeypatch.setattr(settings, "tz", "Europe/Moscow", raising=False)
+    monkeypatch.setattr(settings, "send_window_start", start, raising=False)
+    monkeypatch.setattr(settings, "send_window_end", end, raising=False)
+
+
+def test_slots_are_spread_over_the_local_window(monkeypatch):
+    _window(monkeypatch)
+    now = dt.datetime(2025, 12, 20, 3, 0, tzinfo=UTC)
+    slots = assign_slots([SlotRequest(i, "email") for i in range(1, 10)], day=DAY, now=now)
+
+    assert window_bounds(DAY) == (
+        dt.datetime(2025, 12, 20, 6, 0, tzinfo=UTC),
+        dt.datetime(2025, 12, 20, 15, 0, tzinfo=UTC),
+    )
+    times = [slots[i] for i in range(1, 10)]
+    assert times[0] == dt.datetime(2025, 12, 20, 6, 0, tzinfo=UTC)  # 09:00 Moscow
+    assert {b - a for a, b in zip(times, times[1:], strict=False)} == {dt.timedelta(hours=1)}
+    assert times[-1] < dt.datetime(2025, 12, 20, 15, 0, tzinfo=UTC)
+
+
+def test_rate_cap_and_client_timezones(monkeypatch):
+    _window(monkeypatch)
+    monkeypatch.setattr(settings, "channel_sms_rate_per_sec", 1 / 7200, raising=False)
+    now = dt.datetime(2025, 12, 20, 0, 0, tzinfo=UTC)
+    slots = assign_slots(
+        [
+            SlotRequest(1, "email", "Asia/Vladivostok"),  # window opened at 23:00 UTC yesterday
+            SlotRequest(2, "email"),
+            SlotRequest(3, "sms"),
+            SlotRequest(4, "sms"),
+            SlotRequest(5, "sms"),
+        ],
+        day=DAY,
+        now=now,
+    )
+    assert slots[1] == now  # already inside its window: not before now
+    assert slots[2] >= dt.datetime(2025, 12, 20, 6, 0, tzinfo=UTC)
+    # 3 sms over a 9 h window would be 3 h apart; the 1 per 2 h cap keeps them >= 2 h apart.
+    assert slots[4] - slots[3] == dt.timedelta(hours=3)
+    monkeypatch.setattr(settings, "channel_sms_rate_per_sec", 1 / (4 * 3600), raising=False)
+    slots = assign_slots([SlotRequest(i, "sms") for i in (3, 4, 5)], day=DAY, now=now)
+    assert slots[5] - slots[3] == dt.timedelta(hours=8)
+
+
+async def test_due_greetings_are_queued_for_their_slots(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "send_schedule", "window", raising=False)
+    _window(monkeypatch, "00:00", "23:59")
+    monkeypatch.setattr(settings, "tz", "UTC", raising=False)
+    today = utcnow().date()
+    greetings = []
+    for i in range(3):
+        c = Client(first_name="Иван", last_name="Петров", email=f"u{i}@corp.test")
+        db_session.add(c)
+        await db_session.commit()
+        ev = Event(client_id=c.id, event_type="manual", event_date=today, title="Событие")
+        db_session.add(ev)
+        await db_session.commit()
+        g = Greeting(event_id=ev.id, client_id=c.id, subject="Тема", body="Текст")
+        db_session.add(g)
+        await db_session.commit()
+        greetings.append(g)
+
+    before = utcnow()
+    res = await send_due_greetings(db_session, today=today)
+    # The first slot is now; the others wait for theirs (released by the dispatch loop).
+    assert (res["sent"], res["queued"], res["errors"]) == (1, 2, 0)
+    assert [g.status for g in greetings] == ["sent", "queued", "queued"]
+    jobs = (await db_session.execute(select(DeliveryJob).order_by(DeliveryJob.id))).scalars()
+    waiting = [j.next_attempt_at.replace(tzinfo=UTC) for j in jobs if j.status == "queued"]
+    assert len(waiting) == 2 and before < waiting[0] < waiting[1]
+
+
+def test_mixed_timezones_stay_inside_their_own_windows(monkeypatch, caplog):
+    _window(monkeypatch)
+    day = dt.date(2026, 10, 19)
+    now = dt.datetime(2026, 10, 18, 21, 5, tzinfo=UTC)  # 00:05 in Moscow
+    requests = [SlotRequest(i, "email", "Asia/Vladivostok") for i in range(10)]
+    requests += [SlotRequest(i, "email", "Europe/Moscow") for i in range(10, 1010)]
+    slots = assign_slots(requests, day=day, now=now)
+    for r in requests:
+        start, end = window_bounds(day, r.tz)
+        assert start <= slots[r.greeting_id] < end
+    moscow = sorted(slots[i] for i in range(10, 1010))
+    assert moscow[0] == dt.datetime(2026, 10, 19, 6, 0, tzinfo=UTC)
+
+    # Over capacity (1 per minute, 1000 sends in a 9 h window): clamped to the end, reported.
+    monkeypatch.setattr(settings, "channel_email_rate_per_sec", 1 / 60, raising=False)
+    slots = assign_slots(requests, day=day, now=now)
+    moscow = sorted(slots[i] for i in range(10, 1010))
+    _, moscow_end = window_bounds(day, "Europe/Moscow")
+    assert max(moscow) == moscow_end
+    # Everything not clamped to its own window end keeps the 1/min spacing.
+    ends = {r.greeting_id: window_bounds(day, r.tz)[1] for r in requests}
+    paced = sorted(t for i, t in slots.items() if t < ends[i])
+    assert min(b - a for a, b in zip(paced, paced[1:], strict=False)) == dt.timedelta(minutes=1)
+    assert "exceed CHANNEL_EMAIL_RATE_PER_SEC" in caplog.text
+
+
+def test_closed_window_spreads_over_the_rest_of_the_local_day(monkeypatch):
+    _window(monkeypatch)
+    now = dt.datetime(2025, 12, 20, 17, 0, tzinfo=UTC)  # 20:00 Moscow, window closed at 18:00
+    slots = assign_slots([SlotRequest(i, "email") for i in range(4)], day=DAY, now=now)
+    assert [slots[i] for i in range(4)] == [now + dt.timedelta(hours=i) for i in range(4)]
+    # Local day already over (Vladivostok): sent right away.
+    slots = assign_slots([SlotRequest(1, "email", "Asia/Vladivostok")], day=DAY, now=now)
+    assert slots[1] == now
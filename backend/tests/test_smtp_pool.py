@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import asyncio
+import datetime as dt
+import smtplib
+from email.message import EmailMessage
+
+import pytest
+
+from app.core.config import settings
+from app.db.models import Client, Event, Greeting
+from app.services import smtp_pool
+from app.services.sender import send_greeting
+from app.services.smtp_pool import SMTPConfig, SMTPPool
+
+
+class FakeSMTP:
+    """smtplib.SMTP stand-in: records sessions and messages; scripted failures."""
+
+    sessions: list[FakeSMTP] = []
+    # Exceptions raised by successive send_message calls (popped in order; None = success).
+    script: list[Exception | None] = []
+
+    def __init__(self, host, port, timeout=None):
+        self.logged_in = False
+        self.sent: list[str] = []
+        self.closed = False
+        FakeSMTP.sessions.append(self)
+
+    def starttls(self):
+        pass
+
+    def login(self, username, password):
+        self.logged_in = True
+
+    def send_message(self, msg):
+        if FakeSMTP.script:
+            err = FakeSMTP.script.pop(0)
+            if err is not None:
+                raise err
+        self.sent.append(msg["To"])
+
+    def quit(self):
+        self.closed = True
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def fake_smtp(monkeypatch):
+    FakeSMTP.sessions = []
+    FakeSMTP.script = []
+    monkeypatch.setattr(smtplib, "SMTP", FakeSMTP)
+    yield FakeSMTP
+    smtp_pool.shutdown_smtp_pool()
+
+
+def _config() -> SMTPConfig:
+    return SMTPConfig(
+        host="smtp.test",
+        port=587,
+        username="user",
+        password="secret",
+        starttls=True,
+        ssl=False,
+        timeout=5.0,
+    )
+
+
+def _msg(to: str) -> EmailMessage:
+    msg = EmailMessage()
+    msg["From"] = "bank@corp.test"
+    msg["To"] = to
+    msg["Subject"] = "Поздравление"
+    msg.set_content("Текст")
+    return msg
+
+
+async def _send_all(pool: SMTPPool, msgs: list[EmailMessage]) -> list:
+    """Concurrent sends, like a batch through SmtpAdapter; per-message outcome (None = sent)."""
+    return await asyncio.gather(*(pool.send(m) for m in msgs), return_exceptions=True)
+
+
+async def test_batch_reuses_one_authenticated_session():
+    pool = SMTPPool(_config(), size=1)
+    try:
+        results = await _send_all(pool, [_msg(f"c{i}@corp.test") for i in range(5)])
+    finally:
+        pool.close()
+
+    assert results == [None] * 5
+    assert pool.connects == 1
+    (session,) = FakeSMTP.sessions
+    assert session.logged_in
+    assert len(session.sent) == 5
+
+
+async def test_session_is_rotated_after_max_messages():
+    pool = SMTPPool(_config(), size=1, max_messages=2)
+    try:
+        await _send_all(pool, [_msg(f"c{i}@corp.test") for i in range(5)])
+    finally:
+        pool.close()
+
+    assert pool.connects == 3
+    assert [len(s.sent) for s in FakeSMTP.sessions] == [2, 2, 1]
+
+
+async def test_dropped_connection_is_reopened_and_message_resent():
+    pool = SMTPPool(_config(), size=1)
+    FakeSMTP.script = [None, smtplib.SMTPServerDisconnected("gone")]
+    try:
+        results = await _send_all(pool, [_msg("a@corp.test"), _msg("b@corp.test")])
+    finally:
+        pool.close()
+
+    assert results == [None, None]
+    assert pool.connects == 2
+    assert FakeSMTP.sessions[0].closed
+    assert FakeSMTP.sessions[1].sent == ["b@corp.test"]
+
+
+async def test_rejection_is_per_message_and_keeps_the_session():
+    pool = SMTPPool(_config(), size=1)
+    FakeSMTP.script = [smtplib.SMTPRecipientsRefused({"a@corp.test": (550, b"no such user")})]
+    try:
+        results = await _send_all(pool, [_msg("a@corp.test"), _msg("b@corp.test")])
+    finally:
+        pool.close()
+
+    assert isinstance(results[0], smtplib.SMTPRecipientsRefused)
+    assert results[1] is None
+    assert pool.connects == 1
+
+
+async def test_send_greeting_records_pooled_outcomes(db_session, monkeypatch):
+    monkeypatch.setattr(settings, "send_mode", "smtp", raising=False)
+    monkeypatch.setattr(settings, "smtp_host", "smtp.corp.test", raising=False)
+    monkeypatch.setattr(settings, "smtp_allow_all_recipients", True, raising=False)
+
+    deliveries = []
+    for i, email in enumerate(["ok@corp.test", "refused@corp.test"]):
+        c = Client(
+            first_name="Иван",
+            last_name=f"Клиент{i}",
+            segment="standard",
+            email=email,
+            preferred_channel="email",
+        )
+        db_session.add(c)
+        await db_session.commit()
+        ev = Event(client_id=c.id, event_type="manual", event_date=dt.date.today(), title="Тест")
+        db_session.add(ev)
+        await db_session.commit()
+        g = Greeting(
+            event_id=ev.id,
+            client_id=c.id,
+            subject="Поздравление",
+            body="Текст поздравления",
+            status="generated",
+        )
+        db_session.add(g)
+        await db_session.commit()
+        if email.startswith("refused"):
+            FakeSMTP.script = [smtplib.SMTPRecipientsRefused({email: (550, b"no such user")})]
+        deliveries.append(await send_greeting(db_session, greeting=g, recipient=email, client=c))
+
+    ok, refused = deliveries
+    assert (ok.status, ok.channel, ok.provider_message) == ("sent", "email", "smtp:sent")
+    assert refused.status == "error"
+    assert refused.provider_message == "smtp:error:SMTPRecipientsRefused"
+    # Both messages went over the same pooled session.
+    assert len(FakeSMTP.sessions) == 1
@@ -6,7 +6,7 @@ from sqlalchemy import select
 
 from app.agent.orchestrator import run_once
 from app.core.config import settings
-from app.db.models import Client, Delivery, Event, Greeting
+from app.db.models import Client, Delivery, DeliveryJob, Event, Greeting
 from app.services.approval import approve_greeting
 
 
@@ -159,3 +159,23 @@ async def test_vip_approve_in_smtp_mode_skipped_is_not_error(db_session, monkeyp
     assert res["status"] == "skipped"
     await db_session.refresh(g)
     assert g.status == "skipped"
+
+
+async def test_approve_leaves_an_already_delivered_greeting_untouched(db_session):
+    today = dt.date.today()
+    c = Client(first_name="Вип", last_name="Клиент", segment="vip", email="vip@corp.test")
+    db_session.add(c)
+    await db_session.commit()
+    ev = Event(client_id=c.id, event_type="manual", event_date=today, title="Событие")
+    db_session.add(ev)
+    await db_session.commit()
+    g = Greeting(event_id=ev.id, client_id=c.id, subject="Тема", body="Текст", status="generated")
+    db_session.add(g)
+    await db_session.commit()
+    db_session.add(DeliveryJob(greeting_id=g.id, recipient="vip@corp.test", status="done"))
+    await db_session.commit()
+
+    res = await approve_greeting(db_session, greeting_id=g.id, approved_by="test", today=today)
+    assert (res["status"], res["reason"]) == ("ignored", "already delivered")
+    await db_session.refresh(g)
+    assert (g.status, g.approved_by) == ("generated", None)